@@ -5,7 +5,7 @@ Exports:
 settings - An instance of a data class containing application configuration settings
 """
 
-from typing import Tuple
+from typing import Literal, Tuple
 
 from pydantic.v1 import BaseSettings
 
@@ -24,8 +24,102 @@ class Settings(BaseSettings):
     thumbnail_size: Tuple[int, int] = (100, 100)
     thumbnail_file_type: str = "JPEG"
     thumbnail_background: Tuple[int, int, int] = (255, 255, 255)  # White
-    # Folder where task state is stored if using FileSystemTaskStore
+    # Seconds clients and caches may reuse a downloaded thumbnail, which never changes
+    thumbnail_cache_max_age: int = 60 * 60 * 24 * 365  # 1 year
+    # Trade thumbnail quality for speed by decoding images closer to the thumbnail size
+    # and resizing with a cheaper filter. See app/domain/create_thumbnail.py
+    thumbnail_quality: Literal["fast", "balanced", "best"] = "balanced"
+    # Give an upload identical to an earlier one, with the same thumbnail settings,
+    # the job of the earlier upload instead of processing the image again
+    upload_deduplication: bool = True
+    # How much of an upload is checked before it is accepted: "header" only parses the
+    # format and dimensions, leaving corrupt images to fail in the worker, "strict"
+    # verifies the whole file on the request path
+    upload_validation: Literal["header", "strict"] = "header"
+    # Longest time in seconds an upload may wait for its thumbnail to be returned in the
+    # response, when asked to with the "wait" query parameter or a "Prefer: wait" header
+    upload_max_wait: float = 10.0
+    # Completion webhooks: the result of a job is POSTed to the callback URLs given with
+    # its uploads, in JSON arrays of up to webhook_batch_size events, over at most
+    # webhook_concurrency pooled connections. A failed request is sent up to
+    # webhook_max_attempts times, backing off from webhook_backoff seconds. Beyond
+    # webhook_max_pending undelivered events, new ones are dropped.
+    # See app/task_queue/webhooks.py
+    webhook_max_pending: int = 1000
+    webhook_batch_size: int = 50
+    webhook_concurrency: int = 4
+    webhook_max_attempts: int = 5
+    webhook_backoff: float = 1.0
+    webhook_timeout: float = 5.0
+    # Hosts callback URLs may point at, as a JSON list, e.g. ["hooks.example.com"].
+    # "*.example.com" also allows its subdomains, and "*" any host. Empty disables
+    # callbacks. Hosts resolving to addresses that are not public are rejected, unless
+    # webhook_allow_private_addresses is set, e.g. for receivers in the cluster.
+    webhook_allowed_hosts: list[str] = []
+    webhook_allow_private_addresses: bool = False
+    # Longest time in seconds a job status request may wait for the job to finish, when
+    # asked to with the "wait" query parameter
+    status_max_wait: float = 30.0
+    # Reject uploads with 503 and a Retry-After header while this many jobs are
+    # processing, or while the oldest of them has waited this many seconds. 0 disables
+    # each limit. See app/domain/admission.py
+    upload_max_pending: int = 0
+    upload_max_pending_age: float = 0.0
+    # Threads running the blocking image and task store work of request handlers,
+    # keeping it off the event loop. Requests beyond this wait in a queue.
+    request_thread_pool_size: int = 8
+    # Total size of the thumbnails kept in memory for downloads. 0 disables the cache.
+    result_cache_max_bytes: int = 1024 * 1024 * 32  # 32MB
+    # Folder where task state is stored
     task_queue_data_folder: str = "task_queue_data"
+    # TaskStore implementation: folders on the filesystem or an SQLite database
+    task_store_type: Literal["filesystem", "sqlite"] = "filesystem"
+    # Levels of job id prefix folders under "out" and "error" for FileSystemTaskStore.
+    # 0 is a flat layout, 2 stores thumbnails at out/ab/cd/<job_id>
+    task_queue_shard_depth: int = 0
+    # Answer FileSystemTaskStore status lookups from an in-memory index. Disable when
+    # other processes register results in the same data folder or database, which
+    # also makes requests waiting for jobs poll their status.
+    task_queue_status_index: bool = True
+    # Seconds a FileSystemTaskStore job summary is reused without a status index,
+    # rather than listing every folder for each upload under admission control
+    task_queue_summary_ttl: float = 1.0
+    # Seconds a worker may hold a task without registering a result before the task
+    # is handed to another worker
+    task_lease_seconds: int = 300
+    # Order in which waiting tasks are handed to workers: "fifo", "size" to let small
+    # images overtake large ones, or "unordered". See app/task_queue/scheduling.py
+    task_scheduling: Literal["unordered", "fifo", "size"] = "fifo"
+    # Megapixels of estimated decode cost forgiven per second a task waits under
+    # "size" scheduling, which bounds how long a large image can be overtaken
+    task_aging_rate: float = 1.0
+    # How workers choose between the "interactive" and "batch" priority lanes: "strict"
+    # only takes batch tasks when no interactive task waits, "weighted" shares the
+    # workers between the lanes in the ratio of task_lane_weights (interactive, batch)
+    task_lane_policy: Literal["strict", "weighted"] = "strict"
+    task_lane_weights: Tuple[int, int] = (4, 1)
+    # Run the worker pool inside the API process. Disable to run the workers separately
+    # with "python -m app.task_queue", sharing the task store with the API.
+    run_worker_in_process: bool = True
+    # Number of API server processes per pod. Read from the WEB_CONCURRENCY variable,
+    # which also sets the number of processes started by "fastapi run" and uvicorn.
+    # Above 1, only one of them runs the worker pool, see app/srv/worker_monitor.py
+    web_concurrency: int = 1
+    # File locked by the API process running the worker pool when there are several.
+    # Empty for a file in the temporary directory, which is not shared between pods.
+    worker_lock_file: str = ""
+    # Number of workers processing tasks concurrently in this application instance
+    worker_pool_size: int = 1
+    # Create thumbnails in a pool of processes instead of in the worker threads
+    worker_pool_processes: bool = False
+    # Bounds of the interval at which an idle worker polls for tasks when it isn't
+    # woken up by a new task. The interval doubles every time the queue is empty.
+    worker_min_poll_interval: float = 0.05
+    worker_max_poll_interval: float = 1.0
+    # Named pipe used to wake workers running in other processes on the same host
+    # when a task is added. Empty to only wake workers in the same process, or for a
+    # pipe in the temporary directory when web_concurrency is above 1.
+    task_wakeup_fifo: str = ""
 
     class Config:
         env_file = ".env"
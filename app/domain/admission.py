@@ -0,0 +1,141 @@
+"""Admission control for uploads
+
+When workers fall behind, accepting more uploads only grows the queue and the
+latency of every job in it. Uploads are instead rejected while the queue is
+too deep or its oldest job too old, and clients are told when to retry based
+on how fast the queue is observed to drain.
+
+Exports:
+
+admission_control - The AdmissionControl used when uploading images
+AdmissionControl - Rejects uploads while the task queue is too far behind
+"""
+
+import math
+import threading
+import time
+
+from app import settings
+from app.exceptions import QueueFull
+from app.task_queue import Broker, TaskStatus, TaskSummary
+
+
+class AdmissionControl:
+    """Rejects uploads while the task queue is too far behind.
+
+    The task store is summarized at most once per sample interval, so checking
+    an upload is usually free. Uploads admitted since the last sample are not
+    counted, so the limits may be overshot by one interval's worth of uploads.
+
+    The drain rate is the number of jobs finishing per second while jobs are
+    pending, smoothed across samples. A rejected upload is told to retry after
+    the time it takes the queue to drain back below the limits at that rate.
+
+    Methods:
+    -------
+    check(self, broker: Broker) -> None: Admit an upload, or raise QueueFull
+        if the task queue is too far behind.
+    """
+
+    # Seconds between two summaries of the task store
+    sample_interval = 1.0
+    # Weight of the latest sample in the smoothed drain rate
+    smoothing = 0.3
+    # Bounds of the delay rejected clients are told to retry after, in seconds.
+    # The maximum is also used until a drain rate has been observed.
+    min_retry_after = 1
+    max_retry_after = 300
+
+    def __init__(self, max_pending: int = 0, max_pending_age: float = 0.0) -> None:
+        """
+        :param max_pending: Number of processing jobs at which uploads are
+            rejected. 0 disables the limit.
+        :param max_pending_age: Seconds the oldest processing job may have
+            waited before uploads are rejected. 0 disables the limit.
+        """
+        self.max_pending = max_pending
+        self.max_pending_age = max_pending_age
+        # Jobs finished per second, or None until two samples have been taken
+        self.drain_rate: float | None = None
+        # Number of uploads rejected
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._sampled_at: float | None = None
+        self._finished = 0
+        self._pending = 0
+        self._oldest_pending_at: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is set"""
+        return self.max_pending > 0 or self.max_pending_age > 0
+
+    def check(self, broker: Broker) -> None:
+        """Admit an upload, or raise QueueFull if the task queue is too far behind.
+
+        :param broker: Broker of the task store the upload would be added to
+        :raises: QueueFull with the number of seconds after which to retry
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            sampled_at = self._sampled_at
+            if sampled_at is None or now - sampled_at >= self.sample_interval:
+                self._sample(broker.get_summary(), now)
+            retry_after = self._retry_after()
+            if retry_after is not None:
+                self.rejected += 1
+        if retry_after is not None:
+            raise QueueFull(retry_after)
+
+    def _sample(self, summary: TaskSummary, now: float) -> None:
+        """Record the state of the queue and update the drain rate.
+
+        :param summary: Summary of the task store
+        :param now: Monotonic time at which the summary was taken
+        """
+        finished = summary.counts.get(TaskStatus.SUCCEEDED, 0) + summary.counts.get(
+            TaskStatus.ERROR, 0
+        )
+        # An idle queue drains no faster than jobs arrive, which says nothing
+        # about how fast it can drain, so only busy intervals are measured
+        busy = self._pending > 0
+        if busy and self._sampled_at is not None and now > self._sampled_at:
+            rate = max(finished - self._finished, 0) / (now - self._sampled_at)
+            if self.drain_rate is None:
+                self.drain_rate = rate
+            else:
+                self.drain_rate += self.smoothing * (rate - self.drain_rate)
+        self._sampled_at = now
+        self._finished = finished
+        self._pending = summary.counts.get(TaskStatus.PROCESSING, 0)
+        self._oldest_pending_at = summary.oldest_pending_at
+
+    def _retry_after(self) -> int | None:
+        """Decide whether to reject an upload, and when to have it retried.
+
+        :return: Seconds after which to retry, or None to admit the upload
+        """
+        # Number of processing jobs the queue has to drain down to
+        targets = []
+        if self.max_pending > 0 and self._pending >= self.max_pending:
+            targets.append(self.max_pending - 1)
+        if (
+            self.max_pending_age > 0
+            and self._oldest_pending_at is not None
+            and time.time() - self._oldest_pending_at > self.max_pending_age
+        ):
+            # Jobs beyond this many wait longer than the limit at the drain rate
+            targets.append(int((self.drain_rate or 0.0) * self.max_pending_age))
+        if not targets:
+            return None
+        if not self.drain_rate:
+            return self.max_retry_after
+        wait = (self._pending - min(targets)) / self.drain_rate
+        return min(max(math.ceil(wait), self.min_retry_after), self.max_retry_after)
+
+
+admission_control = AdmissionControl(
+    settings.upload_max_pending, settings.upload_max_pending_age
+)
@@ -1,14 +1,66 @@
 from typing import BinaryIO
 
-from PIL import Image
+from PIL import ExifTags, Image, ImageOps
 
 from app import settings
+from app.task_queue import TaskMetadata
 
 WIDTH = settings.thumbnail_size[0]
 HEIGHT = settings.thumbnail_size[1]
 
+# Reducing gap and resampling filter for each thumbnail quality setting.
+#
+# With a reducing gap, the image is decoded or reduced to no less than
+# (thumbnail size * reducing gap) before the final resize. JPEGs are decoded
+# at that size directly by libjpeg's DCT scaling (Image.draft) and other
+# formats are shrunk by an integer factor with Image.reduce, which is
+# much cheaper than resampling every pixel. The smaller the gap, the
+# faster, but the more aliasing the final resize can introduce. Without
+# one, the image is fully decoded and resampled at native resolution.
+QUALITY_PRESETS: dict[str, tuple[float | None, Image.Resampling]] = {
+    "fast": (1.0, Image.Resampling.BILINEAR),
+    "balanced": (2.0, Image.Resampling.BICUBIC),
+    "best": (None, Image.Resampling.LANCZOS),
+}
 
-def create_thumbnail(image: BinaryIO) -> Image.Image:
+
+# EXIF orientations of images stored sideways, whose width and height are swapped
+# once turned upright, see https://www.cipa.jp/std/documents/e/DC-008-2012_E.pdf
+SIDEWAYS_ORIENTATIONS = {5, 6, 7, 8}
+
+
+# Version of the way thumbnails are created, part of the settings fingerprint.
+# Bump it whenever create_thumbnail changes the thumbnail of an existing image,
+# so uploads are not deduplicated into jobs done the old way.
+# 1: Initial version
+# 2: Thumbnails of images with an EXIF orientation are turned upright
+THUMBNAIL_VERSION = 2
+
+
+def settings_fingerprint() -> bytes:
+    """Fingerprint the settings that determine the thumbnail created from an image.
+
+    Two uploads of the same image give the same thumbnail only if this
+    fingerprint is also the same, so it salts the digests used to
+    deduplicate uploads. It includes THUMBNAIL_VERSION, for the changes
+    to create_thumbnail that no setting controls.
+
+    :return: A byte string that changes whenever any of these settings change
+    """
+    return repr(
+        (
+            THUMBNAIL_VERSION,
+            settings.thumbnail_size,
+            settings.thumbnail_file_type,
+            settings.thumbnail_background,
+            settings.thumbnail_quality,
+        )
+    ).encode()
+
+
+def create_thumbnail(
+    image: BinaryIO, metadata: TaskMetadata | None = None
+) -> Image.Image:
     """Create a thumbnail from an image.
 
     The desired thumbnail size is provided by the global app settings.
@@ -21,12 +73,30 @@ def create_thumbnail(image: BinaryIO) -> Image.Image:
     thumbnail size even if given an image that is not 1:1 aspect ratio. It does
     this by padding the shorter of the two dimensions.
 
+    The image is decoded at reduced resolution, as close to the thumbnail size
+    as the thumbnail quality setting allows. See QUALITY_PRESETS.
+
+    Given the metadata probed from the image on upload, only the decoder for
+    its format is tried.
+
+    A thumbnail of an image with an EXIF orientation is turned upright, as read
+    from the decoded image whether or not it was probed. The small thumbnail is
+    transposed rather than the image.
+
     See https://pillow.readthedocs.io/en/stable/reference/Image.html#create-thumbnails
     :param image: File-like interface to image binary data
+    :param metadata: Metadata of the image, if it was probed on upload
     :return: A PIL Image.Image object representing the thumbnail
     """
-    pil_image: Image.Image = Image.open(image)
-    pil_image.thumbnail(settings.thumbnail_size)
+    reducing_gap, resample = QUALITY_PRESETS[settings.thumbnail_quality]
+    formats = [metadata.format] if metadata and metadata.format else None
+    pil_image: Image.Image = Image.open(image, formats=formats)
+    size = settings.thumbnail_size
+    if pil_image.getexif().get(ExifTags.Base.Orientation) in SIDEWAYS_ORIENTATIONS:
+        size = (size[1], size[0])
+
+    pil_image.thumbnail(size, resample=resample, reducing_gap=reducing_gap)
+    ImageOps.exif_transpose(pil_image, in_place=True)
     if pil_image.size != settings.thumbnail_size:
         pil_image = _add_border_to_thumbnail(pil_image)
     return pil_image.convert("RGB")
@@ -3,17 +3,39 @@
 Exports
 -------
 check_job_status - Get the status of a job by job_id
+get_job_metadata - Get the format and dimensions of the image uploaded for a job
 download_thumbnail - Get the completed thumbnail by job_id
+get_cached_thumbnail - Get the completed thumbnail by job_id, if it is cached
+get_thumbnail_path - Get the path of the completed thumbnail file by job_id, if any
+get_thumbnail_info - Get the ETag, modification time and size of the completed
+    thumbnail by job_id
 get_all_job_ids - Get a list of the ids corresponding to all jobs
     of any status
+get_job_summary - Get the number of jobs in each status and the age of the
+    oldest pending job
+list_jobs - Get one page of job ids and their statuses
 upload_image - Submit an image for thumbnail processing
 """
 
 from app.domain.interactions.check_job_status import (
     check_job_status as check_job_status,
 )
+from app.domain.interactions.check_job_status import (
+    get_job_metadata as get_job_metadata,
+)
 from app.domain.interactions.download_thumbnail import (
     download_thumbnail as download_thumbnail,
 )
+from app.domain.interactions.download_thumbnail import (
+    get_cached_thumbnail as get_cached_thumbnail,
+)
+from app.domain.interactions.download_thumbnail import (
+    get_thumbnail_info as get_thumbnail_info,
+)
+from app.domain.interactions.download_thumbnail import (
+    get_thumbnail_path as get_thumbnail_path,
+)
 from app.domain.interactions.get_all_job_ids import get_all_job_ids as get_all_job_ids
+from app.domain.interactions.get_job_summary import get_job_summary as get_job_summary
+from app.domain.interactions.list_jobs import list_jobs as list_jobs
 from app.domain.interactions.upload_image import upload_image as upload_image
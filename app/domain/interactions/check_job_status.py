@@ -1,5 +1,5 @@
 from app.exceptions import JobNotFound
-from app.task_queue import TaskStatus, get_broker
+from app.task_queue import TaskMetadata, TaskStatus, get_broker
 
 
 def check_job_status(job_id: str) -> tuple[TaskStatus, str | None]:
@@ -21,3 +21,13 @@ def check_job_status(job_id: str) -> tuple[TaskStatus, str | None]:
         message = broker.get_error_result(job_id)
 
     return task_status, message
+
+
+def get_job_metadata(job_id: str) -> TaskMetadata | None:
+    """Get the format and dimensions of the image uploaded for a job.
+
+    :param job_id: The job's ID, as returned from the Broker
+    :return: The metadata probed from the image on upload, or None if it was
+        not probed or the job was not found
+    """
+    return get_broker().get_metadata(job_id)
@@ -1,6 +1,7 @@
+from pathlib import Path
 from typing import BinaryIO
 
-from app.task_queue import get_broker
+from app.task_queue import ResultInfo, get_broker
 
 
 def download_thumbnail(job_id: str) -> BinaryIO:
@@ -10,3 +11,42 @@ def download_thumbnail(job_id: str) -> BinaryIO:
     :return: Binary image data wrapped in a file-like interface
     """
     return get_broker().get_result(job_id)
+
+
+def get_cached_thumbnail(job_id: str) -> tuple[ResultInfo, bytes] | None:
+    """Retrieve the thumbnail for the previously uploaded image, if it is cached
+
+    Recently completed thumbnails are kept in memory, sparing a read from
+    the task store. The task store is not read if the thumbnail is not cached.
+
+    :param job_id: The job's ID, as returned from the Broker
+    :return: ETag, modification time and size of the thumbnail, and its
+        binary image data, or None if the thumbnail is not cached
+    """
+    return get_broker().get_cached_result(job_id)
+
+
+def get_thumbnail_path(job_id: str) -> Path | None:
+    """Locate the file holding the thumbnail for the previously uploaded image
+
+    Serving the file directly avoids reading the thumbnail into memory.
+
+    :param job_id: The job's ID, as returned from the Broker
+    :return: Path of the thumbnail file, or None if thumbnails are not
+        stored as files and must be read with download_thumbnail.
+    :raises: JobNotFound if there is no completed job with the given ID
+    """
+    return get_broker().get_result_path(job_id)
+
+
+def get_thumbnail_info(job_id: str) -> ResultInfo:
+    """Get the validators of the thumbnail for the previously uploaded image
+
+    A thumbnail never changes once created, so clients holding a copy with
+    the same ETag don't need to download it again.
+
+    :param job_id: The job's ID, as returned from the Broker
+    :return: ETag, modification time and size of the thumbnail
+    :raises: JobNotFound if there is no completed job with the given ID
+    """
+    return get_broker().get_result_info(job_id)
@@ -0,0 +1,12 @@
+from app.task_queue import TaskSummary, get_broker
+
+
+def get_job_summary() -> TaskSummary:
+    """Get the number of jobs in each status and the age of the oldest pending job
+
+    The summary is read from counters maintained by the task store, so it is
+    cheap enough to be polled frequently, e.g. by an autoscaler.
+
+    :return: The TaskSummary of the task store
+    """
+    return get_broker().get_summary()
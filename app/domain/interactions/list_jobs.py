@@ -0,0 +1,41 @@
+import base64
+from itertools import islice
+
+from app.exceptions import InvalidCursor
+from app.task_queue import TaskStatus, get_broker
+
+
+def _encode_cursor(job_id: str) -> str:
+    return base64.urlsafe_b64encode(job_id.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        job_id = base64.b64decode(cursor + padding, altchars=b"-_", validate=True)
+        return job_id.decode("ascii")
+    except ValueError as e:  # Includes binascii.Error and UnicodeDecodeError
+        raise InvalidCursor(e)
+
+
+def list_jobs(
+    task_status: TaskStatus | None = None, limit: int = 1000, cursor: str | None = None
+) -> tuple[list[tuple[str, TaskStatus]], str | None]:
+    """Get one page of jobs, in ascending job id order.
+
+    Only the jobs on the page are read from the task store, however many jobs
+    it holds. Pass the returned cursor back to get the next page.
+
+    :param task_status: Only list jobs with this status. None for all jobs.
+    :param limit: Maximum number of jobs on the page
+    :param cursor: Opaque cursor returned with the previous page, if any
+    :return: tuple of the job ids and statuses on the page, and the cursor
+        of the next page, which is None if this is the last page
+    :raises: InvalidCursor if the cursor was not returned by list_jobs
+    """
+    after = _decode_cursor(cursor) if cursor else ""
+    jobs = list(islice(get_broker().iter_jobs(task_status, after), limit + 1))
+    if len(jobs) <= limit:
+        return jobs, None
+    jobs = jobs[:limit]
+    return jobs, _encode_cursor(jobs[-1][0])
@@ -1,26 +1,91 @@
+import struct
 from typing import BinaryIO
 
-from PIL import Image, UnidentifiedImageError
+from PIL import Image
 
+from app import settings
+from app.domain.admission import admission_control
+from app.domain.create_thumbnail import settings_fingerprint
 from app.exceptions import InvalidImage
-from app.task_queue import get_broker
+from app.task_queue import TaskMetadata, TaskPriority, get_broker
 
 
-def upload_image(image: BinaryIO) -> str:
+def _probe_metadata(pil_image: Image.Image) -> TaskMetadata:
+    """Get the metadata of an image from what was parsed of its header.
+
+    :param pil_image: The image, opened but not loaded
+    :return: The metadata of the image
+    """
+    return TaskMetadata(
+        format=pil_image.format or "",
+        width=pil_image.width,
+        height=pil_image.height,
+        mode=pil_image.mode,
+    )
+
+
+def upload_image(
+    image: BinaryIO,
+    priority: TaskPriority = TaskPriority.INTERACTIVE,
+    callback_url: str | None = None,
+) -> str:
     """Accept image data and launch a task to create a thumbnail of it.
 
     The task is performed asynchronously and has an associated id when created.
     This id is returned and can be used to query the status of the job.
 
+    With the "header" upload validation setting, only the image header is
+    parsed here, which is enough to identify its format and dimensions. An image
+    that is corrupt past its header is then rejected by the worker when it
+    decodes the image, and its job reports the error. With "strict", the whole
+    image is checked before the task is created.
+
+    What was parsed of the header is passed on with the task, so the worker
+    does not have to probe the image again.
+
+    Uploads are rejected before the image is read while the task queue is
+    beyond the limits set for admission control.
+
+    If upload deduplication is enabled, an image identical to one uploaded
+    earlier with the same thumbnail settings is given the id of the earlier
+    job, unless that job failed, and is not processed again.
+
+    Given a callback URL, the status of the job is POSTed to it when the job
+    finishes, including when the upload was deduplicated into a finished job.
+
     :param image: BinaryIO file of an image to be resized
+    :param priority: Lane the task waits in, e.g. TaskPriority.BATCH for bulk
+        uploads no client is waiting on
+    :param callback_url: URL to notify when the job finishes
     :return: uuid-compliant str uniquely identifying the task
     :raises: InvalidImage if the file type is not an image or not
-        an image type supported by the image processing library.
+        an image type supported by the image processing library, or if
+        its header is malformed or declares too many pixels to decode.
+    :raises: QueueFull if uploads are being rejected because the task
+        queue is too far behind
+    :raises: InvalidCallbackURL if the callback URL points at a host that is
+        not allowed, or at an address that is not public
     """
+    broker = get_broker()
+    admission_control.check(broker)
+    start = image.tell()
     try:
-        Image.open(image).verify()
-    except UnidentifiedImageError as e:
+        with Image.open(image) as pil_image:
+            metadata = _probe_metadata(pil_image)
+            if settings.upload_validation == "strict":
+                pil_image.verify()
+    except (
+        OSError,
+        SyntaxError,
+        ValueError,
+        struct.error,
+        Image.DecompressionBombError,
+    ) as e:
+        # Includes UnidentifiedImageError. verify() raises either of the first two
+        # for a corrupt image, and some malformed headers raise the others, as does
+        # a header declaring too many pixels to be decoded safely
         raise InvalidImage(e)
 
-    image.seek(0)
-    return get_broker().add_task(image)
+    image.seek(start)
+    dedupe_salt = settings_fingerprint() if settings.upload_deduplication else None
+    return broker.add_task(image, dedupe_salt, metadata, priority, callback_url)
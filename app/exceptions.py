@@ -2,11 +2,28 @@
 
 Exports:
 
+InvalidCallbackURL - Raised when an upload gives a callback URL that may not be notified
+InvalidCursor - Raised when a pagination cursor cannot be decoded
 InvalidImage - Raised when a provided file is not an image type
 JobNotFound - Raised when a requested job is not found
+QueueFull - Raised when an upload is rejected because the task queue is too far behind
 """
 
 
+class InvalidCallbackURL(Exception):
+    """
+    Raised when a callback URL points at a host that is not allowed,
+    or at an address that is not public.
+    """
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a cursor given to continue listing jobs
+    was not one returned by a previous listing.
+    """
+
+
 class InvalidImage(Exception):
     """
     Raised when a provided file is not an image type
@@ -18,3 +35,17 @@ class JobNotFound(Exception):
     Raised when the status or results of a job is queried
     with a job_id that could not be found.
     """
+
+
+class QueueFull(Exception):
+    """
+    Raised when an upload is rejected because the task queue
+    is too far behind to accept more work.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        """
+        :param retry_after: Seconds after which the upload may be retried
+        """
+        super().__init__(f"Task queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
@@ -9,6 +9,7 @@ import logging.config
 
 import yaml
 from fastapi import FastAPI, status
+from fastapi.responses import StreamingResponse
 
 from app import settings
 from app.srv.events import lifespan
@@ -17,12 +18,17 @@ from app.srv.handlers import (
     docs_redirect,
     download_thumbnail_handler,
     get_all_jobs_handler,
+    get_jobs_summary_handler,
     healthcheck,
+    job_events_handler,
+    metrics_handler,
     upload_image_handler,
 )
 from app.srv.middleware import check_content_length
 from app.srv.models import AllJobsModel as AllJobsModel
 from app.srv.models import JobStatusModel as JobStatusModel
+from app.srv.models import JobSummaryModel as JobSummaryModel
+from app.srv.models import MetricsModel as MetricsModel
 from app.srv.models import UploadImageModel as UploadImageModel
 from app.srv.routes import Routes as Routes
 from app.srv.worker_monitor import worker_monitor
@@ -57,22 +63,64 @@ app.get(
 )(check_job_status_handler)
 
 app.get(
+    Routes.JOB_EVENTS,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"text/event-stream": {}},
+            "description": "Server-Sent Events with the status of each job, "
+            "until every job has finished",
+        },
+        status.HTTP_400_BAD_REQUEST: {"description": "Too many job ids"},
+        status.HTTP_404_NOT_FOUND: {
+            "description": "No task associated with one of the provided job ids"
+        },
+    },
+)(job_events_handler)
+
+app.api_route(
     Routes.DOWNLOAD_THUMBNAIL,
+    methods=["GET", "HEAD"],
     responses={
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The client's copy of the thumbnail, identified by the "
+            "'If-None-Match' or 'If-Modified-Since' header, is current"
+        },
         status.HTTP_404_NOT_FOUND: {
             "description": "No thumbnail associated with provided job id"
-        }
+        },
     },
 )(download_thumbnail_handler)
 
 app.get(Routes.HEALTHCHECK)(healthcheck)
 
-app.get(Routes.JOBS)(get_all_jobs_handler)
+app.get(
+    Routes.JOBS,
+    response_model=AllJobsModel,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"application/x-ndjson": {}},
+            "description": "A page of job ids, or every job as newline-delimited "
+            "JSON if the client accepts application/x-ndjson",
+        },
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid cursor"},
+    },
+)(get_all_jobs_handler)
+
+app.get(Routes.JOBS_SUMMARY)(get_jobs_summary_handler)
+
+app.get(Routes.METRICS)(metrics_handler)
 
 app.post(
     Routes.UPLOAD_IMAGE,
     status_code=status.HTTP_202_ACCEPTED,
+    response_model=UploadImageModel,
     responses={
+        status.HTTP_200_OK: {
+            "content": {f"image/{settings.thumbnail_file_type}".lower(): {}},
+            "description": "The thumbnail, if the client asked to wait for it "
+            "and it was created in time",
+        },
         status.HTTP_202_ACCEPTED: {"description": "Image accepted for processing"},
         status.HTTP_411_LENGTH_REQUIRED: {
             "description": "Missing 'content-length' header"
@@ -84,6 +132,10 @@ app.post(
         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: {
             "description": "File type is not supported"
         },
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Too many pending jobs, retry after the number of seconds "
+            "given by the 'Retry-After' header"
+        },
     },
 )(upload_image_handler)
 
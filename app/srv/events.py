@@ -4,13 +4,16 @@ See https://fastapi.tiangolo.com/advanced/events/
 """
 
 import logging
-from asyncio import CancelledError, TimeoutError, create_task, wait_for
+import os
+from asyncio import CancelledError, TimeoutError, create_task, to_thread, wait_for
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
 
-from app.srv.worker_monitor import worker_monitor
+from app import settings
+from app.srv.worker_monitor import claim_worker_lock, worker_monitor
+from app.task_queue import webhook_dispatcher, worker_process_running
 
 logger = logging.getLogger(__name__)
 
@@ -26,16 +29,37 @@ async def lifespan(fastapi_app: FastAPI) -> AsyncGenerator[None, None]:
     On startup:
     - The worker monitor is launched, which watches the task queue worker
         thread and restarts it if it unexpectedly shuts down as it is a
-        critical component.
+        critical component. It is not launched if the workers run in
+        their own process, see app/task_queue/__main__.py. A warning is
+        then logged if no worker process runs in the pod, since uploads
+        would not be processed unless workers run in another pod. With
+        several API processes, only one of them runs the workers at a time.
+    - As the only API process, this process takes the worker lock right
+        away, failing startup if another API process of the pod holds it.
+        See claim_worker_lock.
 
     On shutdown:
     - The worker monitor is sent a cancellation signal and given
         a 5-second grace period is allotted for confirmation before
-        forcibly terminating it.
+        forcibly terminating it. The worker lock is then released.
+    - The completion webhooks still queued are sent, for up to 5 seconds.
 
     :param fastapi_app: The FastApi app
     """
+    if not settings.run_worker_in_process:
+        logger.info("Lifecycle start: task queue workers run in a separate process")
+        if not await to_thread(worker_process_running):
+            logger.warning(
+                "RUN_WORKER_IN_PROCESS is false and no worker process is running in "
+                "this pod. Uploads will not be processed unless workers run in another "
+                'pod. Start them with "python -m app.task_queue".'
+            )
+        yield
+        await to_thread(webhook_dispatcher.stop)
+        return
+
     logger.info("Lifecycle start: launching task queue worker monitor")
+    lock_fd = claim_worker_lock() if settings.web_concurrency == 1 else None
     task = create_task(worker_monitor())
     yield
     logger.info("Lifecycle end: shutting down task queue worker monitor")
@@ -49,3 +73,6 @@ async def lifespan(fastapi_app: FastAPI) -> AsyncGenerator[None, None]:
             "Timed out waiting for task queue worker monitor to confirm cancellation, "
             "forcing shutdown..."
         )
+    if lock_fd is not None:
+        os.close(lock_fd)
+    await to_thread(webhook_dispatcher.stop)
@@ -0,0 +1,97 @@
+"""Thread pool for the blocking work done while handling requests
+
+Handlers are coroutines sharing a single event loop, so any image decoding,
+disk access or database query they perform directly stalls every other request
+being served by the process, health checks included. Such work is awaited on a
+bounded pool of threads instead.
+
+Exports:
+
+request_executor - The RequestExecutor used by the request handlers
+RequestExecutor - Runs blocking functions on a bounded thread pool
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ParamSpec, TypeVar
+
+from app import settings
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class RequestExecutor:
+    """Runs blocking functions on a bounded thread pool and awaits their results.
+
+    Calls beyond the number of threads wait in the pool's queue. The number
+    of calls running and waiting is tracked so the depth of the queue can be
+    reported.
+
+    Methods:
+    -------
+    run(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        Run a blocking function on the thread pool and await its result.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        """
+        :param max_workers: Number of threads in the pool
+        """
+        if max_workers < 1:
+            raise ValueError(
+                f"Request thread pool size must be at least 1, got {max_workers}"
+            )
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="RequestExecutor"
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+
+    @property
+    def running(self) -> int:
+        """Number of calls currently running on a thread"""
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        """Number of calls waiting for a free thread"""
+        with self._lock:
+            # A call whose caller was cancelled is no longer counted as submitted
+            # but keeps its thread until it returns
+            return max(self._submitted - self._running, 0)
+
+    async def run(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        """Run a blocking function on the thread pool and await its result.
+
+        :param func: The function to run
+        :param args: Positional arguments for the function
+        :param kwargs: Keyword arguments for the function
+        :return: The value returned by the function
+        :raises: Any exception raised by the function
+        """
+        with self._lock:
+            self._submitted += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._call, func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._submitted -= 1
+
+    def _call(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+request_executor = RequestExecutor(settings.request_thread_pool_size)
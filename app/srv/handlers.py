@@ -2,22 +2,60 @@
 
 FastAPI performs dependency injection based on the handler's function signature.
 See https://fastapi.tiangolo.com/tutorial/dependencies/
+
+Handlers are coroutines run on the event loop. Domain interactions block on image
+decoding and the task store, so they are awaited on the request executor instead
+of being called directly.
 """
 
-from fastapi import HTTPException, Request, Response, UploadFile, status
-from fastapi.responses import StreamingResponse, RedirectResponse
+import asyncio
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Annotated, AsyncIterator, Iterable
+
+from fastapi import HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from pydantic import AnyHttpUrl
 
 from app import settings
 from app.domain import (
     check_job_status,
     download_thumbnail,
-    get_all_job_ids,
+    get_cached_thumbnail,
+    get_job_metadata,
+    get_job_summary,
+    get_thumbnail_info,
+    get_thumbnail_path,
+    list_jobs,
     upload_image,
 )
-from app.exceptions import InvalidImage, JobNotFound
-from app.srv.models import AllJobsModel, JobStatusModel, UploadImageModel
+from app.domain.admission import admission_control
+from app.exceptions import (
+    InvalidCallbackURL,
+    InvalidCursor,
+    InvalidImage,
+    JobNotFound,
+    QueueFull,
+)
+from app.srv.executor import request_executor
+from app.srv.models import (
+    AllJobsModel,
+    JobStatusModel,
+    JobSummaryModel,
+    MetricsModel,
+    UploadImageModel,
+)
 from app.srv.routes import Routes
-from app.task_queue import TaskStatus
+from app.task_queue import (
+    ResultInfo,
+    TaskPriority,
+    TaskStatus,
+    completion_hub,
+    result_cache,
+    task_store_is_exclusive,
+    webhook_dispatcher,
+)
 
 
 async def healthcheck() -> dict[str, str]:
@@ -32,49 +70,248 @@ async def docs_redirect() -> RedirectResponse:
     return RedirectResponse(url=Routes.DOCS)
 
 
+# Seconds between two status checks of a job a request waits for, when its result
+# may be registered by a worker in another process, which does not notify this one
+JOB_WAIT_POLL_INTERVAL = 0.1
+# Seconds between two status checks of the jobs a request waits for, even when their
+# completion is notified, in case a process sharing the store went unaccounted for
+JOB_RECHECK_INTERVAL = 5.0
+
+
+def _completions_are_notified() -> bool:
+    """Whether every job is completed by a Worker notifying the completion hub.
+
+    :return: True if results are only registered in the task store by this process
+    """
+    return task_store_is_exclusive()
+
+
+def _preferred_wait(request: Request, wait: float | None) -> float:
+    """Get how long an upload may wait for its thumbnail.
+
+    See https://www.rfc-editor.org/rfc/rfc7240#section-4.3
+
+    :param request: The Request object
+    :param wait: Seconds given by the "wait" query parameter, if any
+    :return: Seconds to wait, capped by the upload_max_wait setting. 0 if the
+        client did not ask to wait.
+    """
+    if wait is None:
+        for preference in request.headers.get("prefer", "").split(","):
+            name, _, value = preference.split(";")[0].partition("=")
+            if name.strip().lower() == "wait":
+                try:
+                    wait = float(value.strip().strip('"'))
+                except ValueError:
+                    continue
+    return min(max(wait or 0.0, 0.0), settings.upload_max_wait)
+
+
+async def _wait_for_job(job_id: str, timeout: float) -> tuple[TaskStatus, str | None]:
+    """Wait for a job to leave TaskStatus.PROCESSING.
+
+    Jobs completed by the workers of this process are noticed as soon as
+    their result is registered. Its status is also checked at an interval,
+    short if other processes may complete the job, long otherwise.
+
+    :param job_id: ID of the job
+    :param timeout: Maximum number of seconds to wait
+    :return: The status of the job and associated error message, if any, when
+        it finished or the timeout elapsed
+    :raises: JobNotFound if there is no job with this id
+    """
+    deadline = time.monotonic() + timeout
+    interval = (
+        JOB_RECHECK_INTERVAL if _completions_are_notified() else JOB_WAIT_POLL_INTERVAL
+    )
+    with completion_hub.subscribe(job_id) as completed:
+        while True:
+            job_status, message = await request_executor.run(check_job_status, job_id)
+            remaining = deadline - time.monotonic()
+            if job_status != TaskStatus.PROCESSING or remaining <= 0:
+                return job_status, message
+            try:
+                await asyncio.wait_for(completed.wait(), min(remaining, interval))
+            except TimeoutError:
+                continue
+            completed.clear()
+
+
 async def upload_image_handler(
-    file: UploadFile, response: Response
-) -> UploadImageModel:
+    file: UploadFile,
+    request: Request,
+    response: Response,
+    priority: TaskPriority = TaskPriority.INTERACTIVE,
+    wait: Annotated[float | None, Query(ge=0)] = None,
+    callback_url: AnyHttpUrl | None = None,
+) -> Response | UploadImageModel:
     """Handles requests to convert an image to a thumbnail.
 
+    Bulk uploads that no client is waiting on should be sent with a priority
+    of "batch", so they do not hold up interactive ones.
+
+    While the task queue is too far behind, uploads are rejected with a 503
+    status and a Retry-After header giving the seconds to wait before retrying.
+
+    A client can ask to wait for the thumbnail with the "wait" query parameter
+    or a "Prefer: wait=N" header, in seconds. If the job succeeds in time, the
+    thumbnail is returned right away, saving the status and download requests.
+    The job is recorded as usual either way.
+
+    Services that would rather not poll at all can give a callback URL, which
+    is POSTed a JSON array holding the job_id and status of the job, and its
+    error if any, once the job finishes. Events for the same URL may be
+    batched into one array, and may be delivered more than once. A callback
+    URL whose host is not allowed, or resolves to an address that is not
+    public, is rejected with a 422 status.
+
     :param file: The uploaded file
+    :param request: The Request object
     :param response: The response object
+    :param priority: Lane the task waits in
+    :param wait: Seconds to wait for the thumbnail
+    :param callback_url: URL to notify when the job finishes
     :return: An UploadImageModel with the job_id of the asynchronous thumbnail
         conversion job. The Location response header will be the URL of the
-        job status.
+        job status. If the client waited and the job succeeded in time, the
+        thumbnail instead, with the URL to download it again in the
+        Content-Location header.
     """
     try:
-        job_id = upload_image(file.file)
+        job_id = await request_executor.run(
+            upload_image,
+            file.file,
+            priority,
+            str(callback_url) if callback_url is not None else None,
+        )
     except InvalidImage:
         raise HTTPException(
             status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             detail="Unsupported file type",
         )
+    except InvalidCallbackURL as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending jobs",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    timeout = _preferred_wait(request, wait)
+    if (
+        timeout > 0
+        and (await _wait_for_job(job_id, timeout))[0] == TaskStatus.SUCCEEDED
+    ):
+        info = await request_executor.run(get_thumbnail_info, job_id)
+        thumbnail = await request_executor.run(download_thumbnail, job_id)
+        headers = _thumbnail_headers(info)
+        headers["Content-Location"] = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id)
+        return Response(
+            content=thumbnail.read(),
+            headers=headers,
+            media_type=_thumbnail_media_type(),
+        )
 
     response.headers["Location"] = Routes.CHECK_JOB_STATUS.format(job_id=job_id)
     return UploadImageModel(job_id=job_id)
 
 
-async def download_thumbnail_handler(job_id: str) -> StreamingResponse:
+def _thumbnail_media_type() -> str:
+    return f"image/{settings.thumbnail_file_type}".lower()
+
+
+def _thumbnail_headers(info: ResultInfo) -> dict[str, str]:
+    """Get the validators and caching headers sent with a thumbnail.
+
+    :param info: The validators of the thumbnail
+    :return: The ETag, Last-Modified and Cache-Control headers
+    """
+    return {
+        "ETag": f'"{info.etag}"',
+        "Last-Modified": formatdate(info.last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={settings.thumbnail_cache_max_age}, "
+        "immutable",
+    }
+
+
+def _is_not_modified(request: Request, info: ResultInfo, etag: str) -> bool:
+    """Evaluate the conditional headers of a request for a thumbnail.
+
+    See https://www.rfc-editor.org/rfc/rfc9110#section-13.2.2
+
+    :param request: The Request object
+    :param info: The validators of the thumbnail
+    :param etag: The quoted entity tag of the thumbnail
+    :return: True if the client's copy of the thumbnail is current
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(info.last_modified) <= since
+    return False
+
+
+async def download_thumbnail_handler(job_id: str, request: Request) -> Response:
     """Handles request to download the thumbnail associated with a job id.
 
+    A thumbnail never changes, so it is sent with a strong ETag and may be
+    cached indefinitely. Requests whose If-None-Match or If-Modified-Since
+    header shows the client's copy is current get an empty 304 response.
+
+    Recently completed thumbnails are sent from the result cache. Otherwise,
+    if the task store keeps thumbnails in files, the file is streamed from
+    disk in chunks rather than read into memory as a whole. Failing both,
+    the thumbnail is read from the task store and sent in a single body.
+
     :param job_id:
-    :return: Byte stream of thumbnail image data
+    :param request: The Request object
+    :return: Thumbnail image data
     """
+    media_type = _thumbnail_media_type()
     try:
-        thumbnail = download_thumbnail(job_id)
+        # The cache is only held in memory, so it is read on the event loop
+        cached = get_cached_thumbnail(job_id)
+        if cached is not None:
+            info, thumbnail = cached
+        else:
+            info = await request_executor.run(get_thumbnail_info, job_id)
+        headers = _thumbnail_headers(info)
+        if _is_not_modified(request, info, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if cached is None:
+            path = await request_executor.run(get_thumbnail_path, job_id)
+            if path is not None:
+                return FileResponse(path, headers=headers, media_type=media_type)
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(info.size)
+            return Response(headers=headers, media_type=media_type)
+        if cached is None:
+            thumbnail = (await request_executor.run(download_thumbnail, job_id)).read()
     except JobNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Completed job with ID {job_id} not found",
         )
-    return StreamingResponse(
-        thumbnail, media_type=f"image/{settings.thumbnail_file_type}".lower()
-    )
+    return Response(content=thumbnail, headers=headers, media_type=media_type)
 
 
 async def check_job_status_handler(
-    job_id: str, request: Request, response: Response
+    job_id: str,
+    request: Request,
+    response: Response,
+    wait: Annotated[float | None, Query(ge=0)] = None,
 ) -> JobStatusModel:
     """Check the status of a previously-submitted job.
 
@@ -82,13 +319,26 @@ async def check_job_status_handler(
     be sent a 303 status code with the location of the
     resource in the Location header.
 
+    The format and dimensions of the uploaded image are
+    reported when they were probed on upload.
+
+    A client can long-poll with the "wait" query parameter: the response is
+    held until the job finishes or that many seconds pass, capped by the
+    status_max_wait setting, instead of being sent right away.
+
     :param job_id: The ID of the job to check
     :param request: The Request object
     :param response: The Response object
+    :param wait: Seconds to wait for the job to finish
     :return: A JobStatusModel with the status of the job
     """
     try:
-        job_status, message = check_job_status(job_id)
+        if wait:
+            job_status, message = await _wait_for_job(
+                job_id, min(wait, settings.status_max_wait)
+            )
+        else:
+            job_status, message = await request_executor.run(check_job_status, job_id)
     except JobNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="job not found"
@@ -99,13 +349,262 @@ async def check_job_status_handler(
         response.headers["Location"] = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id)
         response.status_code = status.HTTP_303_SEE_OTHER
 
-    return JobStatusModel(status=job_status, resource_url=message)
+    job_status_model = JobStatusModel(status=job_status, resource_url=message)
+    metadata = await request_executor.run(get_job_metadata, job_id)
+    if metadata is not None:
+        job_status_model.source_format = metadata.format
+        job_status_model.source_width = metadata.width
+        job_status_model.source_height = metadata.height
+    return job_status_model
+
 
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+# Most jobs a single event stream may follow
+JOB_EVENTS_MAX_JOBS = 1000
+# Seconds between two status checks of the jobs an event stream follows, when their
+# results may be registered by a worker in another process
+JOB_EVENTS_POLL_INTERVAL = 1.0
+# Seconds without an event after which a comment is sent to keep the stream open
+JOB_EVENTS_KEEPALIVE_INTERVAL = 15.0
 
-async def get_all_jobs_handler() -> AllJobsModel:
-    """Return all job ids, regardless of status.
 
+def _check_job_statuses(
+    job_ids: Iterable[str],
+) -> dict[str, tuple[TaskStatus, str | None]]:
+    """Get the status of several jobs.
+
+    :param job_ids: IDs of the jobs
+    :return: dict of each job id to its status and associated error message, if
+        any. The status of a job that was not found is TaskStatus.NOT_FOUND.
+    """
+    statuses: dict[str, tuple[TaskStatus, str | None]] = {}
+    for job_id in job_ids:
+        try:
+            statuses[job_id] = check_job_status(job_id)
+        except JobNotFound:
+            statuses[job_id] = (TaskStatus.NOT_FOUND, None)
+    return statuses
+
+
+def _format_event(event: str, data: dict[str, str | None]) -> bytes:
+    """Format a Server-Sent Event.
+
+    See https://html.spec.whatwg.org/multipage/server-sent-events.html
+
+    :param event: Type of the event
+    :param data: Data of the event, sent as JSON
+    :return: The event, ready to be written to the stream
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def _job_status_event(
+    job_id: str, job_status: TaskStatus, message: str | None
+) -> bytes:
+    """Format the status of a job as a "status" event.
+
+    :param job_id: ID of the job
+    :param job_status: Status of the job
+    :param message: Error message of the job, if any
+    :return: The event
+    """
+    data: dict[str, str | None] = {"job_id": job_id, "status": job_status}
+    if job_status == TaskStatus.SUCCEEDED:
+        data["resource_url"] = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id)
+    elif job_status == TaskStatus.ERROR:
+        data["error"] = message
+    return _format_event("status", data)
+
+
+async def _stream_job_events(job_ids: list[str]) -> AsyncIterator[bytes]:
+    """Stream the status of jobs as Server-Sent Events until they all finish.
+
+    The current status of every job is sent first, then the status of each
+    job as it finishes, and an "end" event once none is processing.
+
+    :param job_ids: IDs of the jobs
+    :return: Async iterator of events
+    """
+    interval = (
+        JOB_RECHECK_INTERVAL
+        if _completions_are_notified()
+        else JOB_EVENTS_POLL_INTERVAL
+    )
+    with completion_hub.subscribe_many(job_ids) as completed:
+        statuses = await request_executor.run(_check_job_statuses, job_ids)
+        for job_id, (job_status, message) in statuses.items():
+            yield _job_status_event(job_id, job_status, message)
+        pending = {
+            job_id
+            for job_id, (job_status, _) in statuses.items()
+            if job_status == TaskStatus.PROCESSING
+        }
+        last_sent = time.monotonic()
+        while pending:
+            try:
+                ready = {await asyncio.wait_for(completed.get(), interval)}
+                while not completed.empty():
+                    ready.add(completed.get_nowait())
+            except TimeoutError:
+                ready = set(pending)
+            ready &= pending
+            if ready:
+                statuses = await request_executor.run(_check_job_statuses, ready)
+                for job_id, (job_status, message) in statuses.items():
+                    if job_status != TaskStatus.PROCESSING:
+                        pending.discard(job_id)
+                        last_sent = time.monotonic()
+                        yield _job_status_event(job_id, job_status, message)
+            if time.monotonic() - last_sent >= JOB_EVENTS_KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield b": keepalive\n\n"
+        yield _format_event("end", {})
+
+
+async def job_events_handler(
+    job_ids: Annotated[list[str], Query(alias="job_id")],
+) -> StreamingResponse:
+    """Stream the status of one or more jobs as Server-Sent Events.
+
+    Each "status" event is a JSON object with the "job_id" and "status" of a
+    job, and the "resource_url" of its thumbnail or its "error" once it has
+    finished. The current status of every job is sent first, then the status
+    of each job as it finishes. An "end" event is sent and the stream closed
+    once every job has finished.
+
+    :param job_ids: IDs of the jobs, given as repeated "job_id" query parameters
+    :return: A stream of text/event-stream events
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    if len(job_ids) > JOB_EVENTS_MAX_JOBS:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"At most {JOB_EVENTS_MAX_JOBS} jobs can be followed at a time",
+        )
+    # Fail before the response starts instead of midway through the stream
+    statuses = await request_executor.run(_check_job_statuses, job_ids)
+    not_found = [
+        job_id
+        for job_id, (job_status, _) in statuses.items()
+        if job_status == TaskStatus.NOT_FOUND
+    ]
+    if not_found:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Jobs not found: {', '.join(not_found)}"
+        )
+    return StreamingResponse(
+        _stream_job_events(job_ids),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Number of jobs read from the task store at a time when streaming all jobs
+NDJSON_BATCH_SIZE = 5000
+
+
+async def _stream_jobs(
+    task_status: TaskStatus | None, cursor: str | None
+) -> AsyncIterator[bytes]:
+    """Stream jobs as newline-delimited JSON objects, one batch at a time.
+
+    :param task_status: Only list jobs with this status. None for all jobs.
+    :param cursor: Cursor of the first batch, if any
+    :return: Async iterator of chunks of the response body
+    """
+    while True:
+        jobs, cursor = await request_executor.run(
+            list_jobs, task_status, NDJSON_BATCH_SIZE, cursor
+        )
+        yield "".join(
+            json.dumps({"job_id": job_id, "status": job_status}) + "\n"
+            for job_id, job_status in jobs
+        ).encode()
+        if cursor is None:
+            return
+
+
+async def get_all_jobs_handler(
+    request: Request,
+    job_status: Annotated[TaskStatus | None, Query(alias="status")] = None,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 1000,
+    cursor: str | None = None,
+) -> Response | AllJobsModel:
+    """Return a page of job ids in ascending order, optionally filtered by status.
+
+    The response includes a cursor to pass back to get the next page.
+    Clients accepting application/x-ndjson are instead streamed every job
+    after the cursor, one {"job_id": ..., "status": ...} object per line.
+
+    :param request: The Request object
+    :param job_status: Only list jobs with this status
+    :param limit: Maximum number of job ids in the page
+    :param cursor: Cursor returned with the previous page
     :return: An AllJobsModel instance which contains the job ids
     """
-    job_ids = get_all_job_ids()
-    return AllJobsModel(job_ids=job_ids)
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        if cursor is not None:
+            # Fail before the response starts instead of midway through the stream
+            try:
+                await request_executor.run(list_jobs, job_status, 1, cursor)
+            except InvalidCursor:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+        return StreamingResponse(
+            _stream_jobs(job_status, cursor), media_type=NDJSON_MEDIA_TYPE
+        )
+
+    try:
+        jobs, next_cursor = await request_executor.run(
+            list_jobs, job_status, limit, cursor
+        )
+    except InvalidCursor:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+    return AllJobsModel(job_ids=[job_id for job_id, _ in jobs], next_cursor=next_cursor)
+
+
+async def get_jobs_summary_handler() -> JobSummaryModel:
+    """Return the number of jobs in each status and the age of the oldest pending job.
+
+    The number of jobs processing is also broken down by priority lane.
+
+    :return: A JobSummaryModel with the job counts
+    """
+    summary = await request_executor.run(get_job_summary)
+    oldest_pending_age = None
+    if summary.oldest_pending_at is not None:
+        oldest_pending_age = max(time.time() - summary.oldest_pending_at, 0.0)
+    return JobSummaryModel(
+        processing=summary.counts.get(TaskStatus.PROCESSING, 0),
+        succeeded=summary.counts.get(TaskStatus.SUCCEEDED, 0),
+        error=summary.counts.get(TaskStatus.ERROR, 0),
+        oldest_pending_age=oldest_pending_age,
+        processing_by_priority={
+            lane: summary.pending_by_priority.get(lane, 0) for lane in TaskPriority
+        },
+    )
+
+
+async def metrics_handler() -> MetricsModel:
+    """Report runtime metrics of the application.
+
+    :return: A MetricsModel with the size and load of the request executor,
+        the number of uploads rejected by admission control, the counters of
+        the completion webhooks and of the thumbnail cache
+    """
+    metrics = MetricsModel(
+        request_threads=request_executor.max_workers,
+        requests_running=request_executor.running,
+        requests_queued=request_executor.queued,
+        uploads_rejected=admission_control.rejected,
+        webhooks_delivered=webhook_dispatcher.delivered,
+        webhooks_failed=webhook_dispatcher.failed,
+        webhooks_dropped=webhook_dispatcher.dropped,
+    )
+    if result_cache is not None:
+        metrics.result_cache_bytes = result_cache.size
+        metrics.result_cache_entries = len(result_cache)
+        metrics.result_cache_hits = result_cache.hits
+        metrics.result_cache_misses = result_cache.misses
+        metrics.result_cache_evictions = result_cache.evictions
+    return metrics
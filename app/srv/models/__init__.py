@@ -6,9 +6,13 @@ Exports:
 
 AllJobsModel - Defines schema for response to a request to get all job ids
 JobStatusModel - Defines schema for response to a request to get job status
+JobSummaryModel - Defines schema for response to a request to get job counts
+MetricsModel - Defines schema for response to a request to get runtime metrics
 UploadImageModel - Defines schema for response to a request to create a thumbnail
 """
 
 from app.srv.models.all_jobs import AllJobsModel as AllJobsModel
 from app.srv.models.job_status import JobStatusModel as JobStatusModel
+from app.srv.models.job_summary import JobSummaryModel as JobSummaryModel
+from app.srv.models.metrics import MetricsModel as MetricsModel
 from app.srv.models.upload_image import UploadImageModel as UploadImageModel
@@ -5,6 +5,9 @@ class AllJobsModel(BaseModel):
     """Defines schema for response to a request to get all job ids
 
     :cvar job_ids: Field validating and storing a list of job ids
+    :cvar next_cursor: Field validating the cursor of the next page of job ids,
+        or None if this is the last page
     """
 
     job_ids: list[str]
+    next_cursor: str | None = None
@@ -12,25 +12,37 @@ class JobStatusModel(BaseModel):
         will become the "error" key in the response JSON if
         the task's status is TaskStatus.ERROR. Otherwise, it
         will contain the URL to the resource created by the task.
+    :cvar source_format: Format of the uploaded image, if known
+    :cvar source_width: Width of the uploaded image in pixels, if known
+    :cvar source_height: Height of the uploaded image in pixels, if known
     """
 
     model_config = ConfigDict(populate_by_name=True)
 
     status: TaskStatus
     resource_url: str | None = Field(alias="error", default=None)
+    source_format: str | None = None
+    source_width: int | None = None
+    source_height: int | None = None
 
     @model_serializer
-    def serialize_model(self) -> dict[str, str | None]:
+    def serialize_model(self) -> dict[str, str | int | None]:
         """Defines custom serialization logic for the entire model.
 
         See https://docs.pydantic.dev/latest/api/functional_serializers/#pydantic.functional_serializers.model_serializer
 
         The effect of this custom serializer is changing the "resource_url" field name
         to "error" if the task status is in error and an error message is being returned.
+        The source image fields are left out when they are not known.
 
         :return: dict representing the serialized model
         """
-        data: dict[str, str | None] = {"status": self.status}
+        data: dict[str, str | int | None] = {"status": self.status}
         if self.status == TaskStatus.ERROR:
             data["error"] = self.resource_url
+        if self.source_format is not None:
+            data["source_format"] = self.source_format
+        if self.source_width is not None and self.source_height is not None:
+            data["source_width"] = self.source_width
+            data["source_height"] = self.source_height
         return data
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+from app.task_queue.scheduling import TaskPriority
+
+
+class JobSummaryModel(BaseModel):
+    """Schema for job summary API requests
+
+    :cvar processing: Field validating the number of jobs waiting for or
+        undergoing processing
+    :cvar succeeded: Field validating the number of completed jobs
+    :cvar error: Field validating the number of failed jobs
+    :cvar oldest_pending_age: Field validating the number of seconds since the
+        oldest job still processing was submitted, or None if there is none
+    :cvar processing_by_priority: Field validating the number of jobs waiting
+        for or undergoing processing in each priority lane
+    """
+
+    processing: int
+    succeeded: int
+    error: int
+    oldest_pending_age: float | None
+    processing_by_priority: dict[TaskPriority, int]
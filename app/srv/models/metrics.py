@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+
+
+class MetricsModel(BaseModel):
+    """Schema for runtime metrics API requests
+
+    :cvar request_threads: Field validating the size of the thread pool
+        running the blocking work of request handlers
+    :cvar requests_running: Field validating the number of handler calls
+        running on the thread pool
+    :cvar requests_queued: Field validating the number of handler calls
+        waiting for a free thread
+    :cvar uploads_rejected: Field validating the number of uploads rejected
+        because the task queue was too far behind
+    :cvar webhooks_delivered: Field validating the number of completion events
+        delivered to callback URLs by this process
+    :cvar webhooks_failed: Field validating the number of completion events
+        given up on after failed deliveries
+    :cvar webhooks_dropped: Field validating the number of completion events
+        dropped because too many were pending
+    :cvar result_cache_bytes: Field validating the total size of the cached
+        thumbnails
+    :cvar result_cache_entries: Field validating the number of cached thumbnails
+    :cvar result_cache_hits: Field validating the number of thumbnail reads
+        answered by the cache
+    :cvar result_cache_misses: Field validating the number of thumbnail reads
+        that went to the task store
+    :cvar result_cache_evictions: Field validating the number of thumbnails
+        evicted to make room for others
+    """
+
+    request_threads: int
+    requests_running: int
+    requests_queued: int
+    uploads_rejected: int = 0
+    webhooks_delivered: int = 0
+    webhooks_failed: int = 0
+    webhooks_dropped: int = 0
+    result_cache_bytes: int = 0
+    result_cache_entries: int = 0
+    result_cache_hits: int = 0
+    result_cache_misses: int = 0
+    result_cache_evictions: int = 0
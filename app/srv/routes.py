@@ -12,5 +12,8 @@ class Routes(StrEnum):
     DOCS = "/docs"
     DOWNLOAD_THUMBNAIL = "/download_thumbnail/{job_id}"
     HEALTHCHECK = "/healthcheck"
+    JOB_EVENTS = "/job_events"
     JOBS = "/jobs"
+    JOBS_SUMMARY = "/jobs/summary"
+    METRICS = "/metrics"
     UPLOAD_IMAGE = "/upload_image"
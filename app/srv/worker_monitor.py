@@ -1,56 +1,129 @@
+import fcntl
 import logging
+import os
 from asyncio import CancelledError, TimeoutError, sleep, to_thread, wait_for
 
+from app import settings
 from app.domain import create_thumbnail
-from app.task_queue import create_worker
-from app.task_queue.worker import Worker
+from app.task_queue import create_worker_pool, runtime_file_path
 
 logger = logging.getLogger(__name__)
 
+# Seconds between two attempts to take the worker lock
+LOCK_RETRY_INTERVAL = 1.0
+
+
+def _worker_lock_path() -> str:
+    """Get the path of the lock file of the worker pool of the pod."""
+    return settings.worker_lock_file or runtime_file_path("workers.lock")
+
+
+def claim_worker_lock() -> int:
+    """Take the lock of the worker pool of the pod, as its only API process.
+
+    The web_concurrency setting is not set by "fastapi run --workers" or
+    "uvicorn --workers", whose processes would then each run a worker pool
+    and believe they are alone in registering results. Taking the lock
+    without waiting detects another API process in the pod, so startup fails
+    instead.
+
+    :return: File descriptor holding the lock. Closing it releases the lock.
+    :raises: RuntimeError if another process of the pod holds the lock
+    """
+    path = _worker_lock_path()
+    # Not inherited by the processes this one starts, which would keep holding it
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise RuntimeError(
+            f"Another process holds {path}, so several API processes are running "
+            "while WEB_CONCURRENCY is 1. Set WEB_CONCURRENCY to the number of API "
+            "processes, e.g. the value of the --workers option."
+        )
+    return fd
+
+
+async def _acquire_worker_lock(path: str) -> int:
+    """Wait until this process holds the lock of the worker pool of the pod.
+
+    The lock is an exclusive flock on a file, which the kernel releases
+    when the process holding it exits, however it exits. The processes
+    waiting for it then race to take it over.
+
+    :param path: Path of the lock file, created if it does not exist
+    :return: File descriptor holding the lock. Closing it releases the lock.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                await sleep(LOCK_RETRY_INTERVAL)
+    except BaseException:
+        os.close(fd)
+        raise
+
 
 async def worker_monitor() -> None:
-    """Start and monitor the task queue worker thread
+    """Start and monitor the task queue worker threads
 
-    The worker thread is a mission-critical process
+    The worker threads are a mission-critical component
     that watches for thumbnail-creation tasks. If
-    the worker is not available, images can still
+    no worker is available, images can still
     be uploaded, but will never be processed into
     thumbnails.
 
-    This worker monitor watches the worker and will
-    restart it indefinitely whenever it dies, which
-    it never should, but...
+    This worker monitor starts a pool of workers, sized
+    by global settings, and supervises each of them,
+    restarting any worker indefinitely whenever it dies,
+    which it never should, but...
+
+    When several API processes serve the pod, only the
+    one holding the worker lock starts the pool. The
+    others wait for the lock, and one of them takes over
+    if that process exits.
 
     The application will start and stop this monitor
     automatically as part of its startup/shutdown lifecycle.
     """
+    lock_fd = None
+    if settings.web_concurrency > 1:
+        lock_path = _worker_lock_path()
+        logger.info(f"Waiting for {lock_path} to run the worker pool")
+        lock_fd = await _acquire_worker_lock(lock_path)
+    try:
+        await _supervise_worker_pool()
+    finally:
+        if lock_fd is not None:
+            os.close(lock_fd)
 
-    def start_worker() -> Worker:
-        w = create_worker(create_thumbnail)
-        w.start()
-        return w
 
+async def _supervise_worker_pool() -> None:
+    """Start a pool of workers and restart any that dies, until cancelled."""
     logger.info("Starting worker monitor")
-    worker = start_worker()
+    pool = create_worker_pool(create_thumbnail)
+    pool.start()
     try:
         while True:
             try:
-                if not worker.is_alive():
-                    logger.warning("Worker process no longer alive, restarting")
-                    worker = start_worker()
+                pool.restart_dead_workers()
             except Exception as e:
                 logging.exception(e)
             await sleep(1)
     except CancelledError:
         logger.info(
-            "Worker monitor received cancellation signal, requesting worker to shutdown"
+            "Worker monitor received cancellation signal, requesting workers to stop"
         )
         raise
     finally:
-        worker.interrupt()
+        pool.interrupt()
         try:
-            await wait_for(to_thread(worker.join), timeout=5)
+            await wait_for(to_thread(pool.join), timeout=5)
         except TimeoutError:
             logger.warning(
-                "Timed out waiting for worker thread to stop, forcing shutdown"
+                "Timed out waiting for worker threads to stop, forcing shutdown"
             )
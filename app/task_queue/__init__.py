@@ -10,27 +10,211 @@ Broker -> TaskStore <- Worker
 
 - The Worker, running on a separate thread, queries the TaskStore
     for a new task, and when one is available, processes the task
-    and registers the result back to the store.
+    and registers the result back to the store. A WorkerPool runs
+    several Workers against the same TaskStore.
 
 - The TaskStore stores the job requests and processed results. Because
     it obfuscates the internals of how this is done via an interface, any
     storage implementation can be used. The default for this application
     is FileSystemTaskStore, which saves the job request and results to
-    the filesystem.
-"""
+    the filesystem. SQLiteTaskStore, which keeps them in an indexed
+    SQLite table, can be selected with the "task_store_type" setting.
+
+- The ResultCache keeps recently completed thumbnails in memory. The
+    TaskStore adds each thumbnail as it is registered, and the Broker
+    reads from the cache before going to the TaskStore.
+
+- The CompletionHub lets request handlers await the completion of a
+    job. The Workers notify it as they register each result.
 
-from typing import BinaryIO, Callable
+- The WebhookDispatcher POSTs the result of each job to the callback
+    URLs given with its uploads, on background threads, so the Workers
+    never wait on outbound HTTP.
+"""
 
-from PIL.Image import Image
+import fcntl
+import os
+import tempfile
+import threading
 
-from app import settings
+from app import Settings, settings
+from app.task_queue.completion import CompletionHub as CompletionHub
+from app.task_queue.notifier import TaskNotifier
+from app.task_queue.result_cache import ResultCache as ResultCache
+from app.task_queue.scheduling import LaneScheduler
+from app.task_queue.scheduling import TaskPriority as TaskPriority
 from app.task_queue.task_broker import Broker as Broker
-from app.task_queue.task_store import FileSystemTaskStore
+from app.task_queue.task_store import FileSystemTaskStore, SQLiteTaskStore
+from app.task_queue.task_store import QueuedTask as QueuedTask
+from app.task_queue.task_store import ResultInfo as ResultInfo
+from app.task_queue.task_store import Task as Task
+from app.task_queue.task_store import TaskMetadata as TaskMetadata
 from app.task_queue.task_store import TaskStatus as TaskStatus
+from app.task_queue.task_store import TaskSummary as TaskSummary
+from app.task_queue.webhooks import WebhookDispatcher as WebhookDispatcher
+from app.task_queue.worker import TaskFunc as TaskFunc
 from app.task_queue.worker import Worker as Worker
+from app.task_queue.worker_pool import WorkerPool as WorkerPool
+
+
+def runtime_file_path(name: str) -> str:
+    """Get the path of a file coordinating the processes of this pod.
+
+    :param name: Name of the file, without the application name
+    :return: Path of the file in the temporary directory
+    """
+    return os.path.join(tempfile.gettempdir(), f"{settings.app_name}-{name}")
+
+
+def hold_worker_process_lock() -> int:
+    """Declare that a standalone worker process runs in this pod.
+
+    Each worker process holds a shared flock on a file in the temporary
+    directory, which the kernel releases when the process exits, however
+    it exits, so the API can tell whether any of them is running.
 
-# Global filesystem task store
-task_store = FileSystemTaskStore(settings.task_queue_data_folder)
+    :return: File descriptor holding the lock. Closing it releases the lock.
+    """
+    fd = os.open(
+        runtime_file_path("worker-process.lock"),
+        os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+        0o644,
+    )
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    return fd
+
+
+def worker_process_running() -> bool:
+    """Whether a standalone worker process runs in this pod.
+
+    Worker processes running in other pods cannot be seen.
+
+    :return: True if a process holds the lock taken by hold_worker_process_lock
+    """
+    fd = os.open(
+        runtime_file_path("worker-process.lock"),
+        os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+        0o644,
+    )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def task_store_is_exclusive(config: Settings = settings) -> bool:
+    """Whether results are only registered in the task store by this process.
+
+    That is the case when the workers run in this process, it is the only API
+    process, and the store is not shared with other pods or standalone workers,
+    as declared by the task_queue_status_index setting.
+
+    :param config: Settings to check. Defaults to the global settings.
+    :return: True if no other process registers results in the task store
+    """
+    return (
+        config.task_queue_status_index
+        and config.run_worker_in_process
+        and config.web_concurrency == 1
+    )
+
+
+def create_task_store(
+    config: Settings,
+    result_cache: ResultCache | None = None,
+    worker_id: str | None = None,
+) -> FileSystemTaskStore | SQLiteTaskStore:
+    """Create the TaskStore implementation selected by the given settings.
+
+    The status index of a FileSystemTaskStore is only enabled when the task
+    store is exclusive to this process, since the index does not see the
+    results registered by other processes.
+
+    The application creates its task store on first use, with the global
+    settings, so you probably want get_task_store instead.
+
+    :param config: Settings selecting and configuring the TaskStore
+    :param result_cache: Cache to add each registered result to
+    :param worker_id: Name of the folder of the tasks claimed by this
+        FileSystemTaskStore. Defaults to one unique to this process.
+    :return: TaskStore instance
+    """
+    lanes = LaneScheduler(
+        config.task_lane_policy, dict(zip(TaskPriority, config.task_lane_weights))
+    )
+    if config.task_store_type == "sqlite":
+        return SQLiteTaskStore(
+            config.task_queue_data_folder,
+            config.task_lease_seconds,
+            result_cache=result_cache,
+            scheduling=config.task_scheduling,
+            aging_rate=config.task_aging_rate,
+            lanes=lanes,
+        )
+    return FileSystemTaskStore(
+        config.task_queue_data_folder,
+        config.task_queue_shard_depth,
+        task_store_is_exclusive(config),
+        config.task_lease_seconds,
+        worker_id,
+        result_cache=result_cache,
+        scheduling=config.task_scheduling,
+        aging_rate=config.task_aging_rate,
+        lanes=lanes,
+        summary_ttl=config.task_queue_summary_ttl,
+    )
+
+
+# Global cache of recently completed thumbnails, None when disabled
+result_cache = (
+    ResultCache(settings.result_cache_max_bytes)
+    if settings.result_cache_max_bytes > 0
+    else None
+)
+# Global task store, created on first use by get_task_store
+_task_store: FileSystemTaskStore | SQLiteTaskStore | None = None
+_task_store_lock = threading.Lock()
+# Global hub notified by the workers of this process as they complete jobs
+completion_hub = CompletionHub()
+# Global dispatcher delivering the results of jobs to their callback URLs
+webhook_dispatcher = WebhookDispatcher(
+    settings.webhook_max_pending,
+    settings.webhook_batch_size,
+    settings.webhook_concurrency,
+    settings.webhook_max_attempts,
+    settings.webhook_backoff,
+    settings.webhook_timeout,
+    settings.webhook_allowed_hosts,
+    settings.webhook_allow_private_addresses,
+)
+# Global notifier waking idle workers when the broker adds a task. Several API
+# processes share a named pipe to wake the workers of the one running them.
+notifier = TaskNotifier(
+    settings.task_wakeup_fifo
+    or (runtime_file_path("wakeup.fifo") if settings.web_concurrency > 1 else None)
+)
+
+
+def get_task_store() -> FileSystemTaskStore | SQLiteTaskStore:
+    """
+    Get the TaskStore implementation selected by global settings,
+    creating it on first use. This behaves like a singleton.
+
+    The store is not created on import, since the processes of a
+    WorkerPool in process mode import this package to unpickle the
+    task function, and must not open the store, nor list its jobs
+    to build the status index.
+
+    :return: TaskStore instance
+    """
+    global _task_store
+    with _task_store_lock:
+        if _task_store is None:
+            _task_store = create_task_store(settings, result_cache)
+        return _task_store
 
 
 def get_broker() -> Broker:
@@ -43,10 +227,10 @@ def get_broker() -> Broker:
 
     :return: Broker instance
     """
-    return Broker(task_store)
+    return Broker(get_task_store(), notifier, result_cache, webhook_dispatcher)
 
 
-def create_worker(task_func: Callable[[BinaryIO], Image]) -> Worker:
+def create_worker(task_func: TaskFunc) -> Worker:
     """
     Create a Worker using the TaskStore implementation provided
     by global settings. This behaves like a singleton.
@@ -57,4 +241,28 @@ def create_worker(task_func: Callable[[BinaryIO], Image]) -> Worker:
     :param task_func: Callable the worker will use to process a task.
     :return: Worker instance
     """
-    return Worker(task_store, task_func)
+    return Worker(
+        get_task_store(), task_func, notifier, completion_hub, webhook_dispatcher
+    )
+
+
+def create_worker_pool(task_func: TaskFunc) -> WorkerPool:
+    """
+    Create a WorkerPool using the TaskStore implementation and
+    the pool size and mode provided by global settings.
+
+    The application creates the pool automatically on startup, so
+    you probably won't need to use this.
+
+    :param task_func: Callable the workers will use to process a task.
+    :return: WorkerPool instance, not yet started
+    """
+    return WorkerPool(
+        get_task_store(),
+        task_func,
+        settings.worker_pool_size,
+        settings.worker_pool_processes,
+        notifier,
+        completion_hub,
+        webhook_dispatcher,
+    )
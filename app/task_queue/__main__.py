@@ -0,0 +1,81 @@
+"""Standalone worker process
+
+Runs a pool of workers, sized by global settings, against the configured task
+store, without the API. Together with the "run_worker_in_process" setting, this
+lets the API and the workers run in separate processes or pods that share the
+task store, and be scaled independently:
+
+    python -m app.task_queue
+
+The process runs until it receives SIGINT or SIGTERM. Each worker then finishes
+the task it is processing, and the completion webhooks still queued are sent,
+before the process exits.
+"""
+
+import logging
+import logging.config
+import os
+import signal
+import threading
+from types import FrameType
+
+import yaml
+
+from app import settings
+from app.domain import create_thumbnail
+from app.task_queue import (
+    create_worker_pool,
+    hold_worker_process_lock,
+    webhook_dispatcher,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks for dead workers
+SUPERVISE_INTERVAL = 1.0
+
+
+def run_workers(stop: threading.Event) -> None:
+    """Start a pool of workers and restart any that dies, until asked to stop.
+
+    :param stop: Event set to stop the workers
+    """
+    logger.info("Starting worker pool")
+    lock_fd = hold_worker_process_lock()
+    pool = create_worker_pool(create_thumbnail)
+    pool.start()
+    try:
+        while not stop.wait(SUPERVISE_INTERVAL):
+            try:
+                pool.restart_dead_workers()
+            except Exception as e:
+                logger.exception(e)
+    finally:
+        logger.info("Stopping worker pool, waiting for running tasks to finish")
+        pool.interrupt()
+        pool.join()
+        webhook_dispatcher.stop()
+        os.close(lock_fd)
+
+
+def main() -> None:
+    try:
+        with open(settings.log_conf_file, "rb") as f:
+            logging.config.dictConfig(yaml.safe_load(f.read()))
+    except Exception as e:
+        logging.basicConfig(level=logging.INFO)
+        logger.exception(e, exc_info=True)
+
+    stop = threading.Event()
+
+    def request_stop(signum: int, frame: FrameType | None) -> None:
+        logger.info(f"Received {signal.Signals(signum).name}")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    run_workers(stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Collection, Iterator
+
+# Loop of a waiting coroutine, and the callback run on it when a job is completed
+_Subscriber = tuple[asyncio.AbstractEventLoop, Callable[[str], object]]
+
+
+class CompletionHub:
+    """Lets coroutines wait for jobs to be completed by the Workers of this process.
+
+    Workers run on threads, and the coroutines waiting on them run on an event
+    loop, so each subscription is an asyncio.Event that a Worker sets through
+    its loop's call_soon_threadsafe when it registers the result of the job.
+
+    Jobs completed by Workers in other processes are not notified, so a waiter
+    should also check the status of the job from time to time.
+
+    Methods:
+    -------
+    subscribe(self, job_id: str) -> ContextManager[asyncio.Event]: Get an event
+        set when the job is completed, for the duration of the context.
+    subscribe_many(self, job_ids: Collection[str]) -> ContextManager[asyncio.Queue]:
+        Get a queue receiving the id of each of the jobs as it is completed,
+        for the duration of the context.
+    notify(self, job_id: str) -> None: Signal that the result of a job was
+        registered.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, list[_Subscriber]] = {}
+
+    @contextmanager
+    def subscribe(self, job_id: str) -> Iterator[asyncio.Event]:
+        """Get an event set when the job is completed, for the duration of the context.
+
+        Must be called from a coroutine. Subscribe before checking the status
+        of the job, so a job completed in between is not missed.
+
+        :param job_id: ID of the job
+        :return: Context manager of the event
+        """
+        completed = asyncio.Event()
+        with self._subscription([job_id], lambda _: completed.set()):
+            yield completed
+
+    @contextmanager
+    def subscribe_many(self, job_ids: Collection[str]) -> Iterator[asyncio.Queue[str]]:
+        """Get a queue receiving the id of each of the jobs as it is completed,
+        for the duration of the context.
+
+        Must be called from a coroutine. Subscribe before checking the status
+        of the jobs, so a job completed in between is not missed.
+
+        :param job_ids: IDs of the jobs
+        :return: Context manager of the queue
+        """
+        completed: asyncio.Queue[str] = asyncio.Queue()
+        with self._subscription(job_ids, completed.put_nowait):
+            yield completed
+
+    @contextmanager
+    def _subscription(
+        self, job_ids: Collection[str], callback: Callable[[str], object]
+    ) -> Iterator[None]:
+        """Call a callback on the running loop whenever one of the jobs is completed.
+
+        :param job_ids: IDs of the jobs
+        :param callback: Called with the id of each completed job
+        :return: Context manager of the subscription
+        """
+        subscriber = (asyncio.get_running_loop(), callback)
+        with self._lock:
+            for job_id in job_ids:
+                self._subscribers.setdefault(job_id, []).append(subscriber)
+        try:
+            yield
+        finally:
+            with self._lock:
+                for job_id in job_ids:
+                    subscribers = self._subscribers[job_id]
+                    subscribers.remove(subscriber)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+    def notify(self, job_id: str) -> None:
+        """Signal that the result of a job was registered.
+
+        :param job_id: ID of the job
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, callback in subscribers:
+            try:
+                loop.call_soon_threadsafe(callback, job_id)
+            except RuntimeError:
+                # The loop was closed since the subscriber last ran
+                continue
@@ -0,0 +1,130 @@
+import errno
+import logging
+import os
+import select
+import stat
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TaskNotifier:
+    """Wakes up idle Workers as soon as a task is added to the queue.
+
+    Workers in the same process as the Broker wait on a condition variable.
+    When a FIFO path is given, every notification is also written to that
+    named pipe, and each process with waiting Workers runs a listener thread
+    that turns bytes read from the pipe into a local notification. This lets
+    a Broker wake Workers running in a separate process on the same host.
+
+    Notifications are counted by a generation number. A Worker reads the
+    generation before asking the TaskStore for a task, and waits for it to
+    change, so a task added in between is never missed.
+
+    Methods:
+    -------
+    notify(self) -> None: Signal that a task was added to the queue.
+    wake(self) -> None: Wake the Workers of this process without a new task,
+        e.g. so they notice they have been interrupted.
+    wait(self, generation: int, timeout: float) -> bool: Block until the
+        generation changes or the timeout elapses.
+    """
+
+    def __init__(self, fifo_path: str | None = None) -> None:
+        """
+        :param fifo_path: Path of a named pipe shared with other processes,
+            created if it does not exist. None for in-process notifications only.
+        """
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._fifo_path = fifo_path
+        self._fifo_writer: int | None = None
+        self._fifo_writer_lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        if fifo_path:
+            try:
+                os.mkfifo(fifo_path)
+            except FileExistsError:
+                if not stat.S_ISFIFO(os.stat(fifo_path).st_mode):
+                    raise
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def wake(self) -> None:
+        """Wake the Workers waiting in this process."""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def notify(self) -> None:
+        """Signal that a task was added to the queue."""
+        self.wake()
+        if self._fifo_path:
+            self._write_fifo()
+
+    def wait(self, generation: int, timeout: float) -> bool:
+        """Block until a notification newer than the given generation arrives.
+
+        :param generation: The generation read before the queue was found empty
+        :param timeout: Maximum number of seconds to wait
+        :return: True if notified, False if the timeout elapsed
+        """
+        if self._fifo_path and self._listener is None:
+            self._start_listener()
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._generation != generation, timeout
+            )
+
+    def _write_fifo(self) -> None:
+        """Write a notification to the named pipe without ever blocking.
+
+        The pipe can only be opened for writing while some process has it
+        open for reading, so a notification with no listener is dropped,
+        as is one that finds the pipe full of unread notifications.
+
+        The writer is opened once and shared by the threads notifying, under
+        a lock, so concurrent first notifications do not each open one.
+        """
+        assert self._fifo_path is not None
+        with self._fifo_writer_lock:
+            try:
+                if self._fifo_writer is None:
+                    self._fifo_writer = os.open(
+                        self._fifo_path, os.O_WRONLY | os.O_NONBLOCK
+                    )
+                os.write(self._fifo_writer, b"\0")
+            except OSError as e:
+                if e.errno == errno.EPIPE and self._fifo_writer is not None:
+                    os.close(self._fifo_writer)
+                    self._fifo_writer = None
+                elif e.errno not in (errno.ENXIO, errno.EAGAIN):
+                    logger.exception(e)
+
+    def _start_listener(self) -> None:
+        with self._condition:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="TaskNotifier listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self) -> None:
+        """Turn notifications read from the named pipe into local ones.
+
+        The pipe is opened for reading and writing so that it stays open,
+        instead of reporting end-of-file, whenever no Broker has it open.
+        """
+        assert self._fifo_path is not None
+        fd = os.open(self._fifo_path, os.O_RDWR | os.O_NONBLOCK)
+        while True:
+            readable, _, _ = select.select([fd], [], [])
+            if readable:
+                try:
+                    os.read(fd, 4096)
+                except BlockingIOError:
+                    # Another process read the notification first
+                    continue
+                self.wake()
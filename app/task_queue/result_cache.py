@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    """Result of a completed task held in a ResultCache.
+
+    :cvar data: The encoded thumbnail
+    :cvar etag: Hex SHA-256 digest of the encoded thumbnail
+    :cvar last_modified: Epoch time at which the result was registered
+    """
+
+    data: bytes
+    etag: str
+    last_modified: float
+
+
+class ResultCache:
+    """In-memory LRU cache of task results, bounded by their total size in bytes.
+
+    Clients usually fetch a thumbnail right after its job completes, often several
+    times, so TaskStores add each result to the cache as it is registered and the
+    Broker answers reads from it before going to the TaskStore. Results never
+    change once registered, so entries are never invalidated, only evicted.
+
+    The cache is safe to share between the Broker and the Workers' threads.
+
+    Methods:
+    -------
+    get(self, job_id: str) -> CachedResult | None: Get a result, if cached.
+    peek(self, job_id: str) -> CachedResult | None: Get a result, if cached,
+        without counting a hit or a miss or marking it as recently used.
+    put(self, job_id: str, result: CachedResult) -> None: Add a result, evicting
+        the least recently used ones to stay within the size limit.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        """
+        :param max_bytes: Maximum total size of the cached results
+        """
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CachedResult] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, job_id: object) -> bool:
+        """Check for a result without counting a hit or a miss."""
+        return job_id in self._entries
+
+    def get(self, job_id: str) -> CachedResult | None:
+        """Get a cached result and mark it as the most recently used.
+
+        :param job_id: ID of the job
+        :return: The cached result, or None if it is not cached
+        """
+        with self._lock:
+            result = self._entries.get(job_id)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(job_id)
+            self.hits += 1
+            return result
+
+    def peek(self, job_id: str) -> CachedResult | None:
+        """Get a cached result without counting a hit or a miss.
+
+        Lookups made alongside a get, such as for the validators of a result,
+        would otherwise count the same read twice.
+
+        :param job_id: ID of the job
+        :return: The cached result, or None if it is not cached
+        """
+        return self._entries.get(job_id)
+
+    def put(self, job_id: str, result: CachedResult) -> None:
+        """Add a result, evicting the least recently used ones to make room for it.
+
+        A result larger than the whole cache is not added.
+
+        :param job_id: ID of the job
+        :param result: The result to cache
+        """
+        if len(result.data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(job_id, None)
+            if previous is not None:
+                self.size -= len(previous.data)
+            while self.size + len(result.data) > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.data)
+                self.evictions += 1
+            self._entries[job_id] = result
+            self.size += len(result.data)
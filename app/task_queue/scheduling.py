@@ -0,0 +1,144 @@
+"""Module defining the order in which TaskStores hand out waiting tasks.
+
+Exports:
+-------
+SchedulingPolicy - Names of the available scheduling policies
+FORMAT_COST_FACTORS - Relative cost of decoding a pixel of each image format
+estimated_cost - Estimate the cost of creating a thumbnail from an image
+scheduling_delay - How much later than it was added a task is scheduled
+TaskPriority - Enum of the lanes tasks wait in
+most_urgent - The most urgent of several lanes
+LanePolicy - Names of the available policies for choosing between lanes
+LaneScheduler - Chooses the lane the next task is taken from
+"""
+
+import threading
+from enum import StrEnum
+from typing import Collection, Literal, Mapping
+
+# "unordered": tasks are handed out in whatever order is cheapest for the store.
+# "fifo": tasks are handed out in the order they were added.
+# "size": tasks are handed out in the order they were added, each one delayed
+#   in proportion to its estimated cost, so small images are not held up by
+#   large ones. The delay is bounded, so large images are never starved.
+SchedulingPolicy = Literal["unordered", "fifo", "size"]
+
+# Relative cost of decoding a pixel of each image format. JPEGs are decoded
+# at reduced resolution by libjpeg's DCT scaling, so they are much cheaper
+# per source pixel than formats that are fully decoded before being reduced.
+FORMAT_COST_FACTORS: dict[str, float] = {
+    "JPEG": 0.25,
+    "PNG": 1.0,
+    "WEBP": 1.0,
+    "GIF": 0.5,
+}
+
+
+def estimated_cost(image_format: str, width: int, height: int) -> float:
+    """Estimate the cost of creating a thumbnail from an image.
+
+    :param image_format: Format of the image, e.g. "JPEG"
+    :param width: Width of the image in pixels
+    :param height: Height of the image in pixels
+    :return: The number of megapixels of the image weighted by the cost
+        factor of its format
+    """
+    factor = FORMAT_COST_FACTORS.get(image_format, 1.0)
+    return width * height * factor / 1_000_000
+
+
+def scheduling_delay(cost: float, policy: SchedulingPolicy, aging_rate: float) -> float:
+    """How much later than it was added a task is scheduled.
+
+    Tasks are handed out in order of the time they were added plus this delay.
+    Under the "size" policy, the delay is the estimated cost of the task divided
+    by the aging rate: a task costing C megapixels more than another is handed
+    out after it, unless it was added more than C / aging_rate seconds earlier.
+    Under the other policies, there is no delay.
+
+    :param cost: Estimated cost of the task, see estimated_cost
+    :param policy: The scheduling policy
+    :param aging_rate: Megapixels of estimated cost forgiven per second waited
+    :return: The delay in seconds
+    """
+    if policy != "size":
+        return 0.0
+    return cost / aging_rate
+
+
+class TaskPriority(StrEnum):
+    """Enum of the lanes tasks wait in, from the most to the least urgent."""
+
+    # Uploads a client is waiting on
+    INTERACTIVE = "interactive"
+    # Bulk uploads that can wait for the interactive ones
+    BATCH = "batch"
+
+
+def most_urgent(*priorities: TaskPriority) -> TaskPriority:
+    """The most urgent of several lanes.
+
+    :param priorities: The lanes to compare
+    :return: The lane listed first in TaskPriority
+    """
+    return min(priorities, key=list(TaskPriority).index)
+
+
+# "strict": a task is only taken from a lane when the more urgent lanes are empty.
+# "weighted": the lanes with waiting tasks take turns in proportion to their weights,
+#   so a steady stream of interactive uploads cannot starve the batch lane.
+LanePolicy = Literal["strict", "weighted"]
+
+
+class LaneScheduler:
+    """Chooses the lane the next task is taken from.
+
+    Within a lane, tasks are ordered by the scheduling policy. The weighted
+    policy uses smooth weighted round-robin: with weights of 4 and 1, four
+    interactive tasks are handed out for every batch task, interleaved rather
+    than in bursts, while both lanes have tasks waiting.
+
+    A LaneScheduler is shared by the Workers of a process, so the turns are
+    only balanced among the tasks that process hands out.
+
+    Methods:
+    -------
+    lane_order(self, waiting: Collection[TaskPriority]) -> list[TaskPriority]:
+        Order the lanes with waiting tasks by preference for the next task.
+    """
+
+    def __init__(
+        self,
+        policy: LanePolicy = "strict",
+        weights: Mapping[TaskPriority, int] | None = None,
+    ) -> None:
+        """
+        :param policy: How to choose between lanes with waiting tasks
+        :param weights: Share of the tasks handed out from each lane under the
+            weighted policy. Lanes without a weight have a weight of 1.
+        """
+        self._policy = policy
+        self._weights = {lane: (weights or {}).get(lane, 1) for lane in TaskPriority}
+        self._current = dict.fromkeys(TaskPriority, 0)
+        self._lock = threading.Lock()
+
+    def lane_order(self, waiting: Collection[TaskPriority]) -> list[TaskPriority]:
+        """Order the lanes with waiting tasks by preference for the next task.
+
+        Under the weighted policy, each call takes a turn, so it should be
+        made once per task handed out.
+
+        :param waiting: Lanes with at least one waiting task
+        :return: The lanes, the one to take the next task from first. The
+            other lanes follow in order of urgency, in case the first one
+            turns out to be empty.
+        """
+        lanes = [lane for lane in TaskPriority if lane in waiting]
+        if self._policy == "strict" or len(lanes) < 2:
+            return lanes
+        with self._lock:
+            for lane in lanes:
+                self._current[lane] += self._weights[lane]
+            chosen = max(lanes, key=self._current.__getitem__)
+            self._current[chosen] -= sum(self._weights[lane] for lane in lanes)
+        return [chosen, *(lane for lane in lanes if lane != chosen)]
@@ -1,6 +1,19 @@
-from typing import BinaryIO, Iterable
-
-from app.task_queue.task_store import TaskStatus, TaskStoreBroker
+import io
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+from app.task_queue.notifier import TaskNotifier
+from app.task_queue.result_cache import CachedResult, ResultCache
+from app.task_queue.scheduling import TaskPriority
+from app.task_queue.task_store import (
+    ResultInfo,
+    TaskMetadata,
+    TaskStatus,
+    TaskStoreBroker,
+    TaskStoreResultPath,
+    TaskSummary,
+)
+from app.task_queue.webhooks import WebhookDispatcher, completion_event
 
 
 class Broker:
@@ -9,33 +22,108 @@ class Broker:
     In practice, this makes the broker primarily a proxy that forwards
     requests about job status to a TaskStore.
 
+    Given a ResultCache, the Broker answers requests for results from it,
+    and caches the results it has to read from the TaskStore.
+
+    Given a WebhookDispatcher, the Broker notifies the callback URL of an
+    upload deduplicated into a job that has already finished, since no Worker
+    will announce that job again.
+
     Methods:
     -------
-    add_task(self, image: BinaryIO) -> str: Create a task in the task queue
-        to process a thumbnail from an image and return its ID.
+    add_task(self, image: BinaryIO, dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None) -> str: Create a task in the task
+        queue to process a thumbnail from an image, or find the job already
+        processing the same image, and return its ID.
 
     task_status(self, job_id: str) -> TaskStatus: Get the status of a task.
 
     get_result(self, job_id: str) -> BinaryIO: Get the processed thumbnail
         for this job, if available.
 
+    get_cached_result(self, job_id: str) -> tuple[ResultInfo, bytes] | None: Get
+        the validators and data of the processed thumbnail, if it is cached.
+
+    get_result_path(self, job_id: str) -> Path | None: Get the path of the file
+        holding the processed thumbnail, if the TaskStore keeps results in files.
+
+    get_result_info(self, job_id: str) -> ResultInfo: Get the validators
+        of the processed thumbnail for this job, if available.
+
     get_error_result(self, job_id: str) -> str: Get the error details
         of a failed task, if available.
 
+    get_metadata(self, job_id: str) -> TaskMetadata | None: Get the metadata
+        probed from the image of a task on upload, if available.
+
     get_all_results(self) -> dict[TaskStatus, Iterable[str]]: Get status
         for all jobs in the TaskStore, grouped by status.
+
+    iter_jobs(self, task_status: TaskStatus | None = None, after: str = "")
+        -> Iterator[tuple[str, TaskStatus]]: Lazily list jobs in job id order.
+
+    get_summary(self) -> TaskSummary: Get the number of jobs in each status
+        and priority lane and the age of the oldest pending job.
     """
 
-    def __init__(self, task_store: TaskStoreBroker) -> None:
+    def __init__(
+        self,
+        task_store: TaskStoreBroker,
+        notifier: TaskNotifier | None = None,
+        result_cache: ResultCache | None = None,
+        webhooks: WebhookDispatcher | None = None,
+    ) -> None:
+        """
+        :param task_store: TaskStore to forward requests to.
+        :param notifier: Notifier used to wake idle Workers when a task is added.
+        :param result_cache: Cache of results in front of the TaskStore.
+        :param webhooks: Dispatcher notifying the callback URL of an upload
+            deduplicated into a finished job.
+        """
         self._task_store = task_store
-
-    def add_task(self, image: BinaryIO) -> str:
-        """Adds a task to the queue and returns the job_id.
+        self._notifier = notifier
+        self._result_cache = result_cache
+        self._webhooks = webhooks
+
+    def add_task(
+        self,
+        image: BinaryIO,
+        dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None,
+    ) -> str:
+        """Adds a task to the queue, wakes idle Workers and returns the job_id.
 
         :param image: The image on which this task should be performed.
+        :param dedupe_salt: If given, an identical image uploaded with the same
+            salt is given the job_id of its earlier upload, unless that job failed.
+        :param metadata: Metadata probed from the image, passed on to the Worker.
+        :param priority: Lane the task waits in until a Worker takes it.
+        :param callback_url: URL POSTed the result of the job when it finishes.
         :return: The uuid-compliant job_id as a str
+        :raises: InvalidCallbackURL if the callback URL may not be POSTed to
         """
-        return self._task_store.add_task_to_queue(image)
+        if callback_url is not None and self._webhooks is not None:
+            self._webhooks.check_url(callback_url)
+        job_id, deduplicated = self._task_store.add_task_to_queue(
+            image, dedupe_salt, metadata, priority, callback_url
+        )
+        if self._notifier is not None:
+            self._notifier.notify()
+        if deduplicated and callback_url is not None and self._webhooks is not None:
+            # The job may have finished before the callback was added to it,
+            # in which case its Worker has already delivered its result
+            task_status = self._task_store.get_task_status(job_id)
+            if task_status in (TaskStatus.SUCCEEDED, TaskStatus.ERROR):
+                error = None
+                if task_status == TaskStatus.ERROR:
+                    error = self.get_error_result(job_id)
+                event = completion_event(job_id, task_status, error)
+                self._webhooks.deliver(callback_url, event)
+        return job_id
 
     def task_status(self, job_id: str) -> TaskStatus:
         """Return the status of the task by job_id.
@@ -53,7 +141,69 @@ class Broker:
         :return: Thumbnail image file data
         :raises: JobNotFound if there is no completed job with the given ID
         """
-        return self._task_store.get_result(job_id)
+        if self._result_cache is None:
+            return self._task_store.get_result(job_id)
+        return io.BytesIO(self._get_cached_result(job_id).data)
+
+    def get_cached_result(self, job_id: str) -> tuple[ResultInfo, bytes] | None:
+        """Return the processed result of the task if it is cached.
+
+        The TaskStore is not read on a miss.
+
+        :param job_id: ID of the job
+        :return: The validators and data of the thumbnail, or None if there
+            is no cache or the result is not in it
+        """
+        result = self._result_cache.get(job_id) if self._result_cache else None
+        if result is None:
+            return None
+        info = ResultInfo(result.etag, result.last_modified, len(result.data))
+        return info, result.data
+
+    def get_result_path(self, job_id: str) -> Path | None:
+        """Return the path of the file holding the processed result of the task.
+
+        :param job_id: ID of the job
+        :return: Path of the thumbnail file, or None if the TaskStore
+            does not keep results in files
+        :raises: JobNotFound if there is no completed job with the given ID
+        """
+        if isinstance(self._task_store, TaskStoreResultPath):
+            return self._task_store.get_result_path(job_id)
+        return None
+
+    def get_result_info(self, job_id: str) -> ResultInfo:
+        """Return the validators of the processed result of the task.
+
+        They are taken from the cache if the result is cached, without
+        counting a hit or a miss. Otherwise they are answered by the TaskStore
+        without reading the result into the cache, since the result may then
+        be sent from its file.
+
+        :param job_id: ID of the job
+        :return: ETag, modification time and size of the thumbnail
+        :raises: JobNotFound if there is no completed job with the given ID
+        """
+        result = self._result_cache.peek(job_id) if self._result_cache else None
+        if result is None:
+            return self._task_store.get_result_info(job_id)
+        return ResultInfo(result.etag, result.last_modified, len(result.data))
+
+    def _get_cached_result(self, job_id: str) -> CachedResult:
+        """Get a result from the cache, reading it from the TaskStore on a miss.
+
+        :param job_id: ID of the job
+        :return: The cached result
+        :raises: JobNotFound if there is no completed job with the given ID
+        """
+        assert self._result_cache is not None
+        result = self._result_cache.get(job_id)
+        if result is None:
+            info = self._task_store.get_result_info(job_id)
+            data = self._task_store.get_result(job_id).read()
+            result = CachedResult(data, info.etag, info.last_modified)
+            self._result_cache.put(job_id, result)
+        return result
 
     def get_error_result(self, job_id: str) -> str:
         """Return the error details of a failed task.
@@ -64,9 +214,36 @@ class Broker:
         """
         return self._task_store.get_error(job_id)
 
+    def get_metadata(self, job_id: str) -> TaskMetadata | None:
+        """Return the metadata probed from the image of a task on upload.
+
+        :param job_id: ID of the job
+        :return: The metadata, or None if the image was not probed or there
+            is no job with the given ID
+        """
+        return self._task_store.get_task_metadata(job_id)
+
     def get_all_results(self) -> dict[TaskStatus, Iterable[str]]:
         """Get all jobs and associated statuses from the TaskStore.
 
         :return: Job IDs organized by TaskStatus.
         """
         return self._task_store.get_all_task_status()
+
+    def iter_jobs(
+        self, task_status: TaskStatus | None = None, after: str = ""
+    ) -> Iterator[tuple[str, TaskStatus]]:
+        """Lazily list jobs from the TaskStore in ascending job id order.
+
+        :param task_status: Only list jobs with this status. None for all jobs.
+        :param after: Only list jobs whose id is greater than this one
+        :return: Iterator of job ids and their status
+        """
+        return self._task_store.iter_job_ids(task_status, after)
+
+    def get_summary(self) -> TaskSummary:
+        """Get the number of jobs in each status and the oldest pending job.
+
+        :return: The TaskSummary of the TaskStore
+        """
+        return self._task_store.get_task_summary()
@@ -3,25 +3,69 @@
 Exports:
 -------
 TaskStatus - Enum of possible states a task can be in
+ResultInfo - Validators of the result of a completed task
+TaskSummary - Number of jobs in each status and the age of the oldest pending job,
+    and the number of pending jobs in each priority lane
+TaskMetadata - What was learned about an uploaded image from its header
+Task - A claimed task handed to a Worker
+QueuedTask - The job given to an upload, which may be an earlier upload's
 TaskStoreBroker - Protocol defining methods needed for a TaskStore
     to communicate with a Broker.
 TaskStoreWorker - Protocol defining methods needed for a TaskStore
     to communicate with a Worker.
+TaskStoreResultPath - Optional protocol for a TaskStore that keeps results
+    as files, which can be sent to clients straight from disk.
 FileSystemTaskStore - Concrete class using the filesystem for task state
     implementing both TaskStoreBroker and TaskStoreWorker.
+SQLiteTaskStore - Concrete class using an SQLite database for task state
+    implementing both TaskStoreBroker and TaskStoreWorker.
 """
 
+import bisect
+import hashlib
+import heapq
 import io
+import json
 import os
 import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
 import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from enum import StrEnum
+from itertools import chain, groupby, repeat
 from pathlib import Path
-from typing import BinaryIO, Iterable, Protocol
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Protocol,
+    cast,
+    runtime_checkable,
+)
 
 from PIL import Image
 
 from app.exceptions import JobNotFound
+from app.task_queue.result_cache import CachedResult, ResultCache
+from app.task_queue.scheduling import (
+    LaneScheduler,
+    SchedulingPolicy,
+    TaskPriority,
+    estimated_cost,
+    most_urgent,
+    scheduling_delay,
+)
+
+# Size of the chunks in which uploads are copied into and out of a TaskStore
+COPY_CHUNK_SIZE = 1024 * 1024
 
 
 class TaskStatus(StrEnum):
@@ -33,24 +77,127 @@ class TaskStatus(StrEnum):
     NOT_FOUND = "Not Found"
 
 
+@dataclass(frozen=True)
+class ResultInfo:
+    """Validators of the result of a completed task, which never changes.
+
+    :cvar etag: Hex SHA-256 digest of the encoded thumbnail
+    :cvar last_modified: Epoch time at which the result was registered
+    :cvar size: Size of the encoded thumbnail in bytes
+    """
+
+    etag: str
+    last_modified: float
+    size: int
+
+
+@dataclass(frozen=True)
+class TaskSummary:
+    """Number of jobs in each status and the age of the oldest pending job.
+
+    :cvar counts: Number of jobs with each TaskStatus
+    :cvar oldest_pending_at: Epoch time at which the oldest job still in
+        TaskStatus.PROCESSING was added, or None if there is no such job
+    :cvar pending_by_priority: Number of jobs in TaskStatus.PROCESSING in
+        each priority lane
+    """
+
+    counts: dict[TaskStatus, int]
+    oldest_pending_at: float | None
+    pending_by_priority: dict[TaskPriority, int] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class TaskMetadata:
+    """What was learned about an uploaded image from its header.
+
+    It is stored alongside the task, so the Worker can decode the image without
+    probing its format again, and job status can report on the source image.
+
+    :cvar format: Image format as named by the image library, e.g. "JPEG"
+    :cvar width: Width of the image in pixels
+    :cvar height: Height of the image in pixels
+    :cvar mode: Pixel format as named by the image library, e.g. "RGB"
+    """
+
+    format: str
+    width: int
+    height: int
+    mode: str
+
+    @property
+    def cost(self) -> float:
+        """Estimated cost of creating a thumbnail from the image, in megapixels."""
+        return estimated_cost(self.format, self.width, self.height)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "TaskMetadata":
+        return cls(**json.loads(data))
+
+
+class Task(NamedTuple):
+    """A claimed task handed to a Worker.
+
+    :cvar job_id: ID of the job
+    :cvar image: File data of the image to be processed
+    :cvar metadata: Metadata of the image, if it was probed on upload
+    """
+
+    job_id: str
+    image: BinaryIO
+    metadata: TaskMetadata | None = None
+
+
+class QueuedTask(NamedTuple):
+    """The job given to an upload added to a TaskStore.
+
+    :cvar job_id: ID of the job
+    :cvar deduplicated: True if the upload was given the job of an identical
+        earlier upload instead of a new task
+    """
+
+    job_id: str
+    deduplicated: bool = False
+
+
 class TaskStoreBroker(Protocol):
     """Protocol for a TaskStore to be able to communicate with a Broker."""
 
-    def add_task_to_queue(self, image: BinaryIO) -> str: ...
+    def add_task_to_queue(
+        self,
+        image: BinaryIO,
+        dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None,
+    ) -> QueuedTask: ...
 
     def get_task_status(self, job_id: str) -> TaskStatus: ...
 
     def get_all_task_status(self) -> dict[TaskStatus, Iterable[str]]: ...
 
+    def iter_job_ids(
+        self, task_status: TaskStatus | None = None, after: str = ""
+    ) -> Iterator[tuple[str, TaskStatus]]: ...
+
+    def get_task_summary(self) -> TaskSummary: ...
+
     def get_result(self, job_id: str) -> BinaryIO: ...
 
+    def get_result_info(self, job_id: str) -> ResultInfo: ...
+
     def get_error(self, job_id: str) -> str: ...
 
+    def get_task_metadata(self, job_id: str) -> TaskMetadata | None: ...
+
 
 class TaskStoreWorker(Protocol):
     """Protocol for a TaskStore to be able to communicate with a Worker."""
 
-    def get_next_task(self) -> tuple[str, BinaryIO] | None: ...
+    def get_next_task(self) -> Task | None: ...
 
     def register_task_complete(
         self, job_id: str, thumbnail: Image.Image, image_format: str
@@ -58,15 +205,128 @@ class TaskStoreWorker(Protocol):
 
     def register_task_error(self, job_id: str, error_msg: str) -> None: ...
 
+    def get_task_callbacks(self, job_id: str) -> list[str]: ...
+
+
+@runtime_checkable
+class TaskStoreResultPath(Protocol):
+    """Optional protocol for a TaskStore that keeps the result of each task in a file.
+
+    A Broker checks for this capability at runtime, so TaskStores that only hold
+    results in memory or in a database don't need to implement it.
+    """
+
+    def get_result_path(self, job_id: str) -> Path: ...
+
+
+def _copy_in_chunks(
+    source: BinaryIO,
+    write: Callable[[bytes], object],
+    digest: "hashlib._Hash | None" = None,
+) -> None:
+    """Copy a file a chunk at a time, so it is never held in memory as a whole.
+
+    :param source: File to copy from, read from its current position
+    :param write: Callable writing each chunk to the destination, e.g. its write
+        method, or a hash's update method to only hash the file
+    :param digest: Hash to also update with each chunk, if any
+    """
+    while chunk := source.read(COPY_CHUNK_SIZE):
+        write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+
+
+def _modified_at(path: Path) -> float | None:
+    """Get the modification time of a file that may be moved at any moment.
+
+    :param path: Path of the file
+    :return: Epoch modification time, or None if the file no longer exists
+    """
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+@dataclass
+class _IndexEntry:
+    """Entry of FileSystemTaskStore's in-memory status index.
+
+    :cvar status: Current status of the job
+    :cvar updated_at: Epoch time at which the job entered its current status
+    """
+
+    status: TaskStatus
+    updated_at: float
+
 
-class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
+class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker, TaskStoreResultPath):
     """TaskStore using the filesystem that can communicate with both Brokers and Workers
 
     When this class is initialized, it ensures that all folders it needs are present
     on the filesystem. The root folder is provided during initialization.
 
-    This class is not thread safe and unexpected results may occur if used
-    by more than one Worker at a time.
+    Finished and failed jobs are kept indefinitely, so the "out" and "error" folders
+    can optionally be sharded on the job id prefix, e.g. with a shard depth of 2
+    a thumbnail is stored at out/ab/cd/abcd1234-.... This keeps every directory
+    small enough for fast lookups and listings. The "in" folder is always flat
+    because it only holds tasks waiting to be processed. An existing flat store
+    is migrated to the sharded layout when it is opened with a shard depth.
+
+    The SHA-256 digest of each thumbnail is computed when it is registered and
+    kept in a file of the same name in the "meta" folder, sharded like "out".
+
+    Uploads are copied into the "tmp" folder a chunk at a time and then renamed
+    into the "in" folder, so a Worker never sees a partially written task and an
+    upload is never held in memory as a whole. Workers read the claimed file
+    directly.
+
+    The metadata probed from an upload's header is kept as JSON in a file named
+    after the job in the "source" folder, sharded like "out".
+
+    Uploads can be deduplicated by content: the "digests" folder, sharded like
+    "out", maps the SHA-256 digest of each deduplicated upload to its job id.
+    An upload whose digest maps to a job that is processing or succeeded is
+    given that job's id instead of creating a new task. Uploads are coalesced
+    exactly within a process, and on a best-effort basis across processes.
+
+    The store can also keep an in-memory index of the status of every job, which
+    is built from the folders once at initialization and updated as tasks move
+    through the queue. Status lookups and listings are then answered without
+    touching the disk. A job missing from the index, e.g. one added by another
+    process, is looked up on disk and indexed. Status changes made by other
+    processes are not seen, so only enable the index when this process is
+    the only one registering results in the store. The index also maintains
+    the number of jobs in each status and the order in which pending jobs
+    were added, so the store can be summarized without touching the disk.
+
+    Any number of Workers, in any number of threads, processes or pods sharing
+    the data folder, can take tasks from the same store. A task is claimed by
+    atomically renaming it from the "in" folder into the worker process's own
+    folder under "claimed", so only one Worker can ever claim it. A claim is a
+    lease: if its result is not registered before the lease expires, e.g. because
+    the worker process died, the task is moved back to the "in" folder and
+    handed out again.
+
+    Unclaimed tasks are handed out in the order set by the scheduling policy, see
+    app.task_queue.scheduling. Under "fifo" and "size", tasks are ordered by the
+    time their file was added to the "in" folder, plus the delay for their size.
+    Each process keeps the position of the tasks it has seen in memory, so only
+    tasks added since the last claim are looked up.
+
+    Each task waits in a priority lane, and the next task is taken from the
+    lane chosen by the LaneScheduler. Tasks in a lane other than the default
+    interactive one have a file named after the job in the "priority" folder,
+    sharded like "out", holding the name of their lane, so a task keeps its
+    lane when its claim is requeued. An upload deduplicated into a processing
+    task moves it to the more urgent of their lanes, and bumps the modification
+    time of the "priority" folder so every process reads the lanes it cached
+    again.
+
+    The callback URLs given with the uploads of a job, including the uploads
+    deduplicated into it, are appended one per line to a file named after the
+    job in the "callbacks" folder, sharded like "out".
 
     A TaskStore only does three main things:
     - Serialize and store new task requests from a Broker.
@@ -76,16 +336,35 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
     Methods:
     -------
     reset(self) -> None: Reinitialize the TaskStore. This deletes all tasks.
-    add_task_to_queue(self, image: BinaryIO) -> str: Create a task to process an image
-        and return the ID of the task.
+    migrate_to_sharded_layout(self) -> int: Move jobs stored in the flat layout
+        into their shard folders.
+    requeue_expired_claims(self) -> int: Move tasks whose lease has expired back
+        into the queue.
+    add_task_to_queue(self, image: BinaryIO, dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None) -> QueuedTask: Create a task to process
+        an image, or find the job already processing the same image, and return
+        the ID of the task and whether it was found.
     get_task_status(self, job_id: str) -> TaskStatus: Get the task status of a job.
     get_all_task_status(self) -> dict[TaskStatus, Iterable[str]]: Get the task status
         of all jobs.
+    iter_job_ids(self, task_status: TaskStatus | None = None, after: str = "")
+        -> Iterator[tuple[str, TaskStatus]]: Lazily list jobs in job id order.
+    get_task_summary(self) -> TaskSummary: Count the jobs in each status and
+        priority lane.
     get_result(self, job_id: str) -> BinaryIO: Get the result of a completed task.
+    get_result_path(self, job_id: str) -> Path: Get the path of the file holding
+        the result of a completed task.
+    get_result_info(self, job_id: str) -> ResultInfo: Get the validators of the
+        result of a completed task.
     get_error(self, job_id: str) -> str: Get the error message from a failed task.
-    get_next_task(self) -> tuple[str, BinaryIO] | None: Return an unstarted task.
-        If there are multiple unstarted tasks, the order in which they are
-        returned is undefined.
+    get_task_metadata(self, job_id: str) -> TaskMetadata | None: Get the metadata
+        of the image of a task, if it was probed on upload.
+    get_task_callbacks(self, job_id: str) -> list[str]: Get the callback URLs
+        given with the uploads of a job.
+    get_next_task(self) -> Task | None: Claim the unstarted task that comes
+        first under the scheduling policy in the lane chosen by the LaneScheduler.
     register_task_complete(self, job_id: str, thumbnail: Image.Image,
         image_format: str) -> None:
         Used by workers to submit the results of a completed task.
@@ -96,30 +375,198 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
     _in_folder = "in"
     _out_folder = "out"
     _error_folder = "error"
+    _claimed_folder = "claimed"
+    _meta_folder = "meta"
+    _digests_folder = "digests"
+    _tmp_folder = "tmp"
+    _source_folder = "source"
+    _priority_folder = "priority"
+    _callbacks_folder = "callbacks"
+    # Number of job id characters used to name each level of shard folders
+    _shard_width = 2
+    # Maximum number of seconds between two checks for expired claims
+    _requeue_interval = 10.0
+    # Number of job ids copied out of the status index at a time while listing
+    _index_page_size = 1000
 
-    def __init__(self, data_folder: str) -> None:
+    def __init__(
+        self,
+        data_folder: str,
+        shard_depth: int = 0,
+        status_index: bool = False,
+        lease_seconds: float = 300,
+        worker_id: str | None = None,
+        result_cache: ResultCache | None = None,
+        scheduling: SchedulingPolicy = "fifo",
+        aging_rate: float = 1.0,
+        lanes: LaneScheduler | None = None,
+        summary_ttl: float = 0.0,
+    ) -> None:
         """
         Initialize the file store by ensuring that all necessary folders
         exist.
 
         :param data_folder: Root path of the file store.
+        :param shard_depth: Number of levels of shard folders under the "out"
+            and "error" folders. 0 keeps the flat layout.
+        :param status_index: Keep an in-memory index of job statuses.
+        :param lease_seconds: How long a claimed task may go without a registered
+            result before it is handed out again.
+        :param worker_id: Name of this process's folder of claimed tasks. It must
+            be unique among the processes sharing the data folder. Defaults to
+            the hostname and process id.
+        :param result_cache: Cache to add each registered result to.
+        :param scheduling: Order in which unclaimed tasks are handed out.
+        :param aging_rate: Megapixels of estimated cost forgiven per second
+            a task waits, under the "size" scheduling policy.
+        :param lanes: Chooses the priority lane each task is taken from.
+            Defaults to strict priority.
+        :param summary_ttl: Seconds a summary taken by listing the folders is
+            reused, when there is no status index. 0 lists them on every call.
         """
         self._root = Path(data_folder)
+        self._scheduling = scheduling
+        self._aging_rate = aging_rate
+        self._lanes = lanes or LaneScheduler()
+        # Lane and position of each unclaimed task under the scheduling policy
+        self._schedule: dict[str, tuple[TaskPriority, float]] = {}
+        # Modification time of the "priority" folder when the lanes were cached
+        self._lanes_changed_at: int | None = None
+        self._result_cache = result_cache
+        self._shard_depth = shard_depth
+        self._lease_seconds = lease_seconds
+        self._worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._next_requeue_check = 0.0
+        self._index: dict[str, _IndexEntry] | None = None
+        # Maintained alongside the index: number of jobs in each status, the
+        # time each pending job was added, in the order they were added, and
+        # the lane of each pending job
+        self._counts: dict[TaskStatus, int] = {}
+        self._pending: dict[str, float] = {}
+        self._pending_lanes: dict[str, TaskPriority] = {}
+        # Also maintained alongside the index: its job ids in ascending order
+        self._sorted_index_ids: list[str] = []
+        self._index_lock = threading.Lock()
+        # Serializes deduplicated uploads between their lookup and publication
+        self._digest_lock = threading.Lock()
+        self._summary_ttl = summary_ttl
+        # Last summary taken by listing the folders, and the time it was taken
+        self._summary: tuple[float, TaskSummary] | None = None
+        # Lets a single caller at a time list the folders for a summary
+        self._summary_lock = threading.Lock()
         self._init_folders()
+        if self._shard_depth:
+            self.migrate_to_sharded_layout()
+        self._requeue_own_claims()
+        if status_index:
+            self._build_index()
 
     def _init_folders(self) -> None:
         self._root.mkdir(exist_ok=True)
         self._folders: dict[str, Path] = {}
 
-        for folder in [self._in_folder, self._out_folder, self._error_folder]:
+        for folder in [
+            self._in_folder,
+            self._out_folder,
+            self._error_folder,
+            self._claimed_folder,
+            self._meta_folder,
+            self._digests_folder,
+            self._tmp_folder,
+            self._source_folder,
+            self._priority_folder,
+            self._callbacks_folder,
+        ]:
             path = self._root.joinpath(folder)
             path.mkdir(exist_ok=True)
             self._folders[folder] = path
+        self.claimed_folder.joinpath(self._worker_id).mkdir(exist_ok=True)
 
     def reset(self) -> None:
         """Reinitialize the TaskStore. This deletes all tasks."""
         shutil.rmtree(self._root, ignore_errors=True)
         self._init_folders()
+        self._summary = None
+        if self._index is not None:
+            self._build_index()
+
+    def _build_index(self) -> None:
+        """Build the in-memory status index from the contents of the folders.
+
+        Claimed tasks are dated from the start of their lease, so after a
+        restart the age of a pending job may be underestimated. A file moved
+        by another process while the folders are scanned is skipped, and the
+        job is then looked up on disk on first use.
+        """
+        index: dict[str, _IndexEntry] = {}
+        # Scan in order of increasing precedence, matching _disk_task_status
+        for job_id in self._job_ids_with_status(TaskStatus.ERROR):
+            updated_at = _modified_at(self._error_job_path(job_id))
+            if updated_at is not None:
+                index[job_id] = _IndexEntry(TaskStatus.ERROR, updated_at)
+        for path in chain(self.in_folder.iterdir(), self._claimed_job_paths()):
+            updated_at = _modified_at(path)
+            if updated_at is not None:
+                index[path.name] = _IndexEntry(TaskStatus.PROCESSING, updated_at)
+        for job_id in self._job_ids_with_status(TaskStatus.SUCCEEDED):
+            updated_at = _modified_at(self._out_job_path(job_id))
+            if updated_at is not None:
+                index[job_id] = _IndexEntry(TaskStatus.SUCCEEDED, updated_at)
+        counts = dict.fromkeys(
+            [TaskStatus.PROCESSING, TaskStatus.SUCCEEDED, TaskStatus.ERROR], 0
+        )
+        for entry in index.values():
+            counts[entry.status] += 1
+        pending = sorted(
+            (entry.updated_at, job_id)
+            for job_id, entry in index.items()
+            if entry.status == TaskStatus.PROCESSING
+        )
+        pending_lanes = {job_id: self._task_priority(job_id) for _, job_id in pending}
+        sorted_index_ids = sorted(index)
+        with self._index_lock:
+            self._index = index
+            self._sorted_index_ids = sorted_index_ids
+            self._counts = counts
+            self._pending = {job_id: added_at for added_at, job_id in pending}
+            self._pending_lanes = pending_lanes
+
+    def _set_indexed_status(
+        self,
+        job_id: str,
+        task_status: TaskStatus,
+        priority: TaskPriority | None = None,
+    ) -> None:
+        """Record a job's new status in the status index, if there is one.
+
+        :param job_id: ID of the job
+        :param task_status: The status the job just entered
+        :param priority: Lane of the job, if known. Otherwise, it is looked up
+            on disk when the job becomes pending.
+        """
+        if self._index is None:
+            return
+        if task_status == TaskStatus.PROCESSING and priority is None:
+            with self._index_lock:
+                priority = self._pending_lanes.get(job_id)
+            if priority is None:
+                priority = self._task_priority(job_id)
+        now = time.time()
+        with self._index_lock:
+            previous = self._index.get(job_id)
+            if previous is not None:
+                self._counts[previous.status] -= 1
+            else:
+                bisect.insort(self._sorted_index_ids, job_id)
+            self._counts[task_status] += 1
+            self._index[job_id] = _IndexEntry(task_status, now)
+            if task_status == TaskStatus.PROCESSING:
+                assert priority is not None
+                self._pending.setdefault(job_id, now)
+                self._pending_lanes[job_id] = priority
+            else:
+                self._pending.pop(job_id, None)
+                self._pending_lanes.pop(job_id, None)
 
     @property
     def in_folder(self) -> Path:
@@ -133,17 +580,90 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
     def error_folder(self) -> Path:
         return self._folders["error"]
 
+    @property
+    def meta_folder(self) -> Path:
+        return self._folders["meta"]
+
+    @property
+    def digests_folder(self) -> Path:
+        return self._folders["digests"]
+
+    @property
+    def tmp_folder(self) -> Path:
+        return self._folders["tmp"]
+
+    @property
+    def source_folder(self) -> Path:
+        return self._folders["source"]
+
+    @property
+    def priority_folder(self) -> Path:
+        return self._folders["priority"]
+
+    @property
+    def callbacks_folder(self) -> Path:
+        return self._folders["callbacks"]
+
+    @property
+    def claimed_folder(self) -> Path:
+        return self._folders["claimed"]
+
+    def _sharded_path(self, folder: Path, job_id: str) -> Path:
+        """Get the path of a job in a folder using the sharded layout.
+
+        :param folder: The folder containing the shards
+        :param job_id: ID of the job
+        :return: e.g. folder/ab/cd/abcd1234-... for a shard depth of 2
+        """
+        width = self._shard_width
+        shards = [
+            job_id[level * width : (level + 1) * width]
+            for level in range(self._shard_depth)
+        ]
+        return folder.joinpath(*shards, job_id)
+
     def _in_job_path(self, job_id: str) -> Path:
         return self.in_folder.joinpath(job_id)
 
     def _out_job_path(self, job_id: str) -> Path:
-        return self.out_folder.joinpath(job_id)
+        return self._sharded_path(self.out_folder, job_id)
 
     def _error_job_path(self, job_id: str) -> Path:
-        return self.error_folder.joinpath(job_id)
+        return self._sharded_path(self.error_folder, job_id)
+
+    def _meta_job_path(self, job_id: str) -> Path:
+        return self._sharded_path(self.meta_folder, job_id)
+
+    def _source_job_path(self, job_id: str) -> Path:
+        return self._sharded_path(self.source_folder, job_id)
+
+    def _priority_job_path(self, job_id: str) -> Path:
+        return self._sharded_path(self.priority_folder, job_id)
+
+    def _callbacks_job_path(self, job_id: str) -> Path:
+        return self._sharded_path(self.callbacks_folder, job_id)
+
+    def _digest_path(self, digest: str) -> Path:
+        return self._sharded_path(self.digests_folder, digest)
+
+    def _claimed_job_path(self, job_id: str) -> Path:
+        return self.claimed_folder.joinpath(self._worker_id, job_id)
+
+    def _claimed_job_paths(self) -> Iterator[Path]:
+        """List the claimed tasks of every worker process.
+
+        :return: Iterator of the paths of claimed tasks
+        """
+        for worker_folder in self.claimed_folder.iterdir():
+            yield from worker_folder.iterdir()
 
     def _job_is_processing(self, job_id: str) -> bool:
-        return self._in_job_path(job_id).exists()
+        if self._in_job_path(job_id).exists():
+            return True
+        return any(
+            self.claimed_folder.joinpath(worker_id, job_id).exists()
+            for worker_id in os.listdir(self.claimed_folder)
+        )
 
     def _job_is_finished(self, job_id: str) -> bool:
         return self._out_job_path(job_id).exists()
@@ -159,28 +679,274 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
         """
         folder: Path
         if task_status == TaskStatus.PROCESSING:
-            folder = self.in_folder
+            claimed_job_ids = (path.name for path in self._claimed_job_paths())
+            return chain(os.listdir(self.in_folder), claimed_job_ids)
         elif task_status == TaskStatus.SUCCEEDED:
             folder = self.out_folder
         elif task_status == TaskStatus.ERROR:
             folder = self.error_folder
         else:
             raise Exception(f"Unknown task status: {task_status}")
-        return os.listdir(folder)
+        if not self._shard_depth:
+            return os.listdir(folder)
+        return self._walk_shards(folder, self._shard_depth)
+
+    def _sorted_job_ids(
+        self, folder: Path, depth: int, after: str, prefix: str = ""
+    ) -> Iterator[str]:
+        """Lazily list the job ids stored under a folder in ascending order.
 
-    def add_task_to_queue(self, image: BinaryIO) -> str:
+        Only one directory is listed at a time, and shard folders whose
+        prefix sorts before the starting job id are skipped without being
+        listed.
+
+        :param folder: Folder to list
+        :param depth: Number of shard levels below the folder
+        :param after: Only list job ids greater than this one
+        :param prefix: Concatenated names of the shard folders above this one
+        :return: Iterator of job ids
+        """
+        names = sorted(os.listdir(folder))
+        if depth == 0:
+            yield from names[bisect.bisect_right(names, after) :]
+            return
+        for name in names:
+            shard_prefix = prefix + name
+            if shard_prefix < after[: len(shard_prefix)]:
+                continue
+            shard = folder.joinpath(name)
+            if shard.is_dir():
+                yield from self._sorted_job_ids(shard, depth - 1, after, shard_prefix)
+
+    def _walk_shards(self, folder: Path | str, depth: int) -> Iterator[str]:
+        """Lazily list the job ids stored under a folder of shards.
+
+        :param folder: Folder to walk
+        :param depth: Number of shard levels below the folder
+        :return: Iterator of job ids
+        """
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if depth == 0:
+                    yield entry.name
+                elif entry.is_dir():
+                    yield from self._walk_shards(entry.path, depth - 1)
+
+    def migrate_to_sharded_layout(self) -> int:
+        """Move jobs stored in the flat layout into their shard folders.
+
+        This is a one-shot migration for stores created before sharding was
+        enabled, and is run automatically when the store is opened with a
+        shard depth. Moves are atomic renames, so a migration that is interrupted
+        can be safely resumed by running it again, and several processes can
+        run it at the same time.
+
+        :return: The number of jobs that were moved
+        """
+        moved = 0
+        metadata_folders = [
+            self.meta_folder,
+            self.digests_folder,
+            self.source_folder,
+            self.priority_folder,
+            self.callbacks_folder,
+        ]
+        for folder in [self.out_folder, self.error_folder, *metadata_folders]:
+            with os.scandir(folder) as entries:
+                flat_jobs = [entry.name for entry in entries if entry.is_file()]
+            for job_id in flat_jobs:
+                destination = self._sharded_path(folder, job_id)
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.replace(folder.joinpath(job_id), destination)
+                except FileNotFoundError:
+                    # Moved by another process migrating the store at the same time
+                    continue
+                if folder not in metadata_folders:
+                    moved += 1
+        return moved
+
+    def add_task_to_queue(
+        self,
+        image: BinaryIO,
+        dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None,
+    ) -> QueuedTask:
         """Create a task to process an image and return the ID of the task.
 
+        Given a salt, the upload is deduplicated: if the same image was uploaded
+        with the same salt and its job is processing or succeeded, the ID of
+        that job is returned and no task is created. A job that failed or no
+        longer exists is replaced by a new one.
+
         :param image: File data of image to be processed
-        :return: A uuid-compliant string uniquely identifying the task.
+        :param dedupe_salt: Bytes hashed along with the image, e.g. a fingerprint
+            of the settings the result depends on. None disables deduplication.
+        :param metadata: Metadata of the image, kept for the Worker and job status
+        :param priority: Lane the task waits in. A processing job the upload is
+            deduplicated into is moved to this lane if it is more urgent.
+        :param callback_url: URL to notify when the job finishes, added to the
+            callbacks of the job the upload is deduplicated into, if any
+        :return: The uuid-compliant ID of the task, and whether it is the job
+            of an earlier upload
         """
         job_id = str(uuid.uuid4())
-        self._in_job_path(job_id).write_bytes(image.read())
+        upload_path = self.tmp_folder.joinpath(job_id)
+        digest = hashlib.sha256(dedupe_salt) if dedupe_salt is not None else None
+        with upload_path.open("wb") as upload:
+            _copy_in_chunks(image, upload.write, digest)
+        if digest is None:
+            return QueuedTask(
+                self._enqueue_upload(
+                    job_id, upload_path, metadata, priority, callback_url
+                )
+            )
+
+        digest_path = self._digest_path(digest.hexdigest())
+        with self._digest_lock:
+            duplicate = self._find_duplicate(digest_path)
+            if duplicate is not None:
+                duplicate_job_id, duplicate_status = duplicate
+                upload_path.unlink()
+                if duplicate_status == TaskStatus.PROCESSING:
+                    self._promote_task(duplicate_job_id, priority)
+                if callback_url is not None:
+                    self._add_callback(duplicate_job_id, callback_url)
+                return QueuedTask(duplicate_job_id, deduplicated=True)
+            # Published through an atomic rename, so it is never read partially
+            digest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_digest_path = self.tmp_folder.joinpath(f"{job_id}.digest")
+            tmp_digest_path.write_text(job_id)
+            os.replace(tmp_digest_path, digest_path)
+            return QueuedTask(
+                self._enqueue_upload(
+                    job_id, upload_path, metadata, priority, callback_url
+                )
+            )
+
+    def _find_duplicate(self, digest_path: Path) -> tuple[str, TaskStatus] | None:
+        """Get the job an earlier upload with the same digest was given, if usable.
+
+        :param digest_path: Path of the digest of the upload
+        :return: ID and status of the job if it is processing or succeeded,
+            otherwise None
+        """
+        try:
+            job_id = digest_path.read_text()
+        except FileNotFoundError:
+            return None
+        task_status = self.get_task_status(job_id)
+        if task_status in (TaskStatus.PROCESSING, TaskStatus.SUCCEEDED):
+            return job_id, task_status
+        return None
+
+    def _promote_task(self, job_id: str, priority: TaskPriority) -> None:
+        """Move a processing task to a lane, if it is more urgent than its own.
+
+        An interactive upload deduplicated into a waiting batch task would
+        otherwise wait behind the whole batch lane. A claimed task keeps the
+        new lane if its claim is requeued.
+
+        The lane file is replaced atomically before the modification time of
+        the "priority" folder is bumped, so a Worker that sees the new time
+        also sees the new lane. The time is set explicitly rather than left
+        to the filesystem, whose clock may not have ticked since the last
+        change.
+
+        :param job_id: ID of the job
+        :param priority: Lane of the upload deduplicated into the job
+        """
+        current = self._task_priority(job_id)
+        if most_urgent(current, priority) == current:
+            return
+        priority_path = self._priority_job_path(job_id)
+        if priority == TaskPriority.INTERACTIVE:
+            priority_path.unlink(missing_ok=True)
+        else:
+            tmp_priority_path = self.tmp_folder.joinpath(f"{job_id}.priority")
+            tmp_priority_path.write_text(priority, "utf-8")
+            os.replace(tmp_priority_path, priority_path)
+        changed_at = max(self.priority_folder.stat().st_mtime_ns + 1, time.time_ns())
+        os.utime(self.priority_folder, ns=(changed_at, changed_at))
+        with self._index_lock:
+            if job_id in self._pending_lanes:
+                self._pending_lanes[job_id] = priority
+
+    def _enqueue_upload(
+        self,
+        job_id: str,
+        upload_path: Path,
+        metadata: TaskMetadata | None,
+        priority: TaskPriority,
+        callback_url: str | None,
+    ) -> str:
+        """Move a fully written upload into the queue.
+
+        The metadata, lane and callback of the image are written first, so
+        a Worker always finds them.
+
+        :param job_id: ID of the new task
+        :param upload_path: Path of the upload in the "tmp" folder
+        :param metadata: Metadata of the image, if any
+        :param priority: Lane the task waits in
+        :param callback_url: URL to notify when the job finishes, if any
+        :return: The ID of the task
+        """
+        if metadata is not None:
+            source_path = self._source_job_path(job_id)
+            source_path.parent.mkdir(parents=True, exist_ok=True)
+            source_path.write_text(metadata.to_json(), "utf-8")
+        if priority != TaskPriority.INTERACTIVE:
+            priority_path = self._priority_job_path(job_id)
+            priority_path.parent.mkdir(parents=True, exist_ok=True)
+            priority_path.write_text(priority, "utf-8")
+        if callback_url is not None:
+            self._add_callback(job_id, callback_url)
+        os.replace(upload_path, self._in_job_path(job_id))
+        self._set_indexed_status(job_id, TaskStatus.PROCESSING, priority)
         return job_id
 
+    def _add_callback(self, job_id: str, callback_url: str) -> None:
+        """Add a URL to notify when a job finishes.
+
+        Each URL is appended as a single short write, which other processes
+        appending to the same file cannot interleave with.
+
+        :param job_id: ID of the job
+        :param callback_url: URL to notify
+        """
+        callbacks_path = self._callbacks_job_path(job_id)
+        callbacks_path.parent.mkdir(parents=True, exist_ok=True)
+        with callbacks_path.open("a", encoding="utf-8") as callbacks:
+            callbacks.write(callback_url + "\n")
+
     def get_task_status(self, job_id: str) -> TaskStatus:
         """Get the task status of a job.
 
+        If the status index is enabled, a job found in the index is answered
+        from memory. Otherwise, the job is looked up on disk.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: The TaskStatus of the task.
+        """
+        if self._index is None:
+            return self._disk_task_status(job_id)
+
+        with self._index_lock:
+            entry = self._index.get(job_id)
+        if entry is not None:
+            return entry.status
+
+        task_status = self._disk_task_status(job_id)
+        if task_status != TaskStatus.NOT_FOUND:
+            self._set_indexed_status(job_id, task_status)
+        return task_status
+
+    def _disk_task_status(self, job_id: str) -> TaskStatus:
+        """Get the task status of a job by looking for its files.
+
         :param job_id: The ID uniquely identifying a task
         :return: The TaskStatus of the task.
         """
@@ -199,12 +965,158 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
         :return: A dictionary whose keys are the unique statuses and the
             values are the job IDs with that status.
         """
+        if self._index is not None:
+            results: dict[TaskStatus, list[str]] = {
+                TaskStatus.PROCESSING: [],
+                TaskStatus.SUCCEEDED: [],
+                TaskStatus.ERROR: [],
+            }
+            with self._index_lock:
+                for job_id, entry in self._index.items():
+                    results[entry.status].append(job_id)
+            return {task_status: ids for task_status, ids in results.items()}
+
         return {
             TaskStatus.PROCESSING: self._job_ids_with_status(TaskStatus.PROCESSING),
             TaskStatus.SUCCEEDED: self._job_ids_with_status(TaskStatus.SUCCEEDED),
             TaskStatus.ERROR: self._job_ids_with_status(TaskStatus.ERROR),
         }
 
+    def iter_job_ids(
+        self, task_status: TaskStatus | None = None, after: str = ""
+    ) -> Iterator[tuple[str, TaskStatus]]:
+        """Lazily list jobs in ascending job id order.
+
+        With the status index enabled, jobs are listed from the sorted job ids
+        kept alongside the index, without reading any directory.
+
+        Otherwise, each folder is walked in sorted order and the walks are
+        merged. A job found in several folders, e.g. while its result is being
+        registered, is listed once with the status get_task_status would report.
+        Shard folders before the starting job id are skipped, but every other
+        directory walked is listed and sorted in full, so each page of jobs
+        costs a listing of the in folder, of every claimed folder and of the
+        shards it reaches.
+
+        :param task_status: Only list jobs with this status. None for all jobs.
+        :param after: Only list jobs whose id is greater than this one
+        :return: Iterator of job ids and their status
+        """
+        if self._index is not None:
+            yield from self._iter_indexed_job_ids(task_status, after)
+            return
+
+        # Walks of the folders holding each status, in order of precedence
+        walks: list[tuple[TaskStatus, list[Iterator[str]]]] = [
+            (
+                TaskStatus.SUCCEEDED,
+                [self._sorted_job_ids(self.out_folder, self._shard_depth, after)],
+            ),
+            (
+                TaskStatus.PROCESSING,
+                [self._sorted_job_ids(self.in_folder, 0, after)]
+                + [
+                    self._sorted_job_ids(worker_folder, 0, after)
+                    for worker_folder in self.claimed_folder.iterdir()
+                ],
+            ),
+            (
+                TaskStatus.ERROR,
+                [self._sorted_job_ids(self.error_folder, self._shard_depth, after)],
+            ),
+        ]
+        streams = [
+            zip(walk, repeat(precedence), repeat(walk_status))
+            for precedence, (walk_status, status_walks) in enumerate(walks)
+            if task_status is None or walk_status == task_status
+            for walk in status_walks
+        ]
+        for job_id, entries in groupby(heapq.merge(*streams), key=lambda e: e[0]):
+            yield job_id, next(entries)[2]
+
+    def _iter_indexed_job_ids(
+        self, task_status: TaskStatus | None, after: str
+    ) -> Iterator[tuple[str, TaskStatus]]:
+        """Lazily list the jobs in the status index in ascending job id order.
+
+        Job ids are copied out of the index a slice at a time, so that the
+        index is not locked while the caller consumes them.
+
+        :param task_status: Only list jobs with this status. None for all jobs.
+        :param after: Only list jobs whose id is greater than this one
+        :return: Iterator of job ids and their status
+        """
+        assert self._index is not None
+        while True:
+            with self._index_lock:
+                start = bisect.bisect_right(self._sorted_index_ids, after)
+                page = [
+                    (job_id, self._index[job_id].status)
+                    for job_id in self._sorted_index_ids[
+                        start : start + self._index_page_size
+                    ]
+                ]
+            if not page:
+                return
+            for job_id, job_status in page:
+                if task_status is None or job_status == task_status:
+                    yield job_id, job_status
+            after = page[-1][0]
+
+    def get_task_summary(self) -> TaskSummary:
+        """Count the jobs in each status and find the oldest pending job.
+
+        With the status index enabled, this is answered from counters kept
+        up to date as jobs change status. Otherwise, every folder is listed,
+        and the lane of every pending job is looked up. That summary is then
+        reused for summary_ttl seconds, and concurrent callers wait for the
+        one listing the folders rather than listing them too.
+
+        :return: The TaskSummary of the store
+        """
+        if self._index is not None:
+            with self._index_lock:
+                oldest_pending_at = next(iter(self._pending.values()), None)
+                lanes = Counter(self._pending_lanes.values())
+                return TaskSummary(
+                    dict(self._counts),
+                    oldest_pending_at,
+                    {lane: lanes[lane] for lane in TaskPriority},
+                )
+
+        with self._summary_lock:
+            now = time.monotonic()
+            if self._summary is not None and now - self._summary[0] < self._summary_ttl:
+                return self._summary[1]
+            summary = self._list_task_summary()
+            self._summary = (now, summary)
+            return summary
+
+    def _list_task_summary(self) -> TaskSummary:
+        """Summarize the jobs by listing every folder.
+
+        A pending task claimed or finished while the folders are listed is
+        left out of the age of the oldest pending job.
+
+        :return: The TaskSummary of the store
+        """
+        counts = {
+            task_status: sum(1 for _ in self._job_ids_with_status(task_status))
+            for task_status in [
+                TaskStatus.PROCESSING,
+                TaskStatus.SUCCEEDED,
+                TaskStatus.ERROR,
+            ]
+        }
+        pending = list(chain(self.in_folder.iterdir(), self._claimed_job_paths()))
+        added_at = [_modified_at(path) for path in pending]
+        lanes = Counter(self._task_priority(path.name) for path in pending)
+        return TaskSummary(
+            counts,
+            min((t for t in added_at if t is not None), default=None),
+            {lane: lanes[lane] for lane in TaskPriority},
+        )
+
     def get_result(self, job_id: str) -> BinaryIO:
         """Get the result of a completed task.
 
@@ -213,9 +1125,46 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
         :raises: JobNotFound if no completed job is found with the given ID.
         """
         if self._job_is_finished(job_id):
-            return io.BytesIO(self.out_folder.joinpath(job_id).read_bytes())
+            return io.BytesIO(self._out_job_path(job_id).read_bytes())
+        raise JobNotFound(f"No completed job found with ID {job_id}")
+
+    def get_result_path(self, job_id: str) -> Path:
+        """Get the path of the file holding the result of a completed task.
+
+        Results are never modified once registered, so the file can be sent
+        to a client without first being read into memory.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: Path of the thumbnail file
+        :raises: JobNotFound if no completed job is found with the given ID.
+        """
+        if self._job_is_finished(job_id):
+            return self._out_job_path(job_id)
         raise JobNotFound(f"No completed job found with ID {job_id}")
 
+    def get_result_info(self, job_id: str) -> ResultInfo:
+        """Get the validators of the result of a completed task.
+
+        The digest of a thumbnail registered before digests were kept is
+        computed from the file on first request and kept from then on.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: The ResultInfo of the thumbnail
+        :raises: JobNotFound if no completed job is found with the given ID.
+        """
+        try:
+            stat = self._out_job_path(job_id).stat()
+        except FileNotFoundError:
+            raise JobNotFound(f"No completed job found with ID {job_id}")
+        meta_path = self._meta_job_path(job_id)
+        try:
+            etag = meta_path.read_text("ascii")
+        except FileNotFoundError:
+            etag = hashlib.sha256(self._out_job_path(job_id).read_bytes()).hexdigest()
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(etag, "ascii")
+        return ResultInfo(etag, stat.st_mtime, stat.st_size)
+
     def get_error(self, job_id: str) -> str:
         """Get the error message from a failed task.
 
@@ -227,31 +1176,181 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
             raise JobNotFound(f"No error job found with ID {job_id}")
         return self._error_job_path(job_id).read_text("utf-8")
 
-    def get_next_task(self) -> tuple[str, BinaryIO] | None:
-        """Return an unstarted task.
+    def get_task_metadata(self, job_id: str) -> TaskMetadata | None:
+        """Get the metadata of the image of a task.
+
+        :param job_id: The ID uniquely identifying a task.
+        :return: The metadata, or None if the image was not probed on upload
+            or no job is found with the given ID.
+        """
+        try:
+            return TaskMetadata.from_json(
+                self._source_job_path(job_id).read_text("utf-8")
+            )
+        except FileNotFoundError:
+            return None
 
-        The order in which unstarted tasks are returned is undefined, making
-        this not strictly a queue.
+    def get_task_callbacks(self, job_id: str) -> list[str]:
+        """Get the callback URLs given with the uploads of a job.
 
-        A clear danger of this method is that the task is deleted after
-        being loaded into memory and before delivering it to a worker.
-        Not only is there a danger of the worker crashing before submitting
-        the results, which would cause the task to be lost completely, but
-        any queries for task status during this period would return
-        TaskStatus.NOT_FOUND, which would be misleading.
+        :param job_id: The ID uniquely identifying a task.
+        :return: The URLs, in the order they were given. Empty if none was
+            given or no job is found with the given ID.
+        """
+        try:
+            return self._callbacks_job_path(job_id).read_text("utf-8").splitlines()
+        except FileNotFoundError:
+            return []
 
-        :return: An unstarted task, or None, if there are no tasks to be done.
+    def _task_priority(self, job_id: str) -> TaskPriority:
+        """Get the lane of a task.
+
+        :param job_id: The ID uniquely identifying a task.
+        :return: The lane the task waits in
         """
-        tasks = self._job_ids_with_status(TaskStatus.PROCESSING)
         try:
-            job_id = next(iter(tasks))
-        except StopIteration:
-            return None
+            return TaskPriority(self._priority_job_path(job_id).read_text("utf-8"))
+        except FileNotFoundError:
+            return TaskPriority.INTERACTIVE
+
+    def _scheduled_job_ids(self) -> list[tuple[str, TaskPriority]]:
+        """List the unclaimed tasks in the order they are to be handed out.
+
+        The lanes are ordered by the LaneScheduler, and the tasks within each
+        lane by the scheduling policy. Under "unordered", a lane keeps the
+        order in which the filesystem lists its tasks.
+
+        :return: IDs and lanes of the jobs of the unclaimed tasks
+        """
+        # Cached lanes are read again when a task was promoted, see _promote_task
+        lanes_changed_at = self.priority_folder.stat().st_mtime_ns
+        reread_lanes = lanes_changed_at != self._lanes_changed_at
+        self._lanes_changed_at = lanes_changed_at
+        schedule = {}
+        for job_id in os.listdir(self.in_folder):
+            entry = self._schedule.get(job_id)
+            if (
+                entry is not None
+                and reread_lanes
+                and entry[0] != TaskPriority.INTERACTIVE
+            ):
+                entry = (self._task_priority(job_id), entry[1])
+            if entry is None:
+                position = 0.0
+                if self._scheduling != "unordered":
+                    try:
+                        added_at = self._in_job_path(job_id).stat().st_mtime
+                    except FileNotFoundError:
+                        # Another Worker claimed this task in the meantime
+                        continue
+                    metadata = None
+                    if self._scheduling == "size":
+                        metadata = self.get_task_metadata(job_id)
+                    cost = metadata.cost if metadata is not None else 0.0
+                    delay = scheduling_delay(cost, self._scheduling, self._aging_rate)
+                    position = added_at + delay
+                entry = (self._task_priority(job_id), position)
+            schedule[job_id] = entry
+        self._schedule = schedule
+
+        lane_order = self._lanes.lane_order({lane for lane, _ in schedule.values()})
+        rank = {lane: i for i, lane in enumerate(lane_order)}
+        return [
+            (job_id, schedule[job_id][0])
+            for job_id in sorted(
+                schedule,
+                key=lambda job_id: (rank[schedule[job_id][0]], schedule[job_id][1]),
+            )
+        ]
+
+    def get_next_task(self) -> Task | None:
+        """Claim the unstarted task that comes first under the scheduling policy.
+
+        The task is taken from the lane chosen by the LaneScheduler, falling
+        back to the other lanes if it is claimed by another Worker first.
+
+        The task is claimed by renaming it into this process's claimed folder,
+        which is atomic, so a task can only ever be claimed by one Worker even
+        if several of them race for it. It stays there, reporting
+        TaskStatus.PROCESSING, until its result is registered or its lease
+        expires. Expired leases of any worker process are requeued here.
+
+        The image is handed over as a file open on the claimed task, which the
+        Worker closes when it is done, rather than read into memory.
+
+        :return: An unstarted task, or None, if there are no tasks to be done.
+        """
+        if time.time() >= self._next_requeue_check:
+            self.requeue_expired_claims()
+
+        for job_id, priority in self._scheduled_job_ids():
+            claimed_path = self._claimed_job_path(job_id)
+            try:
+                os.rename(self._in_job_path(job_id), claimed_path)
+            except FileNotFoundError:
+                # Another Worker claimed this task first
+                continue
+            # Start the lease now rather than at the time of upload
+            os.utime(claimed_path)
+            self._set_indexed_status(job_id, TaskStatus.PROCESSING, priority)
+            return Task(job_id, claimed_path.open("rb"), self.get_task_metadata(job_id))
+        return None
+
+    def requeue_expired_claims(self) -> int:
+        """Move tasks whose lease has expired back into the queue.
+
+        A lease starts when a task is claimed. It expires after the configured
+        number of seconds if no result has been registered for the task.
+
+        :return: The number of tasks that were requeued
+        """
+        now = time.time()
+        self._next_requeue_check = now + min(
+            self._lease_seconds, self._requeue_interval
+        )
+        requeued = 0
+        for path in list(self._claimed_job_paths()):
+            try:
+                stat = path.stat()
+                if max(stat.st_mtime, stat.st_ctime) + self._lease_seconds > now:
+                    continue
+                os.rename(path, self._in_job_path(path.name))
+            except FileNotFoundError:
+                # The result was registered in the meantime
+                continue
+            requeued += 1
+        self._remove_abandoned_uploads(now)
+        return requeued
+
+    def _remove_abandoned_uploads(self, now: float) -> None:
+        """Delete uploads left in the "tmp" folder by a process that died mid-copy.
+
+        :param now: Current epoch time
+        """
+        for path in self.tmp_folder.iterdir():
+            try:
+                if path.stat().st_mtime + self._lease_seconds <= now:
+                    path.unlink()
+            except FileNotFoundError:
+                # The upload was enqueued in the meantime
+                continue
+
+    def _requeue_own_claims(self) -> None:
+        """Requeue tasks claimed by a previous process with the same worker id.
+
+        A worker id is only in use by one live process, so any claims already
+        present when the store is opened were abandoned, e.g. by a container
+        that restarted with the same hostname and process id.
+        """
+        for path in self.claimed_folder.joinpath(self._worker_id).iterdir():
+            os.replace(path, self._in_job_path(path.name))
+
+    def _release_claim(self, job_id: str) -> None:
+        """Delete the claimed task after its result has been registered.
 
-        image_path = self._in_job_path(job_id)
-        image_data = io.BytesIO(image_path.read_bytes())
-        os.remove(image_path)
-        return job_id, image_data
+        :param job_id: ID uniquely identifying a task.
+        """
+        self._claimed_job_path(job_id).unlink(missing_ok=True)
 
     def register_task_complete(
         self, job_id: str, thumbnail: Image.Image, image_format: str
@@ -262,8 +1361,23 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
         :param thumbnail: The thumbnail created by the worker.
         :param image_format: The image format of the thumbnail.
         """
+        result = io.BytesIO()
+        thumbnail.save(result, format=image_format)
+        # The digest is written first so that it exists whenever the thumbnail does
+        meta_path = self._meta_job_path(job_id)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        etag = hashlib.sha256(result.getbuffer()).hexdigest()
+        meta_path.write_text(etag, "ascii")
         thumbnail_path = self._out_job_path(job_id)
-        thumbnail.save(thumbnail_path, format=image_format)
+        thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+        thumbnail_path.write_bytes(result.getbuffer())
+        if self._result_cache is not None:
+            last_modified = thumbnail_path.stat().st_mtime
+            self._result_cache.put(
+                job_id, CachedResult(result.getvalue(), etag, last_modified)
+            )
+        self._release_claim(job_id)
+        self._set_indexed_status(job_id, TaskStatus.SUCCEEDED)
 
     def register_task_error(self, job_id: str, error_msg: str) -> None:
         """Register the error message from a failed task.
@@ -273,4 +1387,627 @@ class FileSystemTaskStore(TaskStoreBroker, TaskStoreWorker):
             This will be returned to the user.
         """
         error_path = self._error_job_path(job_id)
+        error_path.parent.mkdir(parents=True, exist_ok=True)
         error_path.write_text(error_msg, "utf-8")
+        self._release_claim(job_id)
+        self._set_indexed_status(job_id, TaskStatus.ERROR)
+
+
+class SQLiteTaskStore(TaskStoreBroker, TaskStoreWorker):
+    """TaskStore using an SQLite database that can communicate with Brokers and Workers
+
+    All task state lives in a single "jobs" table indexed on (status, created_at),
+    so looking up a status, dequeuing a task, and listing jobs do not
+    get slower as the number of retained jobs grows. The image uploaded for a task
+    and the resulting thumbnail are stored as BLOBs alongside the task state.
+    Uploads are streamed into their BLOB, and out of it for the Worker, a chunk
+    at a time, so they are never held in memory as a whole.
+
+    The number of jobs in each status is kept in a "job_counts" table by
+    triggers on "jobs", so the store can be summarized without a table scan.
+
+    Deduplicated uploads are stored with the SHA-256 digest of their content,
+    indexed so an upload can be matched with an earlier job in a single lookup.
+    The lookup and insertion run in one write transaction, so identical uploads
+    are coalesced exactly, even across processes.
+
+    The database is opened in WAL mode so that readers (the Broker) never block
+    the writer (the Worker) and vice versa. Each thread gets its own connection.
+
+    Tasks are handed out in order of a "run_at" time, indexed with the status,
+    which is the time the task was added plus the delay for its size under the
+    scheduling policy, see app.task_queue.scheduling. The delay is fixed when
+    the task is added. "unordered" scheduling is the same as "fifo".
+
+    Each task waits in a priority lane, kept in a "priority" column indexed
+    with the status and run_at, and the next task is taken from the lane chosen
+    by the LaneScheduler. An upload deduplicated into a processing task moves it
+    to the more urgent of their lanes.
+
+    The callback URLs given with the uploads of a job, including the uploads
+    deduplicated into it, are kept in a "callbacks" table indexed on job_id.
+
+    A task handed to a Worker is claimed with a lease and keeps reporting
+    TaskStatus.PROCESSING until its result is registered. Claiming happens in
+    a write transaction, so Workers in any number of threads or processes can
+    share the database without processing a task twice. If the lease expires
+    before a result is registered, the task is handed out again.
+
+    Methods:
+    -------
+    reset(self) -> None: Reinitialize the TaskStore. This deletes all tasks.
+    add_task_to_queue(self, image: BinaryIO, dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None) -> QueuedTask: Create a task to process
+        an image, or find the job already processing the same image, and return
+        the ID of the task.
+    get_task_status(self, job_id: str) -> TaskStatus: Get the task status of a job.
+    get_all_task_status(self) -> dict[TaskStatus, Iterable[str]]: Get the task status
+        of all jobs.
+    iter_job_ids(self, task_status: TaskStatus | None = None, after: str = "")
+        -> Iterator[tuple[str, TaskStatus]]: Lazily list jobs in job id order.
+    get_task_summary(self) -> TaskSummary: Count the jobs in each status and
+        priority lane.
+    get_result(self, job_id: str) -> BinaryIO: Get the result of a completed task.
+    get_result_info(self, job_id: str) -> ResultInfo: Get the validators of the
+        result of a completed task.
+    get_error(self, job_id: str) -> str: Get the error message from a failed task.
+    get_task_metadata(self, job_id: str) -> TaskMetadata | None: Get the metadata
+        of the image of a task, if it was probed on upload.
+    get_task_callbacks(self, job_id: str) -> list[str]: Get the callback URLs
+        given with the uploads of a job.
+    get_next_task(self) -> Task | None: Claim the unstarted task that
+        comes first under the scheduling policy in the lane chosen by the
+        LaneScheduler.
+    register_task_complete(self, job_id: str, thumbnail: Image.Image,
+        image_format: str) -> None:
+        Used by workers to submit the results of a completed task.
+    register_task_error(self, job_id: str, error: Exception) -> None:
+        Used by workers to submit the results of a failed task.
+    """
+
+    _database_file = "tasks.sqlite3"
+    _schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            lease_expires_at REAL,
+            image BLOB,
+            result BLOB,
+            etag TEXT,
+            finished_at REAL,
+            digest TEXT,
+            metadata TEXT,
+            run_at REAL,
+            priority TEXT NOT NULL DEFAULT 'interactive',
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_status_job_id ON jobs (status, job_id);
+        CREATE TABLE IF NOT EXISTS callbacks (
+            job_id TEXT NOT NULL,
+            url TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS callbacks_job_id ON callbacks (job_id);
+        CREATE TABLE IF NOT EXISTS job_counts (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS jobs_count_insert AFTER INSERT ON jobs BEGIN
+            INSERT INTO job_counts VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS jobs_count_delete AFTER DELETE ON jobs BEGIN
+            UPDATE job_counts SET count = count - 1 WHERE status = OLD.status;
+        END;
+        CREATE TRIGGER IF NOT EXISTS jobs_count_update AFTER UPDATE OF status ON jobs
+            WHEN OLD.status != NEW.status BEGIN
+            UPDATE job_counts SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO job_counts VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END;
+    """
+
+    def __init__(
+        self,
+        data_folder: str,
+        lease_seconds: float = 300,
+        result_cache: ResultCache | None = None,
+        scheduling: SchedulingPolicy = "fifo",
+        aging_rate: float = 1.0,
+        lanes: LaneScheduler | None = None,
+    ) -> None:
+        """
+        Initialize the database store by ensuring the database file
+        and its schema exist.
+
+        :param data_folder: Folder in which the database file is kept.
+        :param lease_seconds: How long a claimed task may go without a registered
+            result before it is handed out again.
+        :param result_cache: Cache to add each registered result to.
+        :param scheduling: Order in which unclaimed tasks are handed out.
+        :param aging_rate: Megapixels of estimated cost forgiven per second
+            a task waits, under the "size" scheduling policy.
+        :param lanes: Chooses the priority lane each task is taken from.
+            Defaults to strict priority.
+        """
+        self._root = Path(data_folder)
+        self._scheduling = scheduling
+        self._aging_rate = aging_rate
+        self._lanes = lanes or LaneScheduler()
+        self._result_cache = result_cache
+        self._lease_seconds = lease_seconds
+        self._root.mkdir(exist_ok=True)
+        self._path = self._root.joinpath(self._database_file)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self._schema)
+        self._migrate_schema()
+
+    def _migrate_schema(self) -> None:
+        """Add the columns missing from a database created by an older version.
+
+        Indexes on the added columns are created here, once the columns exist.
+        Databases from before leases recorded when a task was claimed in a
+        "claimed_at" column; a task claimed then keeps its claim for the
+        length of a lease from that time.
+
+        The migration runs in a write transaction, so several processes
+        opening the database at once do not both try to add a column.
+        """
+        with self._transaction() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_expires_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+                if "claimed_at" in columns:
+                    conn.execute(
+                        "UPDATE jobs SET lease_expires_at = claimed_at + ?"
+                        " WHERE claimed_at IS NOT NULL AND status = ?",
+                        (self._lease_seconds, TaskStatus.PROCESSING),
+                    )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_lease_expires_at"
+                " ON jobs (lease_expires_at) WHERE lease_expires_at IS NOT NULL"
+            )
+            for column, column_type in [
+                ("etag", "TEXT"),
+                ("finished_at", "REAL"),
+                ("digest", "TEXT"),
+                ("metadata", "TEXT"),
+                ("run_at", "REAL"),
+                ("priority", "TEXT NOT NULL DEFAULT 'interactive'"),
+            ]:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("UPDATE jobs SET run_at = created_at WHERE run_at IS NULL")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_run_at ON jobs (status, run_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_priority_run_at"
+                " ON jobs (status, priority, run_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_digest ON jobs (digest)"
+                " WHERE digest IS NOT NULL"
+            )
+            # Count the jobs added before the counting triggers existed
+            if conn.execute("SELECT 1 FROM job_counts LIMIT 1").fetchone() is None:
+                conn.execute(
+                    "INSERT INTO job_counts"
+                    " SELECT status, count(*) FROM jobs GROUP BY status"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening one if necessary.
+
+        sqlite3 connections may not be shared between threads, and the Broker
+        and Worker run on different threads, so each thread gets its own.
+        Connections are opened in autocommit mode; multi-statement operations
+        use _transaction().
+
+        :return: A connection to the task database
+        """
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block of statements in a write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so two Workers can
+        never select and claim the same task.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def reset(self) -> None:
+        """Reinitialize the TaskStore. This deletes all tasks."""
+        conn = self._connection()
+        conn.execute("DELETE FROM jobs")
+        conn.execute("DELETE FROM callbacks")
+
+    def add_task_to_queue(
+        self,
+        image: BinaryIO,
+        dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None,
+    ) -> QueuedTask:
+        """Create a task to process an image and return the ID of the task.
+
+        Given a salt, the upload is deduplicated: if the same image was uploaded
+        with the same salt and its job is processing or succeeded, the ID of
+        that job is returned and no task is created.
+
+        :param image: Seekable file data of image to be processed
+        :param dedupe_salt: Bytes hashed along with the image, e.g. a fingerprint
+            of the settings the result depends on. None disables deduplication.
+        :param metadata: Metadata of the image, kept for the Worker and job status
+        :param priority: Lane the task waits in. A processing job the upload is
+            deduplicated into is moved to this lane if it is more urgent.
+        :param callback_url: URL to notify when the job finishes, added to the
+            callbacks of the job the upload is deduplicated into, if any
+        :return: The uuid-compliant ID of the task, and whether it is the job
+            of an earlier upload
+        """
+        start = image.tell()
+        size = image.seek(0, os.SEEK_END) - start
+        digest = None
+        if dedupe_salt is not None:
+            hasher = hashlib.sha256(dedupe_salt)
+            image.seek(start)
+            _copy_in_chunks(image, hasher.update)
+            digest = hasher.hexdigest()
+
+        job_id = str(uuid.uuid4())
+        cost = metadata.cost if metadata is not None else 0.0
+        delay = scheduling_delay(cost, self._scheduling, self._aging_rate)
+        with self._transaction() as conn:
+            if digest is not None:
+                row = conn.execute(
+                    "SELECT job_id, status, priority FROM jobs"
+                    " WHERE digest = ? AND status IN (?, ?)"
+                    " ORDER BY created_at DESC LIMIT 1",
+                    (digest, TaskStatus.PROCESSING, TaskStatus.SUCCEEDED),
+                ).fetchone()
+                if row is not None:
+                    duplicate_job_id, duplicate_status, duplicate_priority = row
+                    lane = most_urgent(TaskPriority(duplicate_priority), priority)
+                    if duplicate_status == TaskStatus.PROCESSING and (
+                        lane != duplicate_priority
+                    ):
+                        conn.execute(
+                            "UPDATE jobs SET priority = ? WHERE job_id = ?",
+                            (lane, duplicate_job_id),
+                        )
+                    if callback_url is not None:
+                        conn.execute(
+                            "INSERT INTO callbacks VALUES (?, ?)",
+                            (duplicate_job_id, callback_url),
+                        )
+                    return QueuedTask(str(duplicate_job_id), deduplicated=True)
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, image, digest,"
+                " metadata, run_at, priority)"
+                " VALUES (?, ?, ?, zeroblob(?), ?, ?, ?, ?)",
+                (
+                    job_id,
+                    TaskStatus.PROCESSING,
+                    now,
+                    size,
+                    digest,
+                    metadata.to_json() if metadata is not None else None,
+                    now + delay,
+                    priority,
+                ),
+            )
+            assert cursor.lastrowid is not None
+            image.seek(start)
+            with conn.blobopen("jobs", "image", cursor.lastrowid) as blob:
+                _copy_in_chunks(image, blob.write)
+            if callback_url is not None:
+                conn.execute(
+                    "INSERT INTO callbacks VALUES (?, ?)", (job_id, callback_url)
+                )
+        return QueuedTask(job_id)
+
+    def get_task_status(self, job_id: str) -> TaskStatus:
+        """Get the task status of a job.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: The TaskStatus of the task.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,))
+            .fetchone()
+        )
+        if row is None:
+            return TaskStatus.NOT_FOUND
+        return TaskStatus(row[0])
+
+    def get_all_task_status(self) -> dict[TaskStatus, Iterable[str]]:
+        """Get the task status of all tasks, grouped by status.
+
+        :return: A dictionary whose keys are the unique statuses and the
+            values are the job IDs with that status.
+        """
+        results: dict[TaskStatus, list[str]] = {
+            TaskStatus.PROCESSING: [],
+            TaskStatus.SUCCEEDED: [],
+            TaskStatus.ERROR: [],
+        }
+        for job_id, task_status in self._connection().execute(
+            "SELECT job_id, status FROM jobs"
+        ):
+            results[TaskStatus(task_status)].append(job_id)
+        return {task_status: job_ids for task_status, job_ids in results.items()}
+
+    def iter_job_ids(
+        self, task_status: TaskStatus | None = None, after: str = ""
+    ) -> Iterator[tuple[str, TaskStatus]]:
+        """Lazily list jobs in ascending job id order.
+
+        Rows are stepped through one at a time on the job_id index, or the
+        (status, job_id) index when filtering by status. The iterator must be
+        consumed on the thread that created it.
+
+        :param task_status: Only list jobs with this status. None for all jobs.
+        :param after: Only list jobs whose id is greater than this one
+        :return: Iterator of job ids and their status
+        """
+        if task_status is None:
+            rows = self._connection().execute(
+                "SELECT job_id, status FROM jobs WHERE job_id > ? ORDER BY job_id",
+                (after,),
+            )
+        else:
+            rows = self._connection().execute(
+                "SELECT job_id, status FROM jobs WHERE status = ? AND job_id > ?"
+                " ORDER BY job_id",
+                (task_status, after),
+            )
+        for job_id, row_status in rows:
+            yield job_id, TaskStatus(row_status)
+
+    def get_task_summary(self) -> TaskSummary:
+        """Count the jobs in each status and find the oldest pending job.
+
+        Counts are read from the trigger-maintained "job_counts" table, the
+        oldest pending job from the (status, created_at) index, and the pending
+        jobs in each lane are counted on the (status, priority, run_at) index.
+
+        :return: The TaskSummary of the store
+        """
+        conn = self._connection()
+        counts = dict.fromkeys(
+            [TaskStatus.PROCESSING, TaskStatus.SUCCEEDED, TaskStatus.ERROR], 0
+        )
+        for row_status, count in conn.execute("SELECT status, count FROM job_counts"):
+            counts[TaskStatus(row_status)] = count
+        (oldest_pending_at,) = conn.execute(
+            "SELECT min(created_at) FROM jobs WHERE status = ?",
+            (TaskStatus.PROCESSING,),
+        ).fetchone()
+        lanes: dict[TaskPriority, int] = dict.fromkeys(TaskPriority, 0)
+        for priority, count in conn.execute(
+            "SELECT priority, count(*) FROM jobs WHERE status = ? GROUP BY priority",
+            (TaskStatus.PROCESSING,),
+        ):
+            lanes[TaskPriority(priority)] = count
+        return TaskSummary(counts, oldest_pending_at, lanes)
+
+    def get_result(self, job_id: str) -> BinaryIO:
+        """Get the result of a completed task.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: The results of the completed task.
+        :raises: JobNotFound if no completed job is found with the given ID.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT result FROM jobs WHERE job_id = ? AND status = ?",
+                (job_id, TaskStatus.SUCCEEDED),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise JobNotFound(f"No completed job found with ID {job_id}")
+        return io.BytesIO(row[0])
+
+    def get_result_info(self, job_id: str) -> ResultInfo:
+        """Get the validators of the result of a completed task.
+
+        :param job_id: The ID uniquely identifying a task
+        :return: The ResultInfo of the thumbnail
+        :raises: JobNotFound if no completed job is found with the given ID.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT etag, finished_at, length(result) FROM jobs"
+                " WHERE job_id = ? AND status = ?",
+                (job_id, TaskStatus.SUCCEEDED),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise JobNotFound(f"No completed job found with ID {job_id}")
+        etag, finished_at, size = row
+        if etag is None:
+            # Completed by a version that did not store digests
+            etag = hashlib.sha256(self.get_result(job_id).read()).hexdigest()
+            self._connection().execute(
+                "UPDATE jobs SET etag = ? WHERE job_id = ?", (etag, job_id)
+            )
+        return ResultInfo(etag, finished_at or 0.0, size)
+
+    def get_error(self, job_id: str) -> str:
+        """Get the error message from a failed task.
+
+        :param job_id: The ID uniquely identifying a task.
+        :return: The error message from a failed task.
+        :raises: JobNotFound if no failed job is found with the given ID.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT error FROM jobs WHERE job_id = ? AND status = ?",
+                (job_id, TaskStatus.ERROR),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise JobNotFound(f"No error job found with ID {job_id}")
+        return str(row[0])
+
+    def get_task_metadata(self, job_id: str) -> TaskMetadata | None:
+        """Get the metadata of the image of a task.
+
+        :param job_id: The ID uniquely identifying a task.
+        :return: The metadata, or None if the image was not probed on upload
+            or no job is found with the given ID.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT metadata FROM jobs WHERE job_id = ?", (job_id,))
+            .fetchone()
+        )
+        if row is None or row[0] is None:
+            return None
+        return TaskMetadata.from_json(row[0])
+
+    def get_task_callbacks(self, job_id: str) -> list[str]:
+        """Get the callback URLs given with the uploads of a job.
+
+        :param job_id: The ID uniquely identifying a task.
+        :return: The URLs, in the order they were given. Empty if none was
+            given or no job is found with the given ID.
+        """
+        rows = self._connection().execute(
+            "SELECT url FROM callbacks WHERE job_id = ? ORDER BY rowid", (job_id,)
+        )
+        return [url for (url,) in rows]
+
+    def get_next_task(self) -> Task | None:
+        """Claim the unstarted task that comes first under the scheduling policy.
+
+        The task is taken from the lane chosen by the LaneScheduler among the
+        lanes with unclaimed tasks.
+
+        The task remains in TaskStatus.PROCESSING until the Worker registers
+        its result, and the image data is kept until then in case the lease
+        expires and the task has to be handed out again.
+
+        The image is copied out of the database a chunk at a time into a
+        temporary file, which stays in memory only while it is small.
+
+        Idle Workers poll an empty queue, so whether any task can be claimed
+        is first checked with a plain read, which does not contend with
+        uploads for the write lock. The write transaction is only taken when
+        there is a task to claim.
+
+        :return: An unstarted task, or None, if there are no tasks to be done.
+        """
+        now = time.time()
+        claimable = (
+            self._connection()
+            .execute(
+                "SELECT 1 FROM jobs WHERE status = ?"
+                " AND (lease_expires_at IS NULL OR lease_expires_at < ?) LIMIT 1",
+                (TaskStatus.PROCESSING, now),
+            )
+            .fetchone()
+        )
+        if claimable is None:
+            return None
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = NULL"
+                " WHERE lease_expires_at < ? AND status = ?",
+                (now, TaskStatus.PROCESSING),
+            )
+            waiting = [
+                lane
+                for lane in TaskPriority
+                if conn.execute(
+                    "SELECT 1 FROM jobs WHERE status = ? AND priority = ?"
+                    " AND lease_expires_at IS NULL LIMIT 1",
+                    (TaskStatus.PROCESSING, lane),
+                ).fetchone()
+            ]
+            if not waiting:
+                return None
+            row = conn.execute(
+                "SELECT rowid, job_id, metadata FROM jobs"
+                " WHERE status = ? AND priority = ? AND lease_expires_at IS NULL"
+                " ORDER BY run_at LIMIT 1",
+                (TaskStatus.PROCESSING, self._lanes.lane_order(waiting)[0]),
+            ).fetchone()
+            rowid, job_id, metadata = row
+            conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ?",
+                (now + self._lease_seconds, job_id),
+            )
+        image = tempfile.SpooledTemporaryFile(max_size=COPY_CHUNK_SIZE)
+        with conn.blobopen("jobs", "image", rowid, readonly=True) as blob:
+            _copy_in_chunks(cast(BinaryIO, blob), image.write)
+        image.seek(0)
+        return Task(
+            job_id,
+            cast(BinaryIO, image),
+            TaskMetadata.from_json(metadata) if metadata is not None else None,
+        )
+
+    def register_task_complete(
+        self, job_id: str, thumbnail: Image.Image, image_format: str
+    ) -> None:
+        """Register the completed results of a task.
+
+        :param job_id: ID uniquely identifying a task.
+        :param thumbnail: The thumbnail created by the worker.
+        :param image_format: The image format of the thumbnail.
+        """
+        result = io.BytesIO()
+        thumbnail.save(result, format=image_format)
+        etag = hashlib.sha256(result.getbuffer()).hexdigest()
+        finished_at = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, etag = ?, finished_at = ?,"
+            " image = NULL, lease_expires_at = NULL WHERE job_id = ?",
+            (TaskStatus.SUCCEEDED, result.getvalue(), etag, finished_at, job_id),
+        )
+        if self._result_cache is not None:
+            self._result_cache.put(
+                job_id, CachedResult(result.getvalue(), etag, finished_at)
+            )
+
+    def register_task_error(self, job_id: str, error_msg: str) -> None:
+        """Register the error message from a failed task.
+
+        :param job_id: ID uniquely identifying a task.
+        :param error_msg: The error details that occurred during thumbnail generation.
+            This will be returned to the user.
+        """
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, image = NULL,"
+            " lease_expires_at = NULL WHERE job_id = ?",
+            (TaskStatus.ERROR, error_msg, job_id),
+        )
@@ -0,0 +1,363 @@
+import heapq
+import ipaddress
+import itertools
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable
+
+import httpx
+
+from app.exceptions import InvalidCallbackURL
+from app.task_queue.task_store import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Response statuses of a failed delivery that are worth retrying
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def completion_event(
+    job_id: str, task_status: TaskStatus, error: str | None = None
+) -> dict[str, str]:
+    """Describe the completion of a job, as POSTed to its callback URLs.
+
+    :param job_id: ID of the job
+    :param task_status: Status the job finished with
+    :param error: Error message of the job, if it failed
+    :return: The "job_id" and "status" of the job, and its "error" if any
+    """
+    event = {"job_id": job_id, "status": str(task_status)}
+    if error is not None:
+        event["error"] = error
+    return event
+
+
+def _host_is_allowed(host: str, allowed_hosts: Iterable[str]) -> bool:
+    """Check a host against a list of allowed hosts.
+
+    :param host: Host of a callback URL
+    :param allowed_hosts: Host names or IP addresses. "*.example.com" also
+        allows the subdomains of example.com, and "*" allows any host.
+    :return: True if the host is allowed
+    """
+    host = host.lower().rstrip(".")
+    for allowed in allowed_hosts:
+        allowed = allowed.lower().rstrip(".")
+        if allowed in ("*", host):
+            return True
+        if allowed.startswith("*.") and host.endswith(allowed[1:]):
+            return True
+    return False
+
+
+def _address_is_public(address: str) -> bool:
+    """Check that an address is a public unicast address.
+
+    :param address: An IPv4 or IPv6 address
+    :return: False for private, loopback, link-local, reserved, multicast or
+        unspecified addresses, including IPv4 ones mapped to IPv6
+    """
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+@dataclass
+class _Batch:
+    """Events to POST to a callback URL in a single request.
+
+    :cvar url: The callback URL
+    :cvar events: The events, sent as a JSON array
+    :cvar attempt: Number of failed attempts to deliver the batch
+    """
+
+    url: str
+    events: list[dict[str, str]]
+    attempt: int = 0
+
+
+class WebhookDispatcher:
+    """Delivers job completion events to callback URLs on background threads.
+
+    deliver() only queues an event, so a Worker never waits on outbound HTTP.
+    A dispatcher thread hands the queued events to a pool of sender threads
+    sharing one httpx.Client, so connections to each callback host are kept
+    alive and reused. Events queued for the same URL while every sender is
+    busy are POSTed together, as a JSON array of at most batch_size events.
+
+    A batch that fails with a connection error, a timeout or a retryable status
+    is sent again after a backoff that doubles with every attempt, up to
+    max_attempts. Other failures are logged and dropped. Delivery is at least
+    once: a receiver may see the same event twice.
+
+    At most max_pending events are queued, waiting for a retry or being sent.
+    Events beyond that are dropped and counted, rather than letting the queue
+    grow without bound while a callback host is down.
+
+    Callback URLs are given by clients, so they must not turn the dispatcher
+    into a way to reach internal services. Only URLs whose host is one of
+    allowed_hosts are POSTed to, and only if every address the host resolves to
+    is public, unless allow_private_addresses is set. check_url rejects other
+    URLs on upload. The host is resolved and checked again before each request,
+    which is then sent to the checked address, so a host cannot be rebound to
+    an internal address in between. Redirects are not followed, and proxies
+    set in the environment are not used.
+
+    The threads are started by the first delivery, and stopped by stop().
+
+    Methods:
+    -------
+    check_url(self, url: str) -> str: Check that a callback URL may be POSTed to,
+        and resolve its host.
+    deliver(self, url: str, event: dict[str, str]) -> bool: Queue an event to be
+        POSTed to a callback URL.
+    stop(self, timeout: float = 5.0) -> None: Send the queued events and stop
+        the threads.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 1000,
+        batch_size: int = 50,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 5.0,
+        allowed_hosts: Iterable[str] = (),
+        allow_private_addresses: bool = False,
+    ) -> None:
+        """
+        :param max_pending: Most events queued or being delivered at a time.
+        :param batch_size: Most events POSTed to a URL in a single request.
+        :param concurrency: Number of requests sent at the same time.
+        :param max_attempts: Number of times a batch is sent before giving up.
+        :param backoff: Seconds before the first retry of a batch.
+        :param timeout: Seconds to wait for a callback host to respond.
+        :param allowed_hosts: Hosts callback URLs may point at. "*.example.com"
+            also allows its subdomains, and "*" any host. Empty disables callbacks.
+        :param allow_private_addresses: Also POST to hosts resolving to private,
+            loopback, link-local or reserved addresses.
+        """
+        self._max_pending = max_pending
+        self._batch_size = batch_size
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._timeout = timeout
+        self._allowed_hosts = list(allowed_hosts)
+        self._allow_private_addresses = allow_private_addresses
+        self._pending: deque[tuple[str, dict[str, str]]] = deque()
+        # Batches waiting to be retried, ordered by the time they are due
+        self._retries: list[tuple[float, int, _Batch]] = []
+        self._retry_sequence = itertools.count()
+        # Events queued, waiting for a retry or being sent
+        self._outstanding = 0
+        self._condition = threading.Condition()
+        self._senders = threading.Semaphore(concurrency)
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._client: httpx.Client | None = None
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def check_url(self, url: str) -> str:
+        """Check that a callback URL may be POSTed to, and resolve its host.
+
+        :param url: The callback URL
+        :return: An address of the host, every one of which was checked
+        :raises: InvalidCallbackURL if callbacks are disabled, the host is not
+            allowed or cannot be resolved, or resolves to an address that is
+            not public while private addresses are not allowed
+        """
+        if not self._allowed_hosts:
+            raise InvalidCallbackURL("Callback URLs are disabled")
+        try:
+            parsed = httpx.URL(url)
+        except httpx.InvalidURL as e:
+            raise InvalidCallbackURL(f"Invalid callback URL: {e}")
+        if parsed.scheme not in ("http", "https") or not parsed.host:
+            raise InvalidCallbackURL(f"Not an HTTP URL: {url}")
+        if not _host_is_allowed(parsed.host, self._allowed_hosts):
+            raise InvalidCallbackURL(f"Callbacks to {parsed.host} are not allowed")
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        try:
+            addresses = [
+                str(info[4][0])
+                for info in socket.getaddrinfo(
+                    parsed.host, port, type=socket.SOCK_STREAM
+                )
+            ]
+        except (OSError, UnicodeError) as e:
+            raise InvalidCallbackURL(f"Cannot resolve {parsed.host}: {e}")
+        if not self._allow_private_addresses:
+            for address in addresses:
+                if not _address_is_public(address):
+                    raise InvalidCallbackURL(
+                        f"{parsed.host} resolves to {address}, "
+                        "which is not a public address"
+                    )
+        return addresses[0]
+
+    def deliver(self, url: str, event: dict[str, str]) -> bool:
+        """Queue an event to be POSTed to a callback URL.
+
+        :param url: The callback URL
+        :param event: The event, see completion_event
+        :return: False if the event was dropped because too many are pending
+        """
+        with self._condition:
+            if self._stopping or self._outstanding >= self._max_pending:
+                self.dropped += 1
+                logger.warning(f"Too many pending webhooks, dropping one for {url}")
+                return False
+            self._pending.append((url, event))
+            self._outstanding += 1
+            if self._thread is None:
+                self._start()
+            self._condition.notify()
+        return True
+
+    def _start(self) -> None:
+        self._client = httpx.Client(
+            timeout=self._timeout,
+            trust_env=False,
+            limits=httpx.Limits(
+                max_connections=self._concurrency,
+                max_keepalive_connections=self._concurrency,
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            self._concurrency, thread_name_prefix="Webhook sender"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="Webhook dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Send the queued events and stop the threads.
+
+        Batches waiting for a retry are dropped. The threads are started again
+        by the next delivery.
+
+        :param timeout: Seconds to wait for the queued events to be sent
+        """
+        with self._condition:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        with self._condition:
+            # Whatever is still queued after the timeout is dropped
+            self._pending.clear()
+            self._condition.notify()
+        self._thread.join()
+        assert self._executor is not None and self._client is not None
+        self._executor.shutdown(wait=True)
+        self._client.close()
+        with self._condition:
+            dropped = self._outstanding
+            self.dropped += dropped
+            self._retries.clear()
+            self._outstanding = 0
+            self._thread = self._executor = self._client = None
+            self._stopping = False
+        if dropped:
+            logger.warning(f"Dropped {dropped} undelivered webhooks on shutdown")
+
+    def _run(self) -> None:
+        """Dispatcher loop, handing a batch to a sender whenever one is free."""
+        assert self._executor is not None
+        while True:
+            self._senders.acquire()
+            with self._condition:
+                batch = self._next_batch()
+            if batch is None:
+                self._senders.release()
+                return
+            self._executor.submit(self._send, batch)
+
+    def _next_batch(self) -> _Batch | None:
+        """Wait for the next batch to send, with the condition held.
+
+        Batches due for a retry go first, then the oldest queued event with
+        the events queued after it for the same URL.
+
+        :return: The batch, or None once stopping with no queued event left
+        """
+        while True:
+            now = time.monotonic()
+            if self._retries and self._retries[0][0] <= now:
+                return heapq.heappop(self._retries)[2]
+            if self._pending:
+                url = self._pending[0][0]
+                batch = _Batch(url, [])
+                remaining: deque[tuple[str, dict[str, str]]] = deque()
+                for pending_url, event in self._pending:
+                    if pending_url == url and len(batch.events) < self._batch_size:
+                        batch.events.append(event)
+                    else:
+                        remaining.append((pending_url, event))
+                self._pending = remaining
+                return batch
+            if self._stopping:
+                return None
+            self._condition.wait(self._retries[0][0] - now if self._retries else None)
+
+    def _send(self, batch: _Batch) -> None:
+        """POST a batch, and schedule a retry if it failed and may succeed later.
+
+        :param batch: The batch to send
+        """
+        assert self._client is not None
+        retry = False
+        try:
+            # Connect to the address that was checked, rather than letting the
+            # host be resolved again, while still presenting the host name
+            address = self.check_url(batch.url)
+            url = httpx.URL(batch.url)
+            response = self._client.post(
+                url.copy_with(host=address),
+                json=batch.events,
+                headers={"Host": url.netloc.decode("ascii")},
+                extensions={"sni_hostname": url.host},
+            )
+            delivered = response.is_success
+            retry = response.status_code in RETRYABLE_STATUSES
+            reason = f"status {response.status_code}"
+        except InvalidCallbackURL as e:
+            delivered, reason = False, str(e)
+        except httpx.TransportError as e:
+            delivered, retry, reason = False, True, repr(e)
+        except Exception as e:
+            logger.exception(e)
+            delivered, reason = False, repr(e)
+        finally:
+            self._senders.release()
+
+        with self._condition:
+            batch.attempt += 1
+            if retry and batch.attempt < self._max_attempts and not self._stopping:
+                due = time.monotonic() + self._backoff * 2 ** (batch.attempt - 1)
+                heapq.heappush(self._retries, (due, next(self._retry_sequence), batch))
+                self._condition.notify()
+                return
+            self._outstanding -= len(batch.events)
+            if delivered:
+                self.delivered += len(batch.events)
+            else:
+                self.failed += len(batch.events)
+        if not delivered:
+            logger.warning(
+                f"Giving up on {len(batch.events)} webhooks for {batch.url} after "
+                f"{batch.attempt} attempts: {reason}"
+            )
@@ -1,16 +1,21 @@
 import logging
 import threading
-from time import sleep
-from typing import BinaryIO, Callable
+from typing import BinaryIO, Callable, TypeAlias
 
 from PIL import Image, UnidentifiedImageError
 
 from app import settings
 from app.exceptions import InvalidImage
-from app.task_queue.task_store import TaskStoreWorker
+from app.task_queue.completion import CompletionHub
+from app.task_queue.notifier import TaskNotifier
+from app.task_queue.task_store import Task, TaskMetadata, TaskStatus, TaskStoreWorker
+from app.task_queue.webhooks import WebhookDispatcher, completion_event
 
 logger = logging.getLogger(__name__)
 
+# Processes the image of a task, given the metadata probed from it on upload, if any
+TaskFunc: TypeAlias = Callable[[BinaryIO, TaskMetadata | None], Image.Image]
+
 
 class Worker(threading.Thread):
     """Worker thread for processing tasks separately from the main application.
@@ -32,12 +37,29 @@ class Worker(threading.Thread):
     """
 
     def __init__(
-        self, task_store: TaskStoreWorker, task_func: Callable[[BinaryIO], Image.Image]
+        self,
+        task_store: TaskStoreWorker,
+        task_func: TaskFunc,
+        notifier: TaskNotifier | None = None,
+        completions: CompletionHub | None = None,
+        webhooks: WebhookDispatcher | None = None,
     ) -> None:
+        """
+        :param task_store: TaskStore to take tasks from.
+        :param task_func: Callable the worker will use to process a task.
+        :param notifier: Notifier signalled by the Broker when a task is added.
+            Without one, an idle worker only polls the task store.
+        :param completions: Hub notified when the result of a task is registered.
+        :param webhooks: Dispatcher delivering the result of a task to its
+            callback URLs. Without one, callback URLs are ignored.
+        """
         super().__init__()
         self.name = f"Worker {self.name}"
         self._task_store = task_store
         self._task_func = task_func
+        self._notifier = notifier or TaskNotifier()
+        self._completions = completions
+        self._webhooks = webhooks
         self.interrupted = False
 
     def interrupt(self) -> None:
@@ -48,30 +70,39 @@ class Worker(threading.Thread):
         If you want to block until the worker has shut down, use Thread.join()
         """
         self.interrupted = True
+        self._notifier.wake()
 
-    def _get_task(self) -> tuple[str, BinaryIO] | None:
+    def _get_task(self) -> Task | None:
         """Get the next task from the task store.
 
         :return: The job id and image data of the task, or None if there are no tasks
         """
         return self._task_store.get_next_task()
 
-    def _do_task(self, job_id: str, image: BinaryIO) -> None:
+    def _do_task(
+        self, job_id: str, image: BinaryIO, metadata: TaskMetadata | None = None
+    ) -> None:
         """Process the image and register the result with the task store.
 
         If there is an Exception, it will be caught and error message
         will be sent to the task store to be returned to the user
         when they request their job status.
 
+        The image is closed once it has been processed. Once the result
+        is registered, the completion hub is notified and the result is
+        queued for delivery to the callback URLs of the job.
+
         :param job_id: Unique ID of the job being processed
         :param image: Binary image data to be converted to a thumbnail
+        :param metadata: Metadata of the image, if it was probed on upload
         """
         err: Exception | None = None
         message: str | None = None
 
         try:
-            thumbnail = self._task_func(image)
-            return self._task_store.register_task_complete(
+            with image:
+                thumbnail = self._task_func(image, metadata)
+            self._task_store.register_task_complete(
                 job_id, thumbnail, settings.thumbnail_file_type
             )
         except UnidentifiedImageError as e:
@@ -80,10 +111,31 @@ class Worker(threading.Thread):
         except Exception as e:
             err = e
             message = "There was an error converting your file to a thumbnail."
+        else:
+            self._task_finished(job_id, TaskStatus.SUCCEEDED)
+            return
 
         self._task_store.register_task_error(job_id, message)
+        self._task_finished(job_id, TaskStatus.ERROR, message)
         raise err
 
+    def _task_finished(
+        self, job_id: str, task_status: TaskStatus, error: str | None = None
+    ) -> None:
+        """Announce a task whose result was registered.
+
+        :param job_id: Unique ID of the job
+        :param task_status: Status the job finished with
+        :param error: Error message of the job, if it failed
+        """
+        if self._completions is not None:
+            self._completions.notify(job_id)
+        if self._webhooks is not None:
+            for url in self._task_store.get_task_callbacks(job_id):
+                self._webhooks.deliver(
+                    url, completion_event(job_id, task_status, error)
+                )
+
     def run(self) -> None:
         """Worker logic. This is the loop the worker runs after starting.
 
@@ -92,7 +144,10 @@ class Worker(threading.Thread):
         The worker will ask the task store for a task, do the task, then
         submit the results back to the task store. If there is an error
         during processing, it will submit an error result to the task store.
-        If there are no tasks available, it will sleep, then ask again later.
+        If there are no tasks available, it will wait until the Broker signals
+        a new task, then ask again. As a fallback, in case the signal cannot
+        reach this worker, it also asks again after a poll interval that
+        doubles, up to a maximum, every time it finds the queue empty.
         As all Exceptions are caught, this loop will run indefinitely unless
         even if encountering Exceptions.
 
@@ -100,15 +155,23 @@ class Worker(threading.Thread):
         it will do immediately after finishing the task it is processing.
         """
         logger.info(f"Worker thread {self.name} starting up")
+        poll_interval = settings.worker_min_poll_interval
 
         while not self.interrupted:
             try:
                 logger.debug("Looking for next task")
+                generation = self._notifier.generation
                 task = self._get_task()
                 if not task:
-                    logger.debug("No new tasks available. Sleeping...")
-                    sleep(1)
+                    logger.debug("No new tasks available. Waiting...")
+                    if self._notifier.wait(generation, poll_interval):
+                        poll_interval = settings.worker_min_poll_interval
+                    else:
+                        poll_interval = min(
+                            poll_interval * 2, settings.worker_max_poll_interval
+                        )
                     continue
+                poll_interval = settings.worker_min_poll_interval
                 logger.debug(f"Starting task {task[0]}")
                 self._do_task(*task)
                 logger.debug(f"Finished task {task[0]}")
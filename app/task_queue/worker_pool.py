@@ -0,0 +1,156 @@
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+from PIL import Image
+
+from app.task_queue.completion import CompletionHub
+from app.task_queue.notifier import TaskNotifier
+from app.task_queue.task_store import TaskMetadata, TaskStoreWorker
+from app.task_queue.webhooks import WebhookDispatcher
+from app.task_queue.worker import TaskFunc, Worker
+
+logger = logging.getLogger(__name__)
+
+
+def _run_task_on_file(
+    task_func: TaskFunc, path: str, metadata: TaskMetadata | None
+) -> Image.Image:
+    """Open an image file and run the task function on it, in a pool process.
+
+    :param task_func: Callable used to process the task
+    :param path: Path of the image file
+    :param metadata: Metadata of the image, if any
+    :return: The thumbnail
+    """
+    with open(path, "rb") as image:
+        return task_func(image, metadata)
+
+
+class WorkerPool:
+    """A fixed-size group of Workers taking tasks from the same TaskStore.
+
+    Every Worker is a thread. By default, each thread runs the task function
+    itself, so the decode, resize and encode work of the whole pool is
+    serialized by the GIL wherever the image library holds it. In process mode,
+    the Worker threads only move tasks in and out of the TaskStore and hand the
+    task function to a ProcessPoolExecutor of the same size, so thumbnails are
+    created on as many cores as there are Workers. Its processes are started
+    by a fork server rather than forked from this process, whose other threads
+    may hold locks at the time of the fork, which would then never be released
+    in the child.
+
+    A Worker that dies is not restarted automatically; call restart_dead_workers()
+    periodically to replace it, as the worker monitor does.
+
+    Methods:
+    -------
+    start(self) -> None: Start every Worker in the pool.
+    restart_dead_workers(self) -> int: Replace any Worker that is no longer alive.
+    interrupt(self) -> None: Request every Worker to stop working.
+    join(self) -> None: Block until every Worker has stopped.
+    """
+
+    def __init__(
+        self,
+        task_store: TaskStoreWorker,
+        task_func: TaskFunc,
+        size: int,
+        use_processes: bool = False,
+        notifier: TaskNotifier | None = None,
+        completions: CompletionHub | None = None,
+        webhooks: WebhookDispatcher | None = None,
+    ) -> None:
+        """
+        :param task_store: TaskStore the Workers take tasks from.
+        :param task_func: Callable the Workers use to process a task. In process
+            mode, it must be picklable, e.g. a module-level function.
+        :param size: Number of Workers in the pool.
+        :param use_processes: Run the task function in a pool of processes.
+        :param notifier: Notifier signalled by the Broker when a task is added.
+        :param completions: Hub notified when the result of a task is registered.
+        :param webhooks: Dispatcher delivering the result of a task to its
+            callback URLs.
+        """
+        if size < 1:
+            raise ValueError(f"Worker pool size must be at least 1, got {size}")
+        self._task_store = task_store
+        self._task_func = task_func
+        self._size = size
+        self._notifier = notifier or TaskNotifier()
+        self._completions = completions
+        self._webhooks = webhooks
+        self._executor: ProcessPoolExecutor | None = None
+        if use_processes:
+            self._executor = ProcessPoolExecutor(
+                max_workers=size, mp_context=multiprocessing.get_context("forkserver")
+            )
+        self.workers: list[Worker] = []
+
+    def _run_task(self, image: BinaryIO, metadata: TaskMetadata | None) -> Image.Image:
+        """Run the task function in the process pool and wait for its result.
+
+        An image the TaskStore handed over as a file on disk is passed to the
+        pool process by path and read there. Any other image is read into
+        memory to be sent to the pool process.
+
+        :param image: Binary image data to be converted to a thumbnail
+        :param metadata: Metadata of the image, if any
+        :return: The thumbnail
+        """
+        assert self._executor is not None
+        if isinstance(image, io.BufferedReader) and isinstance(image.name, str):
+            future = self._executor.submit(
+                _run_task_on_file, self._task_func, image.name, metadata
+            )
+        else:
+            future = self._executor.submit(
+                self._task_func, io.BytesIO(image.read()), metadata
+            )
+        return future.result()
+
+    def _create_worker(self) -> Worker:
+        task_func = self._task_func if self._executor is None else self._run_task
+        worker = Worker(
+            self._task_store,
+            task_func,
+            self._notifier,
+            self._completions,
+            self._webhooks,
+        )
+        worker.start()
+        return worker
+
+    def start(self) -> None:
+        """Start every Worker in the pool."""
+        self.workers = [self._create_worker() for _ in range(self._size)]
+
+    def restart_dead_workers(self) -> int:
+        """Replace any Worker that is no longer alive with a new one.
+
+        :return: The number of Workers that were restarted
+        """
+        restarted = 0
+        for i, worker in enumerate(self.workers):
+            if not worker.is_alive():
+                logger.warning(f"{worker.name} no longer alive, restarting")
+                self.workers[i] = self._create_worker()
+                restarted += 1
+        return restarted
+
+    def interrupt(self) -> None:
+        """Request every Worker to stop working.
+
+        Each Worker finishes the task it is processing before shutting down.
+        """
+        for worker in self.workers:
+            worker.interrupt()
+
+    def join(self) -> None:
+        """Block until every Worker has stopped, then shut down the process pool."""
+        for worker in self.workers:
+            worker.join()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
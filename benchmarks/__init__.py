@@ -0,0 +1,8 @@
+"""Benchmarks for the performance-sensitive parts of the application.
+
+Each module can be run from the repository root, e.g.:
+
+    python -m benchmarks.worker_pool
+
+or with "make benchmark name=worker_pool".
+"""
@@ -0,0 +1,132 @@
+"""Benchmark upload throughput as the number of API server processes grows.
+
+The application is served by uvicorn with 1 to N worker processes sharing one
+task store, with the task queue workers turned off so only request handling
+uses the CPU. Client processes upload a small JPEG in a loop for a fixed
+duration, and the number of uploads accepted per second is reported for
+each number of server processes. Throughput can only scale up to the number
+of cores left over by the client processes.
+
+    python -m benchmarks.api_processes --processes 1,2,4 --clients 8 --duration 10
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.srv import Routes
+
+ASSETS = Path(__file__).parent.parent.joinpath("tests", "assets")
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def start_server(processes: int, data_folder: str) -> subprocess.Popen[bytes]:
+    """Serve the application with uvicorn and wait until it is healthy.
+
+    :param processes: Number of uvicorn worker processes
+    :param data_folder: Task store folder shared by the processes
+    :return: The uvicorn process
+    """
+    env = os.environ | {
+        "WEB_CONCURRENCY": str(processes),
+        "TASK_QUEUE_DATA_FOLDER": data_folder,
+        "RUN_WORKER_IN_PROCESS": "false",
+        "UPLOAD_DEDUPLICATION": "false",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.srv:app",
+            "--port",
+            str(PORT),
+            "--workers",
+            str(processes),
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(BASE_URL + Routes.HEALTHCHECK).raise_for_status()
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("The server did not start")
+
+
+def upload_loop(image: bytes, duration: float) -> list[float]:
+    """Upload an image in a loop for a fixed duration.
+
+    :param image: The image to upload
+    :param duration: Seconds to upload for
+    :return: Latency in seconds of each accepted upload
+    """
+    latencies = []
+    files = {"file": ("image.jpg", image, "image/jpeg")}
+    with httpx.Client(base_url=BASE_URL) as client:
+        end = time.time() + duration
+        while time.time() < end:
+            start = time.perf_counter()
+            response = client.post(Routes.UPLOAD_IMAGE, files=files)
+            if response.status_code == 202:
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(processes: int, image: bytes, clients: int, duration: float) -> list[float]:
+    """Serve the application and upload to it from several client processes.
+
+    :param processes: Number of uvicorn worker processes
+    :param image: The image to upload
+    :param clients: Number of client processes
+    :param duration: Seconds to upload for
+    :return: Latency in seconds of each accepted upload
+    """
+    with tempfile.TemporaryDirectory() as data_folder:
+        server = start_server(processes, data_folder)
+        try:
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.starmap(upload_loop, [(image, duration)] * clients)
+        finally:
+            server.terminate()
+            server.wait()
+    return [latency for latencies in results for latency in latencies]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    image = ASSETS.joinpath("日本電波塔.jpg").read_bytes()
+    print(f"{args.clients} clients for {args.duration:.0f}s, {os.cpu_count()} cores")
+    print(f"{'processes':>9} {'uploads/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for processes in [int(n) for n in args.processes.split(",")]:
+        latencies = sorted(run(processes, image, args.clients, args.duration))
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(
+            f"{processes:>9} {len(latencies) / args.duration:>10.1f}"
+            f" {statistics.median(latencies) * 1000:>8.1f} {p99 * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
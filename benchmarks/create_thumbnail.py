@@ -0,0 +1,64 @@
+"""Benchmark create_thumbnail over the test assets at each thumbnail quality setting.
+
+For every asset and quality setting, reports the mean time to create a thumbnail
+and how far the result strays from the "best" quality thumbnail, as the mean
+absolute difference of its pixel values (0-255).
+
+    python -m benchmarks.create_thumbnail --repeat 20
+"""
+
+import argparse
+import io
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageStat
+
+from app import settings
+from app.domain.create_thumbnail import QUALITY_PRESETS, create_thumbnail
+
+ASSETS = Path(__file__).parent.parent.joinpath("tests", "assets")
+IMAGES = {
+    "square": "日本電波塔.jpg",
+    "wide": "日本電波塔より横.jpg",
+    "tall": "日本電波塔より縦.jpg",
+    "png": "日本電波塔.png",
+    "webp": "日本電波塔.webp",
+}
+
+
+def time_thumbnail(data: bytes, repeat: int) -> tuple[float, Image.Image]:
+    """Create a thumbnail repeatedly.
+
+    :param data: Image file data
+    :param repeat: Number of thumbnails to create
+    :return: Mean milliseconds per thumbnail, and the thumbnail
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        thumbnail = create_thumbnail(io.BytesIO(data))
+    return (time.perf_counter() - start) / repeat * 1000, thumbnail
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'image':>7} {'size':>10} {'quality':>9} {'ms':>8} {'diff':>6}")
+    for name, filename in IMAGES.items():
+        data = ASSETS.joinpath(filename).read_bytes()
+        size = "x".join(map(str, Image.open(io.BytesIO(data)).size))
+        results = {}
+        for quality in QUALITY_PRESETS:
+            settings.thumbnail_quality = quality  # type: ignore[assignment]
+            results[quality] = time_thumbnail(data, args.repeat)
+        reference = results["best"][1]
+        for quality, (ms, thumbnail) in results.items():
+            diff = ImageChops.difference(thumbnail, reference)
+            mean_diff = sum(ImageStat.Stat(diff).mean) / len(diff.getbands())
+            print(f"{name:>7} {size:>10} {quality:>9} {ms:>8.2f} {mean_diff:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
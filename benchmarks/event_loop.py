@@ -0,0 +1,111 @@
+"""Benchmark event loop responsiveness under concurrent large uploads.
+
+Batches of ~4.5MB PNG uploads are sent to the application in-process while a
+health check is requested every millisecond. The health check latency is
+reported with the blocking upload work run on the request executor, and with
+it run directly on the event loop for comparison.
+
+    python -m benchmarks.event_loop --uploads 64 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable
+
+import httpx
+from PIL import Image
+
+import app.task_queue
+from app.srv import Routes
+from app.srv import app as fastapi_app
+from app.srv.executor import request_executor
+from app.task_queue.task_store import FileSystemTaskStore
+
+
+def create_image() -> bytes:
+    """Create a PNG of random noise just under the maximum upload size.
+
+    :return: The encoded image
+    """
+    image = Image.frombytes("RGB", (1220, 1220), os.urandom(1220 * 1220 * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def run_inline(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Stand-in for RequestExecutor.run that blocks the event loop."""
+    return func(*args, **kwargs)
+
+
+async def measure(image: bytes, uploads: int, concurrency: int) -> list[float]:
+    """Upload images while probing the health check.
+
+    :param image: The image to upload
+    :param uploads: Total number of uploads
+    :param concurrency: Number of uploads in flight at once
+    :return: Health check latencies in milliseconds
+    """
+    transport = httpx.ASGITransport(app=fastapi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def probe() -> None:
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get(Routes.HEALTHCHECK)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.001)
+
+        async def upload() -> None:
+            files = {"file": ("noise.png", image, "image/png")}
+            response = await client.post(Routes.UPLOAD_IMAGE, files=files)
+            response.raise_for_status()
+
+        prober = asyncio.create_task(probe())
+        for _ in range(uploads // concurrency):
+            await asyncio.gather(*(upload() for _ in range(concurrency)))
+        done.set()
+        await prober
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{name:>9} {len(latencies):>7} {statistics.median(latencies):>8.2f}"
+        f" {p99:>8.2f} {latencies[-1]:>8.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    image = create_image()
+    print(f"{args.uploads} uploads of {len(image) / 1024 / 1024:.1f}MB")
+    print(f"{'mode':>9} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    with tempfile.TemporaryDirectory() as data_folder:
+        app.task_queue._task_store = FileSystemTaskStore(data_folder)
+        latencies = asyncio.run(measure(image, args.uploads, args.concurrency))
+        report("executor", latencies)
+
+        request_executor.run = run_inline  # type: ignore[method-assign]
+        latencies = asyncio.run(measure(image, args.uploads, args.concurrency))
+        report("inline", latencies)
+
+
+if __name__ == "__main__":
+    main()
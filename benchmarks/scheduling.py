@@ -0,0 +1,128 @@
+"""Benchmark task completion latency under a mixed workload for each scheduling policy.
+
+A stream of small JPEGs, with a large PNG every few tasks, is added to a fresh
+filesystem task store at a steady rate while a single Worker drains it. The
+mean and 95th percentile of the time from upload to completed thumbnail are
+reported for the small and large images under each scheduling policy.
+"unordered" is the order in which the filesystem lists the tasks.
+
+    python -m benchmarks.scheduling --tasks 120 --large-every 10 --interval 0.02
+"""
+
+import argparse
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.domain import create_thumbnail
+from app.task_queue import TaskMetadata, Worker
+from app.task_queue.scheduling import SchedulingPolicy
+from app.task_queue.task_store import FileSystemTaskStore
+
+ASSETS = Path(__file__).parent.parent.joinpath("tests", "assets")
+POLICIES: list[SchedulingPolicy] = ["unordered", "fifo", "size"]
+
+
+def create_large_image() -> bytes:
+    """Create a 24 megapixel PNG, which has to be fully decoded.
+
+    :return: The encoded image
+    """
+    image = Image.linear_gradient("L").resize((6000, 4000)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def probe(data: bytes) -> TaskMetadata:
+    """Get the metadata of an image, as uploading it would.
+
+    :param data: The encoded image
+    :return: The metadata of the image
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        return TaskMetadata(image.format or "", image.width, image.height, image.mode)
+
+
+def percentile_95(latencies: list[float]) -> float:
+    return statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else 0.0
+
+
+def run(
+    policy: SchedulingPolicy,
+    small: bytes,
+    large: bytes,
+    tasks: int,
+    large_every: int,
+    interval: float,
+) -> dict[str, list[float]]:
+    """Add a stream of tasks to a task store while a Worker drains it.
+
+    :param policy: Scheduling policy of the task store
+    :param small: Small image data
+    :param large: Large image data
+    :param tasks: Number of tasks to add
+    :param large_every: Add the large image as every nth task
+    :param interval: Seconds between two added tasks
+    :return: Completion latencies in seconds of the small and large images
+    """
+    metadata = {small: probe(small), large: probe(large)}
+    with tempfile.TemporaryDirectory() as data_folder:
+        store = FileSystemTaskStore(data_folder, scheduling=policy)
+        added: dict[str, tuple[str, float]] = {}
+        worker = Worker(store, create_thumbnail)
+        worker.start()
+        for i in range(tasks):
+            size, data = ("large", large) if i % large_every == 0 else ("small", small)
+            job_id = store.add_task_to_queue(
+                io.BytesIO(data), metadata=metadata[data]
+            ).job_id
+            added[job_id] = (size, time.time())
+            time.sleep(interval)
+        while store.get_task_summary().oldest_pending_at is not None:
+            time.sleep(0.01)
+        worker.interrupt()
+        worker.join()
+
+        latencies: dict[str, list[float]] = {"small": [], "large": []}
+        for job_id, (size, added_at) in added.items():
+            finished_at = store.get_result_info(job_id).last_modified
+            latencies[size].append(finished_at - added_at)
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=120)
+    parser.add_argument("--large-every", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    small = ASSETS.joinpath("日本電波塔.jpg").read_bytes()
+    large = create_large_image()
+    print(f"{args.tasks} tasks, 1 large every {args.large_every}, ", end="")
+    print(f"one every {args.interval * 1000:.0f}ms, latency in seconds")
+    print(
+        f"{'policy':>9} {'small mean':>11} {'small p95':>10} "
+        f"{'large mean':>11} {'large p95':>10} {'all mean':>9}"
+    )
+    for policy in POLICIES:
+        latencies = run(
+            policy, small, large, args.tasks, args.large_every, args.interval
+        )
+        every = latencies["small"] + latencies["large"]
+        print(
+            f"{policy:>9} {statistics.mean(latencies['small']):>11.2f} "
+            f"{percentile_95(latencies['small']):>10.2f} "
+            f"{statistics.mean(latencies['large']):>11.2f} "
+            f"{percentile_95(latencies['large']):>10.2f} "
+            f"{statistics.mean(every):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark thumbnail throughput of the worker pool from 1 to N workers.
+
+A fresh filesystem task store is filled with copies of the test asset images,
+then a WorkerPool of each size drains it. Throughput should grow with the pool
+size in process mode up to the number of available cores, while thread mode
+is limited by the GIL.
+
+    python -m benchmarks.worker_pool --max-workers 4 --tasks 40
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app.domain import create_thumbnail
+from app.task_queue import TaskStatus, WorkerPool
+from app.task_queue.task_store import FileSystemTaskStore
+
+ASSETS = Path(__file__).parent.parent.joinpath("tests", "assets")
+IMAGES = ["日本電波塔.jpg", "日本電波塔より縦.jpg", "日本電波塔.png", "日本電波塔.webp"]
+
+
+def run(pool_size: int, use_processes: bool, images: list[bytes], tasks: int) -> float:
+    """Drain a task store with a worker pool.
+
+    :param pool_size: Number of workers in the pool
+    :param use_processes: Create thumbnails in a process pool
+    :param images: Image data to create tasks from, round-robin
+    :param tasks: Number of tasks to create
+    :return: Thumbnails created per second
+    """
+    with tempfile.TemporaryDirectory() as data_folder:
+        store = FileSystemTaskStore(data_folder)
+        for i in range(tasks):
+            store.add_task_to_queue(io.BytesIO(images[i % len(images)]))
+
+        pool = WorkerPool(store, create_thumbnail, pool_size, use_processes)
+        start = time.perf_counter()
+        pool.start()
+        while True:
+            results = store.get_all_task_status()
+            finished = len(list(results[TaskStatus.SUCCEEDED]))
+            finished += len(list(results[TaskStatus.ERROR]))
+            if finished == tasks:
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        pool.interrupt()
+        pool.join()
+    return tasks / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tasks", type=int, default=40)
+    args = parser.parse_args()
+
+    images = [ASSETS.joinpath(name).read_bytes() for name in IMAGES]
+    print(f"{args.tasks} tasks, {os.cpu_count()} cores")
+    print(f"{'workers':>7} {'threads/s':>10} {'processes/s':>12}")
+    for pool_size in range(1, args.max_workers + 1):
+        threads = run(pool_size, False, images, args.tasks)
+        processes = run(pool_size, True, images, args.tasks)
+        print(f"{pool_size:>7} {threads:>10.1f} {processes:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
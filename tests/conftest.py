@@ -3,12 +3,15 @@
 See https://docs.pytest.org/en/stable/reference/fixtures.html
 """
 
+import importlib
 import io
+import pkgutil
+import socket
 import subprocess
 import threading
 from enum import StrEnum
 from pathlib import Path
-from typing import BinaryIO
+from typing import Any, BinaryIO, Callable
 
 import docker
 import pytest
@@ -17,6 +20,7 @@ from docker.errors import NotFound
 from docker.models.containers import Container
 
 from app import settings
+from app.task_queue import Broker
 from tests.specifications.adapters.http_client_driver import HTTPClientDriver
 
 _ASSETS_PATH: str
@@ -159,6 +163,52 @@ def job_id_invalid() -> str:
     return JobID.INVALID
 
 
+@pytest.fixture
+def use_broker(monkeypatch: pytest.MonkeyPatch) -> Callable[[Broker], None]:
+    """Make the domain interactions use a given Broker, for the test only.
+
+    :return: A function patching get_broker in every interaction module
+    to return the Broker it is given.
+    """
+
+    def use(broker: Broker) -> None:
+        # Imported here rather than at the top, so that the interactions are not
+        # imported before tests/domain/interactions/conftest.py patches get_broker
+        interactions = importlib.import_module("app.domain.interactions")
+        for module_info in pkgutil.iter_modules(interactions.__path__):
+            # The package exports functions of the same names as the modules
+            module = importlib.import_module(
+                f"{interactions.__name__}.{module_info.name}"
+            )
+            if hasattr(module, "get_broker"):
+                monkeypatch.setattr(module, "get_broker", lambda: broker)
+
+    return use
+
+
+@pytest.fixture
+def fake_dns(monkeypatch: pytest.MonkeyPatch) -> dict[str, list[str]]:
+    """Resolve host names to given addresses, for the test only.
+
+    :return: A dict of host names to the addresses they resolve to, to be filled
+        by the test. Other names are resolved as usual.
+    """
+    records: dict[str, list[str]] = {}
+    getaddrinfo = socket.getaddrinfo
+
+    def fake_getaddrinfo(host: Any, port: Any, *args: Any, **kwargs: Any) -> Any:
+        if host not in records:
+            return getaddrinfo(host, port, *args, **kwargs)
+        return [
+            info
+            for address in records[host]
+            for info in getaddrinfo(address, port, *args, **kwargs)
+        ]
+
+    monkeypatch.setattr(socket, "getaddrinfo", fake_getaddrinfo)
+    return records
+
+
 @pytest.fixture(scope="session")
 def app_docker_container(request: FixtureRequest) -> Container:
     """Return a running docker container hosting this application
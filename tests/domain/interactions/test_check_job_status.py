@@ -1,8 +1,22 @@
 """Assert expected behavior when requesting a job's status"""
 
+import io
+import json
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
 import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
 
+from app import settings
+from app.domain import create_thumbnail
 from app.exceptions import JobNotFound
+from app.srv import Routes, app, handlers
+from app.task_queue import Broker, TaskStatus, Worker, completion_hub
+from app.task_queue.task_store import FileSystemTaskStore
 from tests.specifications.adapters.adapters import CheckJobStatusAdapter
 from tests.specifications.adapters.http_test_driver import HTTPTestDriver
 from tests.specifications.check_job_status import (
@@ -56,3 +70,173 @@ class TestCheckJobStatusHTTP:
     def test_check_job_status_not_found(self, job_id_not_found: str) -> None:
         with pytest.raises(JobNotFound):
             check_job_status_complete_specification(HTTPTestDriver(), job_id_not_found)
+
+    def test_check_job_status_source_image(self, job_id_incomplete: str) -> None:
+        """The format and dimensions of the uploaded image are reported if known."""
+        response = TestClient(app).get(
+            Routes.CHECK_JOB_STATUS.format(job_id=job_id_incomplete)
+        )
+        assert response.json() == {
+            "status": "Processing",
+            "source_format": "JPEG",
+            "source_width": 640,
+            "source_height": 480,
+        }
+
+
+class TestCheckJobStatusWait:
+    """Wait for jobs to finish instead of polling their status."""
+
+    @pytest.fixture
+    def store(
+        self, tmp_path: Path, use_broker: Callable[[Broker], None]
+    ) -> FileSystemTaskStore:
+        store = FileSystemTaskStore(str(tmp_path))
+        use_broker(Broker(store))
+        return store
+
+    @pytest.fixture
+    def delayed_worker(self, store: FileSystemTaskStore) -> Iterator[Worker]:
+        """A Worker notifying the completion hub, started after a short delay."""
+        worker = Worker(store, create_thumbnail, completions=completion_hub)
+        timer = threading.Timer(0.2, worker.start)
+        timer.start()
+        yield worker
+        timer.join()
+        worker.interrupt()
+        worker.join()
+
+    @pytest.fixture
+    def delayed_silent_worker(self, store: FileSystemTaskStore) -> Iterator[Worker]:
+        """A Worker not notifying the completion hub, as if in another process."""
+        worker = Worker(store, create_thumbnail)
+        timer = threading.Timer(0.2, worker.start)
+        timer.start()
+        yield worker
+        timer.join()
+        worker.interrupt()
+        worker.join()
+
+    def test_check_job_status_wait(
+        self,
+        store: FileSystemTaskStore,
+        delayed_worker: Worker,
+        square_image: BinaryIO,
+    ) -> None:
+        """The response is sent as soon as the job finishes."""
+        job_id = store.add_task_to_queue(square_image).job_id
+        start = time.monotonic()
+        response = TestClient(app).get(
+            Routes.CHECK_JOB_STATUS.format(job_id=job_id),
+            params={"wait": 5},
+            follow_redirects=False,
+        )
+        assert time.monotonic() - start < 5
+        assert response.status_code == status.HTTP_303_SEE_OTHER
+        assert response.headers["Location"].endswith(job_id)
+
+    @pytest.mark.parametrize(
+        "setting, value",
+        [
+            # Standalone workers
+            ("run_worker_in_process", False),
+            # Several API processes
+            ("web_concurrency", 2),
+            # A task store shared with other pods
+            ("task_queue_status_index", False),
+        ],
+    )
+    def test_check_job_status_wait_other_process(
+        self,
+        setting: str,
+        value: object,
+        store: FileSystemTaskStore,
+        delayed_silent_worker: Worker,
+        square_image: BinaryIO,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Jobs completed without notifying this process are noticed by polling."""
+        monkeypatch.setattr(settings, setting, value)
+        job_id = store.add_task_to_queue(square_image).job_id
+        start = time.monotonic()
+        response = TestClient(app).get(
+            Routes.CHECK_JOB_STATUS.format(job_id=job_id),
+            params={"wait": 5},
+            follow_redirects=False,
+        )
+        assert time.monotonic() - start < 5
+        assert response.status_code == status.HTTP_303_SEE_OTHER
+
+    def test_check_job_status_wait_recheck(
+        self,
+        store: FileSystemTaskStore,
+        delayed_silent_worker: Worker,
+        square_image: BinaryIO,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """
+        Jobs completed without notifying this process are noticed even when
+        notifications are expected, by checking their status again.
+        """
+        monkeypatch.setattr(handlers, "JOB_RECHECK_INTERVAL", 0.2)
+        job_id = store.add_task_to_queue(square_image).job_id
+        start = time.monotonic()
+        response = TestClient(app).get(
+            Routes.CHECK_JOB_STATUS.format(job_id=job_id),
+            params={"wait": 5},
+            follow_redirects=False,
+        )
+        assert time.monotonic() - start < 5
+        assert response.status_code == status.HTTP_303_SEE_OTHER
+
+    def test_check_job_status_wait_timeout(
+        self, store: FileSystemTaskStore, square_image: BinaryIO
+    ) -> None:
+        """The job is reported as processing if it does not finish in time."""
+        job_id = store.add_task_to_queue(square_image).job_id
+        start = time.monotonic()
+        response = TestClient(app).get(
+            Routes.CHECK_JOB_STATUS.format(job_id=job_id), params={"wait": 0.2}
+        )
+        assert time.monotonic() - start >= 0.2
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["status"] == TaskStatus.PROCESSING
+
+    def test_job_events(
+        self,
+        store: FileSystemTaskStore,
+        delayed_worker: Worker,
+        square_image: BinaryIO,
+    ) -> None:
+        """The status of every job is streamed until they have all finished."""
+        succeeded = store.add_task_to_queue(square_image).job_id
+        failed = store.add_task_to_queue(io.BytesIO(b"not an image")).job_id
+        response = TestClient(app).get(
+            Routes.JOB_EVENTS, params={"job_id": [succeeded, failed]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event, data = block.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data[6:])))
+        assert events[:2] == [
+            ("status", {"job_id": succeeded, "status": "Processing"}),
+            ("status", {"job_id": failed, "status": "Processing"}),
+        ]
+        finished = {data["job_id"]: data for _, data in events[2:4]}
+        assert finished[succeeded]["status"] == TaskStatus.SUCCEEDED
+        assert finished[succeeded]["resource_url"].endswith(succeeded)
+        assert finished[failed]["status"] == TaskStatus.ERROR
+        assert finished[failed]["error"]
+        assert events[4:] == [("end", {})]
+
+    def test_job_events_not_found(
+        self, store: FileSystemTaskStore, job_id_not_found: str
+    ) -> None:
+        """Unknown jobs are rejected before the stream starts."""
+        response = TestClient(app).get(
+            Routes.JOB_EVENTS, params={"job_id": job_id_not_found}
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,8 +1,22 @@
 """Assert behavior of downloading a thumbnail."""
 
+import os
+from pathlib import Path
+from typing import Any, Callable
+
 import pytest
+from fastapi import status
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+from PIL import Image
 
+from app.domain.create_thumbnail import create_thumbnail
 from app.exceptions import JobNotFound
+from app.srv import Routes, app, handlers
+from app.task_queue import Broker
+from app.task_queue.result_cache import ResultCache
+from app.task_queue.task_store import FileSystemTaskStore
+from tests.conftest import ImageType
 from tests.specifications.adapters.adapters import ThumbnailDownloaderAdapter
 from tests.specifications.adapters.http_test_driver import HTTPTestDriver
 from tests.specifications.download_thumbnail import download_thumbnail_specification
@@ -30,3 +44,103 @@ class TestDownloadThumbnailHTTP:
     def test_download_thumbnail_not_found(self, job_id_incomplete: str) -> None:
         with pytest.raises(JobNotFound):
             download_thumbnail_specification(HTTPTestDriver(), job_id_incomplete)
+
+    def test_download_thumbnail_from_file(
+        self, tmp_path: Path, use_broker: Callable[[Broker], None]
+    ) -> None:
+        """Thumbnails kept in files by the task store are sent from disk."""
+        store = FileSystemTaskStore(str(tmp_path))
+        job_id = store.add_task_to_queue(ImageType.SQUARE.get_image()).job_id
+        task = store.get_next_task()
+        assert task is not None
+        store.register_task_complete(job_id, create_thumbnail(task[1]), "JPEG")
+        use_broker(Broker(store))
+
+        download_thumbnail_specification(HTTPTestDriver(), job_id)
+
+    def test_download_cached_thumbnail(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        use_broker: Callable[[Broker], None],
+    ) -> None:
+        """
+        Cached thumbnails are sent from memory, and only thumbnails missing
+        from the cache are sent from their file.
+        """
+        cache = ResultCache(max_bytes=4 * 1024 * 1024)
+        store = FileSystemTaskStore(str(tmp_path), result_cache=cache)
+        job_id = store.add_task_to_queue(ImageType.SQUARE.get_image()).job_id
+        assert store.get_next_task() is not None
+        # Noise does not compress, making a result of a few megabytes
+        noise = Image.frombytes("RGB", (1024, 1024), os.urandom(1024 * 1024 * 3))
+        store.register_task_complete(job_id, noise, "PNG")
+        assert job_id in cache
+        thumbnail = store.get_result(job_id).read()
+        file_responses: list[FileResponse] = []
+
+        class SpyFileResponse(FileResponse):
+            def __init__(self, *args: Any, **kwargs: Any) -> None:
+                super().__init__(*args, **kwargs)
+                file_responses.append(self)
+
+        monkeypatch.setattr(handlers, "FileResponse", SpyFileResponse)
+        client = TestClient(app)
+        url = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id)
+        headers: dict[int, dict[str, str]] = {}
+        for result_cache, from_file in [(cache, 0), (ResultCache(max_bytes=0), 1)]:
+            use_broker(Broker(store, result_cache=result_cache))
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.content == thumbnail
+            assert len(file_responses) == from_file
+            head = client.head(url)
+            assert head.headers["Content-Length"] == str(len(thumbnail))
+            assert head.content == b""
+            headers[from_file] = {
+                name: response.headers[name]
+                for name in ["ETag", "Last-Modified", "Cache-Control"]
+            }
+        assert headers[0] == headers[1]
+        assert cache.hits == 2
+
+
+class TestDownloadThumbnailCaching:
+    """
+    Assert thumbnails are sent with validators and cache headers,
+    and that conditional requests are answered without a body.
+    """
+
+    def test_cache_headers(self, job_id_complete: str) -> None:
+        client = TestClient(app)
+        url = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id_complete)
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"].startswith('"')
+        assert "Last-Modified" in response.headers
+        assert "immutable" in response.headers["Cache-Control"]
+
+        revalidated = client.get(
+            url, headers={"If-None-Match": response.headers["ETag"]}
+        )
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+        assert revalidated.headers["ETag"] == response.headers["ETag"]
+        assert revalidated.content == b""
+
+        changed = client.get(url, headers={"If-None-Match": '"other"'})
+        assert changed.status_code == status.HTTP_200_OK
+
+    def test_head(self, job_id_complete: str) -> None:
+        client = TestClient(app)
+        url = Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id_complete)
+        thumbnail = client.get(url).content
+        response = client.head(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["Content-Length"] == str(len(thumbnail))
+        assert response.content == b""
+
+    def test_head_not_found(self, job_id_incomplete: str) -> None:
+        response = TestClient(app).head(
+            Routes.DOWNLOAD_THUMBNAIL.format(job_id=job_id_incomplete)
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,5 +1,12 @@
 """Assert interaction to get all job ids"""
 
+import json
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.srv import AllJobsModel, Routes, app
+from tests.conftest import JobID
 from tests.specifications.adapters.adapters import GetAllJobIdsAdapter
 from tests.specifications.adapters.http_test_driver import HTTPTestDriver
 from tests.specifications.get_all_job_ids import get_all_job_ids_specification
@@ -23,3 +30,46 @@ class TestGetAllJobIdsHTTP:
 
     def test_get_all_job_ids_http(self) -> None:
         get_all_job_ids_specification(HTTPTestDriver())
+
+
+class TestListJobsHTTP:
+    """
+    Assert job ids are paginated with a cursor, can be filtered
+    by status and can be streamed as NDJSON.
+    """
+
+    def test_pagination(self) -> None:
+        client = TestClient(app)
+        job_ids: list[str] = []
+        cursor = None
+        for _ in range(3):
+            params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+            response = client.get(Routes.JOBS, params=params)
+            assert response.status_code == status.HTTP_200_OK
+            page = AllJobsModel.model_validate(response.json())
+            job_ids.extend(page.job_ids)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert job_ids == sorted([JobID.COMPLETE, JobID.INCOMPLETE, JobID.ERROR])
+
+    def test_status_filter(self) -> None:
+        response = TestClient(app).get(Routes.JOBS, params={"status": "Error"})
+        assert AllJobsModel.model_validate(response.json()).job_ids == [JobID.ERROR]
+
+    def test_invalid_cursor(self) -> None:
+        response = TestClient(app).get(Routes.JOBS, params={"cursor": "%%%"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_ndjson(self) -> None:
+        response = TestClient(app).get(
+            Routes.JOBS, headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        jobs = [json.loads(line) for line in response.text.splitlines()]
+        assert {job["job_id"]: job["status"] for job in jobs} == {
+            JobID.COMPLETE: "Succeeded",
+            JobID.INCOMPLETE: "Processing",
+            JobID.ERROR: "Error",
+        }
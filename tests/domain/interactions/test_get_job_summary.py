@@ -0,0 +1,36 @@
+"""Assert interaction to get the job summary"""
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.domain import get_job_summary
+from app.srv import JobSummaryModel, Routes, app
+from app.task_queue import TaskPriority, TaskStatus
+
+
+class TestGetJobSummary:
+    """
+    Get the job summary directly without any interface. Unit tests.
+    """
+
+    def test_get_job_summary(self) -> None:
+        summary = get_job_summary()
+        assert summary.counts[TaskStatus.PROCESSING] == 1
+        assert summary.oldest_pending_at is not None
+
+
+class TestGetJobSummaryHTTP:
+    """
+    Get the job summary via an HTTP interface.
+    """
+
+    def test_get_job_summary_http(self) -> None:
+        response = TestClient(app).get(Routes.JOBS_SUMMARY)
+        assert response.status_code == status.HTTP_200_OK
+        summary = JobSummaryModel.model_validate(response.json())
+        assert (summary.processing, summary.succeeded, summary.error) == (1, 1, 1)
+        assert summary.oldest_pending_age is not None
+        assert summary.processing_by_priority == {
+            TaskPriority.INTERACTIVE: 1,
+            TaskPriority.BATCH: 0,
+        }
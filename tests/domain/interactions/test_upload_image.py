@@ -1,10 +1,32 @@
 """Assert behavior for uploading an image"""
 
-from typing import BinaryIO
+import importlib
+import io
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Callable
 
 import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
 
+from app import settings
+from app.domain import create_thumbnail, upload_image
+from app.domain.admission import AdmissionControl
 from app.exceptions import InvalidImage
+from app.srv import Routes, app
+from app.task_queue import (
+    Broker,
+    TaskMetadata,
+    TaskPriority,
+    TaskStatus,
+    WebhookDispatcher,
+    Worker,
+    completion_hub,
+)
+from app.task_queue.task_store import FileSystemTaskStore
 from tests.exceptions import ImageTooLarge
 from tests.specifications.adapters.adapters import UploadImageAdapter
 from tests.specifications.adapters.http_test_driver import HTTPTestDriver
@@ -14,6 +36,17 @@ from tests.specifications.upload_image import (
 )
 
 
+def huge_dimensions_png() -> bytes:
+    """A PNG file of a few bytes whose header declares 100000x100000 pixels."""
+    header = b"IHDR" + struct.pack(">IIBBBBB", 100_000, 100_000, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(header) - 4)
+        + header
+        + struct.pack(">I", zlib.crc32(header))
+    )
+
+
 class TestUploadImage:
     """
     Drive the specification for "uploading" a file directly
@@ -27,6 +60,51 @@ class TestUploadImage:
         with pytest.raises(InvalidImage):
             upload_invalid_image_specification(UploadImageAdapter())
 
+    def test_upload_truncated_image(
+        self, png_image: BinaryIO, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """
+        An image that is corrupt past its header is accepted with header
+        validation, leaving the worker to reject it, and rejected with strict
+        validation.
+        """
+        data = png_image.read()
+        truncated_image = io.BytesIO(data[: len(data) // 2])
+        monkeypatch.setattr(settings, "upload_validation", "header")
+        assert upload_image(truncated_image)
+        assert truncated_image.tell() == 0
+
+        monkeypatch.setattr(settings, "upload_validation", "strict")
+        truncated_image.seek(0)
+        with pytest.raises(InvalidImage):
+            upload_image(truncated_image)
+
+    @pytest.mark.parametrize("upload_validation", ["header", "strict"])
+    def test_upload_huge_dimensions_image(
+        self, upload_validation: str, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """A tiny file whose header declares a huge image is rejected on upload."""
+        huge_image = io.BytesIO(huge_dimensions_png())
+        monkeypatch.setattr(settings, "upload_validation", upload_validation)
+        with pytest.raises(InvalidImage):
+            upload_image(huge_image)
+
+    def test_upload_image_metadata(
+        self,
+        wide_image: BinaryIO,
+        tmp_path: Path,
+        use_broker: Callable[[Broker], None],
+    ) -> None:
+        """The format and dimensions parsed from the header are kept with the task."""
+        store = FileSystemTaskStore(str(tmp_path))
+        use_broker(Broker(store))
+
+        job_id = upload_image(wide_image)
+        metadata = store.get_task_metadata(job_id)
+        assert isinstance(metadata, TaskMetadata)
+        assert metadata.format == "JPEG"
+        assert metadata.width > metadata.height
+
 
 class TestUploadImageHTTP:
     """
@@ -41,6 +119,141 @@ class TestUploadImageHTTP:
         with pytest.raises(InvalidImage):
             upload_invalid_image_specification(HTTPTestDriver())
 
+    def test_upload_huge_dimensions_image_http(self) -> None:
+        """An image declaring too many pixels to decode is an unsupported type."""
+        response = TestClient(app).post(
+            Routes.UPLOAD_IMAGE,
+            files={"file": ("huge.png", huge_dimensions_png(), "image/png")},
+        )
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
     def test_upload_too_large_image_http(self, size_too_large_image: BinaryIO) -> None:
         with pytest.raises(ImageTooLarge):
             HTTPTestDriver().upload(size_too_large_image)
+
+    def test_upload_image_priority_http(
+        self,
+        square_image: BinaryIO,
+        tmp_path: Path,
+        use_broker: Callable[[Broker], None],
+    ) -> None:
+        """The priority query parameter selects the lane the task waits in."""
+        store = FileSystemTaskStore(str(tmp_path))
+        use_broker(Broker(store))
+        client = TestClient(app)
+
+        response = client.post(
+            Routes.UPLOAD_IMAGE,
+            params={"priority": "batch"},
+            files={"file": square_image},
+        )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert store.get_task_summary().pending_by_priority[TaskPriority.BATCH] == 1
+
+        response = client.post(
+            Routes.UPLOAD_IMAGE,
+            params={"priority": "urgent"},
+            files={"file": square_image},
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_upload_image_callback_url_http(
+        self,
+        square_image: BinaryIO,
+        tmp_path: Path,
+        use_broker: Callable[[Broker], None],
+        fake_dns: dict[str, list[str]],
+    ) -> None:
+        """
+        The callback_url query parameter is kept with the job, unless it points
+        at a host that is not allowed or at an address that is not public.
+        """
+        store = FileSystemTaskStore(str(tmp_path))
+        webhooks = WebhookDispatcher(allowed_hosts=["example.com", "*.example.net"])
+        use_broker(Broker(store, webhooks=webhooks))
+        fake_dns["example.com"] = ["93.184.215.14"]
+        fake_dns["internal.example.net"] = ["10.0.0.1"]
+        client = TestClient(app)
+
+        response = client.post(
+            Routes.UPLOAD_IMAGE,
+            params={"callback_url": "https://example.com/thumbnails?id=1"},
+            files={"file": square_image},
+        )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert store.get_task_callbacks(response.json()["job_id"]) == [
+            "https://example.com/thumbnails?id=1"
+        ]
+
+        for callback_url in [
+            "ftp://example.com/",
+            "https://example.org/",
+            "https://internal.example.net/",
+            "http://127.0.0.1/",
+        ]:
+            response = client.post(
+                Routes.UPLOAD_IMAGE,
+                params={"callback_url": callback_url},
+                files={"file": square_image},
+            )
+            assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_upload_image_queue_full_http(
+        self, square_image: BinaryIO, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Uploads are rejected with a Retry-After header while the queue is full."""
+        module = importlib.import_module("app.domain.interactions.upload_image")
+        monkeypatch.setattr(module, "admission_control", AdmissionControl(1))
+
+        response = TestClient(app).post(
+            Routes.UPLOAD_IMAGE, files={"file": square_image}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == str(AdmissionControl.max_retry_after)
+
+
+class TestUploadImageWait:
+    """Wait for the thumbnail in the response to the upload."""
+
+    @pytest.fixture
+    def store(
+        self, tmp_path: Path, use_broker: Callable[[Broker], None]
+    ) -> FileSystemTaskStore:
+        store = FileSystemTaskStore(str(tmp_path))
+        use_broker(Broker(store))
+        return store
+
+    def test_upload_image_wait(
+        self, store: FileSystemTaskStore, square_image: BinaryIO
+    ) -> None:
+        """The thumbnail is returned if it is created in time."""
+        worker = Worker(store, create_thumbnail, completions=completion_hub)
+        worker.start()
+        try:
+            response = TestClient(app).post(
+                Routes.UPLOAD_IMAGE, params={"wait": 5}, files={"file": square_image}
+            )
+        finally:
+            worker.interrupt()
+            worker.join()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["etag"]
+        job_id = response.headers["content-location"].rsplit("/", 1)[-1]
+        assert store.get_task_status(job_id) == TaskStatus.SUCCEEDED
+        assert response.content == store.get_result(job_id).read()
+
+    def test_upload_image_wait_timeout(
+        self, store: FileSystemTaskStore, square_image: BinaryIO
+    ) -> None:
+        """The job is accepted as usual if its thumbnail is not created in time."""
+        start = time.monotonic()
+        response = TestClient(app).post(
+            Routes.UPLOAD_IMAGE,
+            headers={"Prefer": "wait=0.2"},
+            files={"file": square_image},
+        )
+        assert time.monotonic() - start >= 0.2
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.headers["Location"].endswith(response.json()["job_id"])
@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+import pytest
+
+from app.domain import create_thumbnail
+from app.domain.admission import AdmissionControl
+from app.exceptions import QueueFull
+from app.task_queue import Broker
+from app.task_queue.task_store import FileSystemTaskStore
+
+
+def test_admission_control(
+    square_image: BinaryIO, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Uploads are rejected while too many jobs are pending, and told to retry
+    after the time the queue takes to drain at the observed rate.
+    """
+    store = FileSystemTaskStore(str(tmp_path), status_index=True)
+    broker = Broker(store)
+    admission = AdmissionControl(max_pending=2)
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    admission.check(broker)
+    for _ in range(6):
+        square_image.seek(0)
+        store.add_task_to_queue(square_image)
+    thumbnail = create_thumbnail(square_image)
+
+    def finish(tasks: int) -> None:
+        for _ in range(tasks):
+            task = store.get_next_task()
+            assert task is not None
+            task.image.close()
+            store.register_task_complete(task.job_id, thumbnail, "JPEG")
+
+    # The last summary is reused within the sample interval
+    admission.check(broker)
+    now += admission.sample_interval
+    with pytest.raises(QueueFull) as e:
+        admission.check(broker)
+    # The drain rate is unknown, so the longest delay is given
+    assert e.value.retry_after == admission.max_retry_after
+
+    finish(2)
+    now += 2
+    with pytest.raises(QueueFull) as e:
+        admission.check(broker)
+    # 4 pending, draining at 1 job per second down to 1 pending
+    assert admission.drain_rate == 1.0
+    assert e.value.retry_after == 3
+
+    finish(3)
+    now += 1
+    admission.check(broker)
+    assert admission.rejected == 2
+
+
+def test_admission_control_pending_age(square_image: BinaryIO, tmp_path: Path) -> None:
+    """Uploads are rejected while the oldest pending job has waited too long."""
+    store = FileSystemTaskStore(str(tmp_path), status_index=True)
+    broker = Broker(store)
+    admission = AdmissionControl(max_pending_age=60)
+    admission.check(broker)
+
+    square_image.seek(0)
+    store.add_task_to_queue(square_image)
+    admission.sample_interval = 0
+    admission.check(broker)
+
+    admission.max_pending_age = 0.001
+    time.sleep(0.01)
+    with pytest.raises(QueueFull):
+        admission.check(broker)
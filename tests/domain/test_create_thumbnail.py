@@ -1,18 +1,71 @@
+import importlib
+import io
+
 import pytest
+from PIL import ExifTags, Image
 
 from app import settings
-from app.domain.create_thumbnail import create_thumbnail
+from app.domain.create_thumbnail import create_thumbnail, settings_fingerprint
+from app.task_queue import TaskMetadata
+
+# The package exports a function of the same name as the module
+create_thumbnail_module = importlib.import_module("app.domain.create_thumbnail")
 
 
-@pytest.mark.parametrize("image", ["wide_image", "tall_image", "square_image", "webp_image", "png_image"])
-def test_create_thumbnail(image: str, request: pytest.FixtureRequest) -> None:
+@pytest.mark.parametrize("quality", ["fast", "balanced", "best"])
+@pytest.mark.parametrize(
+    "image", ["wide_image", "tall_image", "square_image", "webp_image", "png_image"]
+)
+def test_create_thumbnail(
+    image: str,
+    quality: str,
+    request: pytest.FixtureRequest,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
     """
     Assert that a thumbnail is created with appropriate padding
     if necessary. Or in other words, assert that the thumbnail
-    matches the requested dimensions exactly.
+    matches the requested dimensions exactly, whatever the quality setting.
 
     :param image: Pytest fixture name that corresponds to an image from which a 100x100
     thumbnail will be created
+    :param quality: Thumbnail quality setting
     """
+    monkeypatch.setattr(settings, "thumbnail_quality", quality)
     thumbnail = create_thumbnail(request.getfixturevalue(image))
     assert thumbnail.size == settings.thumbnail_size
+
+
+@pytest.mark.parametrize("probed", [False, True])
+@pytest.mark.parametrize("orientation", [1, 6])
+def test_create_thumbnail_orientation(orientation: int, probed: bool) -> None:
+    """
+    A thumbnail of an image stored sideways with an EXIF orientation is turned
+    upright, so a wide image stored for a tall picture is padded on the sides.
+    This does not depend on the image having been probed on upload.
+    """
+    wide_image = Image.new("RGB", (200, 100), (255, 0, 0))
+    exif = wide_image.getexif()
+    exif[ExifTags.Base.Orientation] = orientation
+    image = io.BytesIO()
+    wide_image.save(image, "PNG", exif=exif)
+    image.seek(0)
+    metadata = TaskMetadata("PNG", 200, 100, "RGB") if probed else None
+
+    thumbnail = create_thumbnail(image, metadata)
+    assert thumbnail.size == settings.thumbnail_size
+    padded = (0, 50) if orientation == 6 else (50, 0)
+    assert thumbnail.getpixel(padded) == settings.thumbnail_background
+    assert thumbnail.getpixel((50, 50)) == (255, 0, 0)
+
+
+def test_settings_fingerprint(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The fingerprint changes with any setting that changes the thumbnail."""
+    fingerprint = settings_fingerprint()
+    assert settings_fingerprint() == fingerprint
+    monkeypatch.setattr(settings, "thumbnail_quality", "best")
+    assert settings_fingerprint() != fingerprint
+
+    fingerprint = settings_fingerprint()
+    monkeypatch.setattr(create_thumbnail_module, "THUMBNAIL_VERSION", 1)
+    assert settings_fingerprint() != fingerprint
@@ -1,7 +1,16 @@
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+from pathlib import Path
+
 import pytest
 
+from app import settings
 from app.srv import app
 from app.srv.events import lifespan
+from app.task_queue import hold_worker_process_lock
 
 
 @pytest.mark.asyncio
@@ -12,3 +21,58 @@ async def test_events() -> None:
     """
     async with lifespan(app) as l:
         pass
+
+
+@pytest.mark.asyncio
+async def test_events_without_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    """No worker is started when the workers run in a separate process."""
+    monkeypatch.setattr(settings, "run_worker_in_process", False)
+    async with lifespan(app):
+        await asyncio.sleep(0.1)
+        assert not any(t.name.startswith("Worker") for t in threading.enumerate())
+
+
+@pytest.mark.asyncio
+async def test_events_warn_without_worker_process(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """A warning is logged at startup if no worker process runs in the pod."""
+    monkeypatch.setattr(settings, "run_worker_in_process", False)
+    with caplog.at_level(logging.WARNING, logger="app.srv.events"):
+        async with lifespan(app):
+            pass
+    assert "no worker process is running" in caplog.text
+
+    caplog.clear()
+    lock_fd = hold_worker_process_lock()
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.srv.events"):
+            async with lifespan(app):
+                pass
+    finally:
+        os.close(lock_fd)
+    assert "no worker process is running" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_events_several_processes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Startup fails if another API process runs while web_concurrency is 1.
+
+    The other process is stood in for by a second open file description,
+    whose lock excludes the lifespan's like another process's would.
+    """
+    lock_path = tmp_path.joinpath("workers.lock")
+    monkeypatch.setattr(settings, "worker_lock_file", str(lock_path))
+    with lock_path.open("w") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX)
+        with pytest.raises(RuntimeError, match="WEB_CONCURRENCY"):
+            async with lifespan(app):
+                pass
+
+    # Once alone, the process starts, and releases the lock on shutdown
+    async with lifespan(app):
+        pass
+    with lock_path.open("w") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
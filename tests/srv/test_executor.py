@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.srv import MetricsModel, Routes, app
+from app.srv.executor import RequestExecutor, request_executor
+
+
+async def test_request_executor_queue_depth() -> None:
+    """Calls beyond the size of the pool wait in the queue and are counted."""
+    executor = RequestExecutor(max_workers=1)
+    release = threading.Event()
+
+    first = asyncio.create_task(executor.run(release.wait, 5))
+    second = asyncio.create_task(executor.run(lambda: "done"))
+    for _ in range(50):
+        if executor.running == 1:
+            break
+        await asyncio.sleep(0.01)
+    assert executor.running == 1
+    assert executor.queued == 1
+
+    release.set()
+    assert await first is True
+    assert await second == "done"
+    assert executor.running == 0
+    assert executor.queued == 0
+
+
+async def test_request_executor_raises() -> None:
+    """Exceptions raised on the thread pool are raised to the caller."""
+
+    def fail() -> None:
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        await RequestExecutor(max_workers=1).run(fail)
+
+
+def test_metrics_http() -> None:
+    response = TestClient(app).get(Routes.METRICS)
+    assert response.status_code == status.HTTP_200_OK
+    metrics = MetricsModel.model_validate(response.json())
+    assert metrics.request_threads == request_executor.max_workers
+    assert metrics.requests_queued == 0
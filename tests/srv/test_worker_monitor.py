@@ -1,11 +1,17 @@
 import asyncio
+import fcntl
+import importlib
 import threading
+from pathlib import Path
 
 import pytest
 
+from app import settings
 from app.srv.worker_monitor import worker_monitor
 from app.task_queue.worker import Worker
 
+worker_monitor_module = importlib.import_module("app.srv.worker_monitor")
+
 
 @pytest.mark.asyncio
 async def test_worker_monitor() -> None:
@@ -58,3 +64,41 @@ async def test_worker_monitor() -> None:
         await shutdown()
     except asyncio.CancelledError:
         assert not worker_thread2.is_alive()
+
+
+@pytest.mark.asyncio
+async def test_worker_monitor_lock(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """With several API processes, only the one holding the lock runs workers.
+
+    Another process holding the lock is stood in for by a second open file
+    description, whose lock excludes the monitor's like another process's would.
+    """
+    lock_path = tmp_path.joinpath("workers.lock")
+    monkeypatch.setattr(settings, "web_concurrency", 2)
+    monkeypatch.setattr(settings, "worker_lock_file", str(lock_path))
+    monkeypatch.setattr(worker_monitor_module, "LOCK_RETRY_INTERVAL", 0.05)
+
+    def worker_threads() -> list[threading.Thread]:
+        return [t for t in threading.enumerate() if t.name.startswith("Worker")]
+
+    with lock_path.open("w") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX)
+        task = asyncio.create_task(worker_monitor())
+        await asyncio.sleep(0.5)
+        assert not worker_threads()
+    # The other process exited, releasing the lock
+    for _ in range(50):
+        if worker_threads():
+            break
+        await asyncio.sleep(0.1)
+    assert worker_threads()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, timeout=5)
+    assert not worker_threads()
+    # The lock was released on shutdown
+    with lock_path.open("w") as other_process:
+        fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
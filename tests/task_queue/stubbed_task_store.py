@@ -1,8 +1,17 @@
+import hashlib
 import uuid
-from typing import BinaryIO, Iterable
+from typing import BinaryIO, Iterable, Iterator
 
 from app.exceptions import JobNotFound
-from app.task_queue.task_store import TaskStatus, TaskStoreBroker
+from app.task_queue.scheduling import TaskPriority
+from app.task_queue.task_store import (
+    QueuedTask,
+    ResultInfo,
+    TaskMetadata,
+    TaskStatus,
+    TaskStoreBroker,
+    TaskSummary,
+)
 from tests.conftest import ImageType, JobID
 
 
@@ -11,8 +20,15 @@ class StubbedTaskStoreBroker(TaskStoreBroker):
     Stub class with stubbed responses to the broker.
     """
 
-    def add_task_to_queue(self, image: BinaryIO) -> str:
-        return str(uuid.uuid4())
+    def add_task_to_queue(
+        self,
+        image: BinaryIO,
+        dedupe_salt: bytes | None = None,
+        metadata: TaskMetadata | None = None,
+        priority: TaskPriority = TaskPriority.INTERACTIVE,
+        callback_url: str | None = None,
+    ) -> QueuedTask:
+        return QueuedTask(str(uuid.uuid4()))
 
     def get_task_status(self, job_id: str) -> TaskStatus:
         if job_id == JobID.COMPLETE:
@@ -31,14 +47,35 @@ class StubbedTaskStoreBroker(TaskStoreBroker):
             TaskStatus.ERROR: [JobID.ERROR],
         }
 
+    def iter_job_ids(
+        self, task_status: TaskStatus | None = None, after: str = ""
+    ) -> Iterator[tuple[str, TaskStatus]]:
+        for job_id in sorted([JobID.COMPLETE, JobID.INCOMPLETE, JobID.ERROR]):
+            job_status = self.get_task_status(job_id)
+            if job_id > after and task_status in (None, job_status):
+                yield job_id, job_status
+
+    def get_task_summary(self) -> TaskSummary:
+        counts = {task_status: 1 for task_status in self.get_all_task_status()}
+        return TaskSummary(counts, 0.0, {TaskPriority.INTERACTIVE: 1})
+
     def get_result(self, job_id: str) -> BinaryIO:
         if job_id == JobID.COMPLETE:
             return ImageType.THUMBNAIL.get_image()
 
         raise JobNotFound(f"Unexpected job_id: {job_id}")
 
+    def get_result_info(self, job_id: str) -> ResultInfo:
+        thumbnail = self.get_result(job_id).read()
+        return ResultInfo(hashlib.sha256(thumbnail).hexdigest(), 0.0, len(thumbnail))
+
     def get_error(self, job_id: str) -> str:
         if job_id == JobID.ERROR:
             return "this job failed because of reasons"
 
         raise Exception(f"Unexpected job_id: {job_id}")
+
+    def get_task_metadata(self, job_id: str) -> TaskMetadata | None:
+        if job_id == JobID.INCOMPLETE:
+            return TaskMetadata("JPEG", 640, 480, "RGB")
+        return None
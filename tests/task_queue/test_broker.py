@@ -1,3 +1,4 @@
+import tempfile
 import uuid
 from typing import BinaryIO
 
@@ -6,7 +7,9 @@ from pytest import FixtureRequest
 
 from app.domain import create_thumbnail
 from app.exceptions import JobNotFound
-from app.task_queue import Broker, TaskStatus, Worker, task_store
+from app.task_queue import Broker, TaskStatus, Worker, get_task_store
+from app.task_queue.task_store import FileSystemTaskStore, SQLiteTaskStore
+
 
 @pytest.mark.e2e
 class TestFileSystemBrokerWorkerInteractions:
@@ -23,19 +26,25 @@ class TestFileSystemBrokerWorkerInteractions:
     failed_job_ids: list[str]
     worker: Worker
     broker: Broker
+    task_store: FileSystemTaskStore | SQLiteTaskStore
+
+    @classmethod
+    def create_task_store(cls) -> FileSystemTaskStore | SQLiteTaskStore:
+        return get_task_store()
 
     @classmethod
     def setup_class(cls) -> None:
-        task_store.reset()
+        cls.task_store = cls.create_task_store()
+        cls.task_store.reset()
         cls.completed_job_ids = []
         cls.processing_job_ids = []
         cls.failed_job_ids = []
-        cls.broker = Broker(task_store)
-        cls.worker = Worker(task_store, create_thumbnail)
+        cls.broker = Broker(cls.task_store)
+        cls.worker = Worker(cls.task_store, create_thumbnail)
 
     @classmethod
     def teardown_class(cls) -> None:
-        task_store.reset()
+        cls.task_store.reset()
 
     @pytest.mark.parametrize("image", ["square_image", "webp_image", "png_image"])
     def test_broker_worker_interactions(
@@ -68,7 +77,6 @@ class TestFileSystemBrokerWorkerInteractions:
         # This will raise an Exception if there is no result to fetch.
         self.broker.get_result(job_id)
 
-
     def test_error(self, not_an_image: BinaryIO) -> None:
         """
         Test behavior when submitting an invalid file type, which
@@ -94,7 +102,6 @@ class TestFileSystemBrokerWorkerInteractions:
         with pytest.raises(JobNotFound):
             self.broker.get_result(str(uuid.uuid4()))
 
-
     def test_get_all_results(self, square_image: BinaryIO) -> None:
         """
         Test behavior when asking the broker for all job_ids.
@@ -108,3 +115,45 @@ class TestFileSystemBrokerWorkerInteractions:
         assert set(self.completed_job_ids) == set(results[TaskStatus.SUCCEEDED])
         assert set(self.failed_job_ids) == set(results[TaskStatus.ERROR])
         assert set(self.processing_job_ids) == set(results[TaskStatus.PROCESSING])
+
+
+@pytest.mark.e2e
+class TestSQLiteBrokerWorkerInteractions(TestFileSystemBrokerWorkerInteractions):
+    """
+    Run the same broker and worker interactions against
+    a task store backed by an SQLite database.
+    """
+
+    data_folder: tempfile.TemporaryDirectory[str]
+
+    @classmethod
+    def create_task_store(cls) -> FileSystemTaskStore | SQLiteTaskStore:
+        cls.data_folder = tempfile.TemporaryDirectory()
+        return SQLiteTaskStore(cls.data_folder.name)
+
+    @classmethod
+    def teardown_class(cls) -> None:
+        super().teardown_class()
+        cls.data_folder.cleanup()
+
+
+@pytest.mark.e2e
+class TestShardedFileSystemBrokerWorkerInteractions(
+    TestFileSystemBrokerWorkerInteractions
+):
+    """
+    Run the same broker and worker interactions against a
+    filesystem task store using the sharded folder layout.
+    """
+
+    data_folder: tempfile.TemporaryDirectory[str]
+
+    @classmethod
+    def create_task_store(cls) -> FileSystemTaskStore | SQLiteTaskStore:
+        cls.data_folder = tempfile.TemporaryDirectory()
+        return FileSystemTaskStore(cls.data_folder.name, shard_depth=2)
+
+    @classmethod
+    def teardown_class(cls) -> None:
+        super().teardown_class()
+        cls.data_folder.cleanup()
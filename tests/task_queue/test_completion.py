@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.task_queue import CompletionHub
+
+
+@pytest.mark.asyncio
+async def test_completion_hub() -> None:
+    """A job completed on another thread wakes the coroutines waiting for it."""
+    hub = CompletionHub()
+    with hub.subscribe("job") as completed, hub.subscribe("other") as other:
+        thread = threading.Thread(target=hub.notify, args=("job",))
+        thread.start()
+        await asyncio.wait_for(completed.wait(), timeout=5)
+        thread.join()
+        assert not other.is_set()
+    # Nobody is waiting anymore
+    hub.notify("job")
+    assert not hub._subscribers
+
+
+@pytest.mark.asyncio
+async def test_completion_hub_many() -> None:
+    """A single queue receives the id of each of several jobs as it completes."""
+    hub = CompletionHub()
+    with hub.subscribe_many(["a", "b"]) as completed:
+        for job_id in ["b", "other", "a"]:
+            threading.Thread(target=hub.notify, args=(job_id,)).start()
+        received = {await asyncio.wait_for(completed.get(), timeout=5) for _ in "ab"}
+        assert received == {"a", "b"}
+    assert not hub._subscribers
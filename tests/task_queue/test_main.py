@@ -0,0 +1,28 @@
+import threading
+import time
+
+from app.task_queue import worker_process_running
+from app.task_queue.__main__ import run_workers
+
+
+def worker_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name.startswith("Worker")]
+
+
+def test_run_workers() -> None:
+    """The standalone worker runs a pool of workers until asked to stop."""
+    stop = threading.Event()
+    thread = threading.Thread(target=run_workers, args=(stop,))
+    thread.start()
+    deadline = time.time() + 5
+    while not worker_threads():
+        assert time.time() < deadline, "No worker was started"
+        time.sleep(0.05)
+    workers = worker_threads()
+    assert worker_process_running()
+
+    stop.set()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not any(worker.is_alive() for worker in workers)
+    assert not worker_process_running()
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+import pytest
+
+from app import settings
+from app.domain import create_thumbnail
+from app.task_queue import Broker, TaskStatus, Worker
+from app.task_queue.notifier import TaskNotifier
+from app.task_queue.task_store import FileSystemTaskStore
+
+
+def test_worker_woken_by_broker(
+    tmp_path: Path, square_image: BinaryIO, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    An idle worker starts a new task as soon as the broker adds it,
+    instead of waiting for its next poll.
+    """
+    monkeypatch.setattr(settings, "worker_min_poll_interval", 30)
+    monkeypatch.setattr(settings, "worker_max_poll_interval", 30)
+    store = FileSystemTaskStore(str(tmp_path))
+    notifier = TaskNotifier()
+    worker = Worker(store, create_thumbnail, notifier)
+    worker.start()
+    try:
+        # Let the worker find the queue empty and start waiting
+        time.sleep(0.1)
+        job_id = Broker(store, notifier).add_task(square_image)
+        deadline = time.monotonic() + 5
+        while store.get_task_status(job_id) != TaskStatus.SUCCEEDED:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        worker.interrupt()
+        worker.join(timeout=5)
+    assert not worker.is_alive()
+
+
+def test_notification_across_fifo(tmp_path: Path) -> None:
+    """
+    Notifiers sharing a named pipe, as a Broker and Workers in separate
+    processes would, wake each other up.
+    """
+    fifo_path = str(tmp_path.joinpath("wakeup"))
+    worker_notifier = TaskNotifier(fifo_path)
+    broker_notifier = TaskNotifier(fifo_path)
+    generation = worker_notifier.generation
+    # Start listening before the broker notifies
+    assert not worker_notifier.wait(generation, 0.1)
+
+    woken = threading.Event()
+
+    def wait() -> None:
+        if worker_notifier.wait(generation, 5):
+            woken.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    broker_notifier.notify()
+    thread.join()
+    assert woken.is_set()
+
+
+def test_concurrent_first_notifications_open_one_writer(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Threads notifying at once share a single writer of the named pipe."""
+    fifo_path = str(tmp_path.joinpath("wakeup"))
+    worker_notifier = TaskNotifier(fifo_path)
+    # Start listening, so the pipe can be opened for writing
+    worker_notifier.wait(worker_notifier.generation, 0.1)
+    broker_notifier = TaskNotifier(fifo_path)
+    writers = []
+    os_open = os.open
+
+    def slow_open(path: str, flags: int, *args: int) -> int:
+        fd = os_open(path, flags, *args)
+        if path == fifo_path and flags & os.O_WRONLY:
+            writers.append(fd)
+            # Widen the window in which other threads find no writer yet
+            time.sleep(0.05)
+        return fd
+
+    monkeypatch.setattr(os, "open", slow_open)
+    threads = [threading.Thread(target=broker_notifier.notify) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(writers) == 1
@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import BinaryIO
+
+from app.domain import create_thumbnail
+from app.task_queue import Broker
+from app.task_queue.result_cache import CachedResult, ResultCache
+from app.task_queue.task_store import FileSystemTaskStore
+
+
+def cached(size: int) -> CachedResult:
+    return CachedResult(b"\0" * size, "etag", 0.0)
+
+
+def test_evicts_least_recently_used() -> None:
+    """Results are evicted in LRU order once their total size exceeds the limit."""
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", cached(4))
+    cache.put("b", cached(4))
+    assert cache.get("a") is not None
+    cache.put("c", cached(4))
+
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.size == 8
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_skips_results_larger_than_cache() -> None:
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", cached(4))
+    cache.put("b", cached(11))
+    assert "b" not in cache
+    assert "a" in cache
+    assert cache.evictions == 0
+
+
+def test_broker_reads_through_cache(tmp_path: Path, square_image: BinaryIO) -> None:
+    """
+    Registered results are cached on write and served from the cache,
+    and results missing from the cache are read from the store and cached.
+    """
+    cache = ResultCache(max_bytes=1024 * 1024)
+    store = FileSystemTaskStore(str(tmp_path), result_cache=cache)
+    broker = Broker(store, result_cache=cache)
+    job_id = broker.add_task(square_image)
+    task = store.get_next_task()
+    assert task is not None
+    store.register_task_complete(job_id, create_thumbnail(task[1]), "JPEG")
+
+    assert job_id in cache
+    assert broker.get_result_path(job_id) == store.get_result_path(job_id)
+    thumbnail = store.get_result(job_id).read()
+    assert broker.get_result(job_id).read() == thumbnail
+    assert broker.get_result_info(job_id) == store.get_result_info(job_id)
+    cached = broker.get_cached_result(job_id)
+    assert cached == (store.get_result_info(job_id), thumbnail)
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    cold_cache = ResultCache(max_bytes=1024 * 1024)
+    cold_broker = Broker(store, result_cache=cold_cache)
+    assert cold_broker.get_result(job_id).read() == thumbnail
+    assert job_id in cold_cache
+    assert cold_cache.misses == 1
+
+    # Validators of a result missing from the cache do not read it into the cache
+    colder_cache = ResultCache(max_bytes=1024 * 1024)
+    colder_broker = Broker(store, result_cache=colder_cache)
+    assert colder_broker.get_result_info(job_id) == store.get_result_info(job_id)
+    assert colder_broker.get_cached_result(job_id) is None
+    assert job_id not in colder_cache
@@ -0,0 +1,683 @@
+import hashlib
+import importlib
+import io
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator
+
+import pytest
+
+from app import Settings
+from app.domain import create_thumbnail
+from app.exceptions import JobNotFound
+from app.task_queue import (
+    Broker,
+    TaskMetadata,
+    TaskPriority,
+    TaskStatus,
+    create_task_store,
+)
+from app.task_queue.scheduling import LanePolicy, LaneScheduler, SchedulingPolicy
+from app.task_queue.task_store import FileSystemTaskStore, SQLiteTaskStore
+
+StoreFactory = Callable[..., FileSystemTaskStore | SQLiteTaskStore]
+
+# Settings selecting each TaskStore variant, on top of those of create_store
+STORE_SETTINGS: dict[str, dict[str, Any]] = {
+    "filesystem": {},
+    "sharded": {"task_queue_shard_depth": 2},
+    "indexed": {"task_queue_status_index": True},
+    "sqlite": {"task_store_type": "sqlite"},
+}
+
+
+@pytest.fixture(params=list(STORE_SETTINGS))
+def create_store(request: pytest.FixtureRequest, tmp_path: Path) -> StoreFactory:
+    """Create task stores in tmp_path the way the application does, from settings.
+
+    Tests running against some of the variants select them by name with
+    indirect parametrization.
+    """
+
+    def create(
+        worker_id: str = "worker", **overrides: Any
+    ) -> FileSystemTaskStore | SQLiteTaskStore:
+        config = Settings(
+            **{
+                "task_queue_data_folder": str(tmp_path),
+                "task_queue_status_index": False,
+                "task_queue_summary_ttl": 0,
+                **STORE_SETTINGS[request.param],
+                **overrides,
+            }
+        )
+        return create_task_store(config, worker_id=worker_id)
+
+    return create
+
+
+def test_migrate_to_sharded_layout(tmp_path: Path, square_image: BinaryIO) -> None:
+    """
+    Opening a flat store with a shard depth moves finished and failed
+    jobs into their shard folders without changing their status.
+    """
+    flat_store = FileSystemTaskStore(str(tmp_path))
+    thumbnail = create_thumbnail(square_image)
+    results: list[str] = []
+    for _ in range(2):
+        square_image.seek(0)
+        flat_store.add_task_to_queue(square_image)
+        task = flat_store.get_next_task()
+        assert task is not None
+        results.append(task[0])
+    finished_job_id, failed_job_id = results
+    flat_store.register_task_complete(finished_job_id, thumbnail, "JPEG")
+    flat_store.register_task_error(failed_job_id, "failed")
+    square_image.seek(0)
+    pending_job_id = flat_store.add_task_to_queue(square_image).job_id
+
+    sharded_store = FileSystemTaskStore(str(tmp_path), shard_depth=2)
+
+    assert not tmp_path.joinpath("out", finished_job_id).exists()
+    assert tmp_path.joinpath(
+        "out", finished_job_id[:2], finished_job_id[2:4], finished_job_id
+    ).exists()
+    assert tmp_path.joinpath(
+        "error", failed_job_id[:2], failed_job_id[2:4], failed_job_id
+    ).exists()
+    assert tmp_path.joinpath("in", pending_job_id).exists()
+    assert sharded_store.get_task_status(finished_job_id) == TaskStatus.SUCCEEDED
+    assert sharded_store.get_task_status(failed_job_id) == TaskStatus.ERROR
+    assert sharded_store.get_error(failed_job_id) == "failed"
+    assert sharded_store.migrate_to_sharded_layout() == 0
+
+
+def test_status_index(tmp_path: Path, square_image: BinaryIO) -> None:
+    """
+    The status index is built from the existing folders on initialization
+    and follows the tasks through the queue afterward.
+    """
+    unindexed_store = FileSystemTaskStore(str(tmp_path))
+    existing_job_id = unindexed_store.add_task_to_queue(square_image).job_id
+
+    store = FileSystemTaskStore(str(tmp_path), status_index=True)
+    assert store.get_task_status(existing_job_id) == TaskStatus.PROCESSING
+
+    task = store.get_next_task()
+    assert task is not None
+    assert store.get_task_status(existing_job_id) == TaskStatus.PROCESSING
+
+    store.register_task_error(existing_job_id, "failed")
+    assert store.get_task_status(existing_job_id) == TaskStatus.ERROR
+
+    # Jobs added by other store instances are found on disk
+    square_image.seek(0)
+    other_job_id = unindexed_store.add_task_to_queue(square_image).job_id
+    assert store.get_task_status(other_job_id) == TaskStatus.PROCESSING
+
+    all_task_status = store.get_all_task_status()
+    assert list(all_task_status[TaskStatus.ERROR]) == [existing_job_id]
+    assert list(all_task_status[TaskStatus.PROCESSING]) == [other_job_id]
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_claims_are_exclusive(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    Workers in several threads, each with its own store like separate
+    processes would have, never claim the same task twice.
+    """
+    job_ids = set()
+    store = create_store("broker")
+    for _ in range(50):
+        square_image.seek(0)
+        job_ids.add(store.add_task_to_queue(square_image).job_id)
+
+    claimed: list[str] = []
+
+    def drain(worker_id: str) -> None:
+        worker_store = create_store(worker_id)
+        while task := worker_store.get_next_task():
+            claimed.append(task[0])
+
+    threads = [threading.Thread(target=drain, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+    assert all(store.get_task_status(job_id) == "Processing" for job_id in job_ids)
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_expired_lease_is_requeued(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    A task whose result is not registered before its lease
+    expires is handed to another worker.
+    """
+    crashed_store = create_store("crashed", task_lease_seconds=0)
+    job_id = crashed_store.add_task_to_queue(square_image).job_id
+    task = crashed_store.get_next_task()
+    assert task is not None
+
+    store = create_store("alive", task_lease_seconds=0)
+    task = store.get_next_task()
+    assert task is not None
+    assert task[0] == job_id
+    thumbnail = create_thumbnail(task[1])
+    store.register_task_complete(job_id, thumbnail, "JPEG")
+    assert store.get_task_status(job_id) == TaskStatus.SUCCEEDED
+    assert store.get_next_task() is None
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_result_path(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    The Broker locates the thumbnail file of stores keeping results in files,
+    and falls back on reading the result from other stores.
+    """
+    store = create_store("worker")
+    broker = Broker(store)
+    job_id = store.add_task_to_queue(square_image).job_id
+    task = store.get_next_task()
+    assert task is not None
+    store.register_task_complete(job_id, create_thumbnail(task[1]), "JPEG")
+
+    path = broker.get_result_path(job_id)
+    if isinstance(store, FileSystemTaskStore):
+        assert path is not None
+        assert path.read_bytes() == store.get_result(job_id).read()
+        square_image.seek(0)
+        with pytest.raises(JobNotFound):
+            broker.get_result_path(store.add_task_to_queue(square_image).job_id)
+    else:
+        assert path is None
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_result_info(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    The ETag of a thumbnail is the digest of its content, stored when
+    the thumbnail is registered.
+    """
+    store = create_store("worker")
+    job_id = store.add_task_to_queue(square_image).job_id
+    with pytest.raises(JobNotFound):
+        store.get_result_info(job_id)
+    task = store.get_next_task()
+    assert task is not None
+    store.register_task_complete(job_id, create_thumbnail(task[1]), "JPEG")
+
+    thumbnail = store.get_result(job_id).read()
+    info = store.get_result_info(job_id)
+    assert info.etag == hashlib.sha256(thumbnail).hexdigest()
+    assert info.size == len(thumbnail)
+    assert info.last_modified > 0
+
+
+def test_result_info_backfill(tmp_path: Path, square_image: BinaryIO) -> None:
+    """The digest of a thumbnail registered without one is computed on request."""
+    store = FileSystemTaskStore(str(tmp_path))
+    job_id = store.add_task_to_queue(square_image).job_id
+    task = store.get_next_task()
+    assert task is not None
+    store.register_task_complete(job_id, create_thumbnail(task[1]), "JPEG")
+    etag = store.get_result_info(job_id).etag
+
+    meta_path = tmp_path.joinpath("meta", job_id)
+    meta_path.unlink()
+    assert store.get_result_info(job_id).etag == etag
+    assert meta_path.read_text() == etag
+
+
+def test_iter_job_ids(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    Jobs are listed once each in job id order, can be filtered by status,
+    and listing can resume after any job id.
+    """
+    store = create_store("worker")
+    thumbnail = create_thumbnail(square_image)
+    statuses: dict[str, TaskStatus] = {}
+    for i in range(30):
+        square_image.seek(0)
+        job_id = store.add_task_to_queue(square_image).job_id
+        statuses[job_id] = TaskStatus.PROCESSING
+        if i % 3 == 0:
+            continue
+        task = store.get_next_task()
+        assert task is not None
+        if i % 3 == 1:
+            store.register_task_complete(task[0], thumbnail, "JPEG")
+            statuses[task[0]] = TaskStatus.SUCCEEDED
+        else:
+            store.register_task_error(task[0], "failed")
+            statuses[task[0]] = TaskStatus.ERROR
+
+    assert list(store.iter_job_ids()) == sorted(statuses.items())
+    for task_status in [TaskStatus.PROCESSING, TaskStatus.SUCCEEDED, TaskStatus.ERROR]:
+        expected = sorted(i for i, s in statuses.items() if s == task_status)
+        assert [i for i, _ in store.iter_job_ids(task_status)] == expected
+
+    after = sorted(statuses)[11]
+    assert [i for i, _ in store.iter_job_ids(after=after)] == sorted(statuses)[12:]
+
+
+def test_iter_job_ids_from_index(
+    tmp_path: Path, square_image: BinaryIO, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """With the status index, pages are listed without reading any directory."""
+    existing_job_id = (
+        FileSystemTaskStore(str(tmp_path)).add_task_to_queue(square_image).job_id
+    )
+    store = FileSystemTaskStore(str(tmp_path), status_index=True)
+    monkeypatch.setattr(store, "_index_page_size", 2)
+    job_ids = [existing_job_id]
+    for i in range(4):
+        job_ids.append(store.add_task_to_queue(io.BytesIO(bytes([i]))).job_id)
+    # Fail the test if any directory is walked
+    monkeypatch.setattr(store, "_sorted_job_ids", None)
+
+    assert list(store.iter_job_ids()) == [
+        (job_id, TaskStatus.PROCESSING) for job_id in sorted(job_ids)
+    ]
+    after = sorted(job_ids)[2]
+    assert [i for i, _ in store.iter_job_ids(after=after)] == sorted(job_ids)[3:]
+    assert list(store.iter_job_ids(TaskStatus.SUCCEEDED)) == []
+
+
+@pytest.mark.parametrize(
+    "create_store", ["filesystem", "indexed", "sqlite"], indirect=True
+)
+def test_task_summary(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """Jobs are counted by status, and the oldest pending job is reported."""
+    store = create_store("worker")
+    summary = store.get_task_summary()
+    assert sum(summary.counts.values()) == 0
+    assert summary.oldest_pending_at is None
+
+    before = time.time() - 1
+    job_ids = []
+    for _ in range(5):
+        square_image.seek(0)
+        job_ids.append(store.add_task_to_queue(square_image).job_id)
+    thumbnail = create_thumbnail(square_image)
+    for i in range(3):
+        task = store.get_next_task()
+        assert task is not None
+        if i < 2:
+            store.register_task_complete(task[0], thumbnail, "JPEG")
+        else:
+            store.register_task_error(task[0], "failed")
+
+    summary = store.get_task_summary()
+    assert summary.counts[TaskStatus.PROCESSING] == 2
+    assert summary.counts[TaskStatus.SUCCEEDED] == 2
+    assert summary.counts[TaskStatus.ERROR] == 1
+    assert summary.oldest_pending_at is not None
+    assert before <= summary.oldest_pending_at <= time.time()
+
+
+def test_task_summary_ttl(tmp_path: Path, square_image: BinaryIO) -> None:
+    """Without a status index, a summary is reused until it expires."""
+    store = FileSystemTaskStore(str(tmp_path), summary_ttl=0.2)
+    assert store.get_task_summary().counts[TaskStatus.PROCESSING] == 0
+    store.add_task_to_queue(square_image)
+    assert store.get_task_summary().counts[TaskStatus.PROCESSING] == 0
+    time.sleep(0.2)
+    assert store.get_task_summary().counts[TaskStatus.PROCESSING] == 1
+
+
+@pytest.mark.parametrize("status_index", [False, True])
+def test_task_moved_while_listed(
+    status_index: bool,
+    tmp_path: Path,
+    square_image: BinaryIO,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A task moved by another process while the folders are listed is skipped."""
+    job_id = FileSystemTaskStore(str(tmp_path)).add_task_to_queue(square_image).job_id
+    claimed_job_paths = FileSystemTaskStore._claimed_job_paths
+
+    def claimed_and_moved_job_paths(store: FileSystemTaskStore) -> Iterator[Path]:
+        # Listed as claimed, but registered before its modification time is read
+        yield store.claimed_folder.joinpath("worker", "moved")
+        yield from claimed_job_paths(store)
+
+    monkeypatch.setattr(
+        FileSystemTaskStore, "_claimed_job_paths", claimed_and_moved_job_paths
+    )
+    store = FileSystemTaskStore(str(tmp_path), status_index=status_index)
+    assert store.get_task_summary().oldest_pending_at is not None
+    assert store.get_task_status(job_id) == TaskStatus.PROCESSING
+
+
+def test_sqlite_counts_existing_jobs(tmp_path: Path, square_image: BinaryIO) -> None:
+    """Jobs added before the counting triggers existed are counted on startup."""
+    store = SQLiteTaskStore(str(tmp_path))
+    store.add_task_to_queue(square_image)
+    conn = sqlite3.connect(tmp_path.joinpath("tasks.sqlite3"))
+    conn.executescript("DROP TRIGGER jobs_count_insert; DROP TABLE job_counts;")
+    conn.execute(
+        "INSERT INTO jobs (job_id, status, created_at) VALUES ('a', ?, 0)",
+        (TaskStatus.PROCESSING,),
+    )
+    conn.commit()
+    conn.close()
+
+    summary = SQLiteTaskStore(str(tmp_path)).get_task_summary()
+    assert summary.counts[TaskStatus.PROCESSING] == 2
+    assert summary.oldest_pending_at == 0
+
+
+def test_sqlite_empty_poll_is_read_only(tmp_path: Path, square_image: BinaryIO) -> None:
+    """Polling an empty queue does not wait for the write lock held by an upload."""
+    store = SQLiteTaskStore(str(tmp_path))
+    conn = sqlite3.connect(tmp_path.joinpath("tasks.sqlite3"), timeout=0)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert store.get_next_task() is None
+        assert time.monotonic() - start < 1
+    finally:
+        conn.execute("ROLLBACK")
+        conn.close()
+
+    store.add_task_to_queue(square_image)
+    task = store.get_next_task()
+    assert task is not None
+    task.image.close()
+
+
+def test_sqlite_migrates_claims(tmp_path: Path) -> None:
+    """
+    A database created before leases is opened, and the tasks claimed in it
+    are handed out again once a lease has passed since they were claimed.
+    """
+    conn = sqlite3.connect(tmp_path.joinpath("tasks.sqlite3"))
+    conn.executescript(
+        """
+        CREATE TABLE jobs (
+            job_id TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            claimed_at REAL,
+            image BLOB,
+            result BLOB,
+            error TEXT
+        );
+        CREATE INDEX jobs_status_created_at ON jobs (status, created_at);
+        """
+    )
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO jobs (job_id, status, created_at, claimed_at, image)"
+        " VALUES (?, ?, ?, ?, x'00')",
+        [
+            ("expired", TaskStatus.PROCESSING, 0, now - 600),
+            ("leased", TaskStatus.PROCESSING, 1, now),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteTaskStore(str(tmp_path), lease_seconds=300)
+    task = store.get_next_task()
+    assert task is not None and task.job_id == "expired"
+    task.image.close()
+    assert store.get_next_task() is None
+    assert store.get_task_summary().counts[TaskStatus.PROCESSING] == 2
+
+
+def test_deduplicated_uploads(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    An identical upload with the same salt gets the job of the earlier upload
+    while it is processing or succeeded, and a new job once it has failed.
+    """
+    store = create_store("worker")
+    job_id, deduplicated = store.add_task_to_queue(square_image, b"salt")
+    assert not deduplicated
+    square_image.seek(0)
+    assert store.add_task_to_queue(square_image, b"salt") == (job_id, True)
+    square_image.seek(0)
+    assert store.add_task_to_queue(square_image, b"other salt").job_id != job_id
+    square_image.seek(0)
+    assert store.add_task_to_queue(square_image).job_id != job_id
+
+    square_image.seek(0)
+    failing_job_id = store.add_task_to_queue(square_image, b"failing").job_id
+    thumbnail = create_thumbnail(square_image)
+    while task := store.get_next_task():
+        if task[0] == job_id:
+            store.register_task_complete(job_id, thumbnail, "JPEG")
+        elif task[0] == failing_job_id:
+            store.register_task_error(failing_job_id, "failed")
+    square_image.seek(0)
+    assert store.add_task_to_queue(square_image, b"salt") == (job_id, True)
+
+    square_image.seek(0)
+    retried_job_id, deduplicated = store.add_task_to_queue(square_image, b"failing")
+    assert retried_job_id != failing_job_id
+    assert not deduplicated
+    assert store.get_task_status(retried_job_id) == TaskStatus.PROCESSING
+
+
+def test_deduplicated_upload_promotes_waiting_job(
+    create_store: StoreFactory, square_image: BinaryIO
+) -> None:
+    """
+    An interactive upload deduplicated into a waiting batch job moves it to the
+    interactive lane, including for the Workers of other processes.
+    """
+    broker_store = create_store("broker")
+    worker_store = create_store("worker")
+    batch_job_ids = []
+    for _ in range(2):
+        square_image.seek(0)
+        queued = broker_store.add_task_to_queue(
+            square_image, priority=TaskPriority.BATCH
+        )
+        batch_job_ids.append(queued.job_id)
+    square_image.seek(0)
+    job_id = broker_store.add_task_to_queue(
+        square_image, b"salt", priority=TaskPriority.BATCH
+    ).job_id
+    task = worker_store.get_next_task()
+    assert task is not None and task.job_id == batch_job_ids[0]
+    task.image.close()
+
+    square_image.seek(0)
+    assert broker_store.add_task_to_queue(square_image, b"salt") == (job_id, True)
+    # A batch upload deduplicated into the job does not move it back
+    square_image.seek(0)
+    assert broker_store.add_task_to_queue(
+        square_image, b"salt", priority=TaskPriority.BATCH
+    ) == (job_id, True)
+
+    task = worker_store.get_next_task()
+    assert task is not None and task.job_id == job_id
+    task.image.close()
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_concurrent_deduplicated_uploads(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """Identical uploads made at the same time are coalesced into a single job."""
+    data = square_image.read()
+    store = create_store("broker")
+    job_ids: list[str] = []
+
+    def upload() -> None:
+        job_ids.append(store.add_task_to_queue(io.BytesIO(data), b"salt").job_id)
+
+    threads = [threading.Thread(target=upload) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(job_ids) == 8
+    assert len(set(job_ids)) == 1
+    assert store.get_task_summary().counts[TaskStatus.PROCESSING] == 1
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+def test_upload_is_copied_in_chunks(
+    create_store: StoreFactory,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    An upload spanning several chunks reaches the Worker intact, as a file
+    rather than an in-memory copy, and leaves nothing behind in the "tmp" folder.
+    """
+    task_store_module = importlib.import_module("app.task_queue.task_store")
+    monkeypatch.setattr(task_store_module, "COPY_CHUNK_SIZE", 1000)
+    data = bytes(range(256)) * 10
+    store = create_store("worker")
+    upload = io.BytesIO(b"ignored" + data)
+    upload.seek(len(b"ignored"))
+    job_id = store.add_task_to_queue(upload, b"salt").job_id
+
+    task = store.get_next_task()
+    assert task is not None and task[0] == job_id
+    with task[1] as image:
+        assert not isinstance(image, io.BytesIO)
+        assert image.read() == data
+    if isinstance(store, FileSystemTaskStore):
+        assert not any(store.tmp_folder.iterdir())
+
+
+@pytest.mark.parametrize(
+    "create_store", ["filesystem", "sharded", "sqlite"], indirect=True
+)
+def test_task_metadata(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """The metadata of an image is handed to the Worker and kept for job status."""
+    metadata = TaskMetadata("JPEG", 640, 640, "RGB")
+    store = create_store("worker")
+    job_id = store.add_task_to_queue(square_image, metadata=metadata).job_id
+    square_image.seek(0)
+    unprobed_job_id = store.add_task_to_queue(square_image).job_id
+
+    tasks = {}
+    while task := store.get_next_task():
+        tasks[task.job_id] = task.metadata
+        task.image.close()
+    assert tasks == {job_id: metadata, unprobed_job_id: None}
+    assert store.get_task_metadata(job_id) == metadata
+    assert store.get_task_metadata(unprobed_job_id) is None
+    assert store.get_task_metadata("not a job") is None
+
+
+@pytest.mark.parametrize(
+    "create_store", ["filesystem", "sharded", "sqlite"], indirect=True
+)
+def test_task_callbacks(
+    create_store: StoreFactory, tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """The callback URLs of the uploads deduplicated into a job are all kept."""
+    store = create_store("worker")
+    job_id = store.add_task_to_queue(
+        square_image, b"salt", callback_url="http://a/"
+    ).job_id
+    square_image.seek(0)
+    assert store.add_task_to_queue(square_image, b"salt").job_id == job_id
+    square_image.seek(0)
+    store.add_task_to_queue(square_image, b"salt", callback_url="http://b/")
+    square_image.seek(0)
+    other_job_id = store.add_task_to_queue(square_image).job_id
+
+    assert store.get_task_callbacks(job_id) == ["http://a/", "http://b/"]
+    assert store.get_task_callbacks(other_job_id) == []
+    assert store.get_task_callbacks("not a job") == []
+
+
+@pytest.mark.parametrize("create_store", ["filesystem", "sqlite"], indirect=True)
+@pytest.mark.parametrize(
+    "scheduling, aging_rate, expected_order",
+    [
+        ("fifo", 1.0, ["large", "small"]),
+        ("size", 1.0, ["small", "large"]),
+        # The large task waited longer than its delay, so it is not overtaken
+        ("size", 10000.0, ["large", "small"]),
+    ],
+)
+def test_scheduling(
+    create_store: StoreFactory,
+    scheduling: SchedulingPolicy,
+    aging_rate: float,
+    expected_order: list[str],
+    tmp_path: Path,
+    square_image: BinaryIO,
+) -> None:
+    """Tasks are handed out in order of the time they were added and their size."""
+    store = create_store(task_scheduling=scheduling, task_aging_rate=aging_rate)
+    job_ids = {}
+    for name, metadata in [
+        ("large", TaskMetadata("PNG", 8000, 6000, "RGB")),
+        ("small", TaskMetadata("JPEG", 640, 480, "RGB")),
+    ]:
+        square_image.seek(0)
+        job_ids[store.add_task_to_queue(square_image, metadata=metadata).job_id] = name
+        time.sleep(0.1)
+
+    order = []
+    while task := store.get_next_task():
+        order.append(job_ids[task.job_id])
+        task.image.close()
+    assert order == expected_order
+
+
+@pytest.mark.parametrize(
+    "create_store", ["filesystem", "indexed", "sqlite"], indirect=True
+)
+@pytest.mark.parametrize(
+    "policy, expected_order",
+    [
+        ("strict", "IIIIIBBBBB"),
+        # Four interactive tasks for every batch task while both lanes wait
+        ("weighted", "IIBIIIBBBB"),
+    ],
+)
+def test_priority_lanes(
+    create_store: StoreFactory,
+    policy: LanePolicy,
+    expected_order: str,
+    tmp_path: Path,
+    square_image: BinaryIO,
+) -> None:
+    """Tasks are taken from the lanes chosen by the lane policy."""
+    store = create_store(task_lane_policy=policy, task_lane_weights=(4, 1))
+    lanes = {}
+    for priority in [TaskPriority.BATCH] * 5 + [TaskPriority.INTERACTIVE] * 5:
+        square_image.seek(0)
+        job_id = store.add_task_to_queue(square_image, priority=priority).job_id
+        lanes[job_id] = priority
+    assert store.get_task_summary().pending_by_priority == {
+        TaskPriority.INTERACTIVE: 5,
+        TaskPriority.BATCH: 5,
+    }
+
+    order = ""
+    while task := store.get_next_task():
+        order += "I" if lanes[task.job_id] == TaskPriority.INTERACTIVE else "B"
+        task.image.close()
+    assert order == expected_order
@@ -0,0 +1,297 @@
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator
+
+import pytest
+
+from app.domain import create_thumbnail
+from app.exceptions import InvalidCallbackURL
+from app.task_queue import (
+    Broker,
+    TaskMetadata,
+    TaskPriority,
+    TaskStatus,
+    WebhookDispatcher,
+    Worker,
+)
+from app.task_queue.task_store import FileSystemTaskStore, QueuedTask
+
+
+class StubReceiver(ThreadingHTTPServer):
+    """Local HTTP server recording the JSON bodies POSTed to it.
+
+    Requests are answered with the queued statuses, then with 200. While the
+    gate is clear, requests are held before being answered.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.bodies: list[Any] = []
+        # Host header of each request
+        self.hosts: list[str] = []
+        self.statuses: list[int] = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.received = threading.Condition()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/callback"
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: float = 5) -> None:
+        with self.received:
+            assert self.received.wait_for(predicate, timeout)
+
+    def events(self) -> list[dict[str, str]]:
+        return [event for body in self.bodies for event in body]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubReceiver
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.gate.wait(5)
+        with self.server.received:
+            self.server.hosts.append(self.headers["Host"])
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+            if status == 200:
+                self.server.bodies.append(body)
+            self.server.received.notify_all()
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def receiver() -> Iterator[StubReceiver]:
+    server = StubReceiver()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.gate.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dispatcher() -> Iterator[WebhookDispatcher]:
+    # The stub receiver listens on the loopback address
+    dispatcher = WebhookDispatcher(
+        concurrency=1,
+        backoff=0.01,
+        timeout=2,
+        allowed_hosts=["127.0.0.1", "hooks.test"],
+        allow_private_addresses=True,
+    )
+    yield dispatcher
+    dispatcher.stop()
+
+
+def test_events_are_batched(
+    receiver: StubReceiver, dispatcher: WebhookDispatcher
+) -> None:
+    """Events queued while the sender is busy are POSTed in a single request."""
+    receiver.gate.clear()
+    dispatcher.deliver(receiver.url, {"job_id": "0"})
+    # Let the first event be sent on its own, then queue more behind it
+    time.sleep(0.2)
+    for i in range(1, 4):
+        dispatcher.deliver(receiver.url, {"job_id": str(i)})
+    receiver.gate.set()
+    receiver.wait_for(lambda: len(receiver.events()) == 4)
+    assert receiver.bodies == [
+        [{"job_id": "0"}],
+        [{"job_id": "1"}, {"job_id": "2"}, {"job_id": "3"}],
+    ]
+    dispatcher.stop()
+    assert dispatcher.delivered == 4
+
+
+def test_failed_deliveries_are_retried(
+    receiver: StubReceiver, dispatcher: WebhookDispatcher
+) -> None:
+    """A retryable failure is retried, and other failures are given up on."""
+    receiver.statuses = [503, 500]
+    dispatcher.deliver(receiver.url, {"job_id": "retried"})
+    receiver.wait_for(lambda: len(receiver.bodies) == 1)
+    receiver.statuses = [404]
+    dispatcher.deliver(receiver.url, {"job_id": "rejected"})
+    dispatcher.stop()
+    assert receiver.events() == [{"job_id": "retried"}]
+    assert (dispatcher.delivered, dispatcher.failed) == (1, 1)
+
+
+def test_pending_events_are_bounded(receiver: StubReceiver) -> None:
+    """Events beyond the limit are dropped instead of queued."""
+    dispatcher = WebhookDispatcher(
+        max_pending=2,
+        concurrency=1,
+        allowed_hosts=["127.0.0.1"],
+        allow_private_addresses=True,
+    )
+    receiver.gate.clear()
+    assert [dispatcher.deliver(receiver.url, {}) for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    receiver.gate.set()
+    dispatcher.stop()
+    assert (dispatcher.delivered, dispatcher.dropped) == (2, 1)
+
+
+def test_worker_delivers_callbacks(
+    tmp_path: Path,
+    receiver: StubReceiver,
+    dispatcher: WebhookDispatcher,
+    square_image: BinaryIO,
+) -> None:
+    """The result of a job is POSTed to its callback URLs once it is registered."""
+    store = FileSystemTaskStore(str(tmp_path))
+    broker = Broker(store, webhooks=dispatcher)
+    succeeded = broker.add_task(square_image, callback_url=receiver.url)
+    failed = broker.add_task(io.BytesIO(b"not an image"), callback_url=receiver.url)
+    worker = Worker(store, create_thumbnail, webhooks=dispatcher)
+    worker.start()
+    try:
+        receiver.wait_for(lambda: len(receiver.events()) == 2)
+    finally:
+        worker.interrupt()
+        worker.join()
+
+    events = {event["job_id"]: event for event in receiver.events()}
+    assert events[succeeded] == {"job_id": succeeded, "status": TaskStatus.SUCCEEDED}
+    assert events[failed]["status"] == TaskStatus.ERROR
+    assert events[failed]["error"] == store.get_error(failed)
+
+
+def test_deduplicated_upload_of_finished_job(
+    tmp_path: Path,
+    receiver: StubReceiver,
+    dispatcher: WebhookDispatcher,
+    square_image: BinaryIO,
+) -> None:
+    """An upload deduplicated into a finished job is notified right away."""
+    store = FileSystemTaskStore(str(tmp_path))
+    broker = Broker(store, webhooks=dispatcher)
+    job_id = broker.add_task(io.BytesIO(square_image.read()), b"salt")
+    task = store.get_next_task()
+    assert task is not None
+    store.register_task_complete(job_id, create_thumbnail(task.image, None), "JPEG")
+
+    square_image.seek(0)
+    assert broker.add_task(square_image, b"salt", callback_url=receiver.url) == job_id
+    receiver.wait_for(lambda: len(receiver.events()) == 1)
+    assert receiver.events() == [{"job_id": job_id, "status": TaskStatus.SUCCEEDED}]
+
+
+def test_new_job_finished_before_upload_returns(
+    tmp_path: Path,
+    receiver: StubReceiver,
+    dispatcher: WebhookDispatcher,
+    square_image: BinaryIO,
+) -> None:
+    """
+    The result of a new job is left to its Worker to deliver, even if the
+    job finished before the upload returned.
+    """
+
+    class FinishingTaskStore(FileSystemTaskStore):
+        """Completes each new task right away, as a Worker woken up would."""
+
+        def add_task_to_queue(
+            self,
+            image: BinaryIO,
+            dedupe_salt: bytes | None = None,
+            metadata: TaskMetadata | None = None,
+            priority: TaskPriority = TaskPriority.INTERACTIVE,
+            callback_url: str | None = None,
+        ) -> QueuedTask:
+            queued = super().add_task_to_queue(
+                image, dedupe_salt, metadata, priority, callback_url
+            )
+            task = self.get_next_task()
+            if task is not None:
+                thumbnail = create_thumbnail(task.image, None)
+                self.register_task_complete(task.job_id, thumbnail, "JPEG")
+            return queued
+
+    store = FinishingTaskStore(str(tmp_path))
+    broker = Broker(store, webhooks=dispatcher)
+    job_id = broker.add_task(square_image, b"salt", callback_url=receiver.url)
+    assert store.get_task_status(job_id) == TaskStatus.SUCCEEDED
+    dispatcher.stop()
+    assert receiver.events() == []
+
+
+@pytest.mark.parametrize(
+    "url, allowed_hosts",
+    [
+        ("https://hooks.example.com/", []),
+        ("https://other.example.com/", ["hooks.example.com"]),
+        ("https://example.com/", ["*.example.com"]),
+        ("ftp://hooks.example.com/", ["*"]),
+        ("http://127.0.0.1:8000/", ["*"]),
+        ("http://10.0.0.1/", ["*"]),
+        ("http://169.254.169.254/latest/meta-data/", ["*"]),
+        ("http://[::1]/", ["*"]),
+        ("http://[::ffff:127.0.0.1]/", ["*"]),
+        ("http://0.0.0.0/", ["*"]),
+        # Resolves to a private address
+        ("https://internal.example.com/", ["*.example.com"]),
+    ],
+)
+def test_check_url_rejected(
+    url: str, allowed_hosts: list[str], fake_dns: dict[str, list[str]]
+) -> None:
+    """
+    Callback URLs are rejected unless their host is allowed, and it only
+    resolves to public addresses.
+    """
+    fake_dns["internal.example.com"] = ["93.184.215.14", "192.168.0.10"]
+    with pytest.raises(InvalidCallbackURL):
+        WebhookDispatcher(allowed_hosts=allowed_hosts).check_url(url)
+
+
+def test_check_url_allowed(fake_dns: dict[str, list[str]]) -> None:
+    fake_dns["hooks.example.com"] = ["93.184.215.14"]
+    dispatcher = WebhookDispatcher(allowed_hosts=["*.example.com", "93.184.215.14"])
+    assert dispatcher.check_url("https://hooks.example.com/") == "93.184.215.14"
+    assert dispatcher.check_url("http://93.184.215.14/") == "93.184.215.14"
+
+
+def test_delivery_is_sent_to_checked_address(
+    receiver: StubReceiver,
+    dispatcher: WebhookDispatcher,
+    fake_dns: dict[str, list[str]],
+) -> None:
+    """Requests go to the address that was checked, with the URL's host name."""
+    fake_dns["hooks.test"] = ["127.0.0.1"]
+    url = receiver.url.replace("127.0.0.1", "hooks.test")
+    dispatcher.deliver(url, {"job_id": "0"})
+    receiver.wait_for(lambda: len(receiver.bodies) == 1)
+    assert receiver.hosts == [f"hooks.test:{receiver.server_address[1]}"]
+
+
+def test_rebound_host_is_not_posted_to(
+    receiver: StubReceiver, fake_dns: dict[str, list[str]]
+) -> None:
+    """A host checked on upload is checked again before each request."""
+    dispatcher = WebhookDispatcher(allowed_hosts=["hooks.test"])
+    fake_dns["hooks.test"] = ["93.184.215.14"]
+    url = receiver.url.replace("127.0.0.1", "hooks.test")
+    dispatcher.check_url(url)
+
+    fake_dns["hooks.test"] = ["127.0.0.1"]
+    dispatcher.deliver(url, {"job_id": "0"})
+    dispatcher.stop()
+    assert (dispatcher.delivered, dispatcher.failed) == (0, 1)
+    assert receiver.bodies == []
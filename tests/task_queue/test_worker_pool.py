@@ -0,0 +1,118 @@
+import io
+import time
+from pathlib import Path
+from typing import BinaryIO
+
+import pytest
+from PIL import Image
+
+from app.domain import create_thumbnail
+from app.task_queue import TaskMetadata, TaskStatus, WorkerPool, get_task_store
+from app.task_queue.task_store import FileSystemTaskStore, SQLiteTaskStore
+
+
+def wait_for_status(
+    store: FileSystemTaskStore | SQLiteTaskStore,
+    job_ids: list[str],
+    timeout: float = 10,
+    task_status: TaskStatus = TaskStatus.SUCCEEDED,
+) -> None:
+    """Wait until every job has the given status, or fail the test."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(store.get_task_status(i) == task_status for i in job_ids):
+            return
+        time.sleep(0.05)
+    raise TimeoutError("timed out waiting for the pool to process every task")
+
+
+@pytest.mark.parametrize("store_class", [FileSystemTaskStore, SQLiteTaskStore])
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_worker_pool(
+    use_processes: bool,
+    store_class: type[FileSystemTaskStore | SQLiteTaskStore],
+    tmp_path: Path,
+    square_image: BinaryIO,
+) -> None:
+    """
+    A pool of workers processes every task in the store,
+    whether thumbnails are created in threads or processes.
+    """
+    store = store_class(str(tmp_path))
+    job_ids = []
+    for _ in range(6):
+        square_image.seek(0)
+        job_ids.append(store.add_task_to_queue(square_image).job_id)
+
+    pool = WorkerPool(store, create_thumbnail, 3, use_processes)
+    pool.start()
+    try:
+        assert len(pool.workers) == 3
+        wait_for_status(store, job_ids)
+    finally:
+        pool.interrupt()
+        pool.join()
+    assert not any(worker.is_alive() for worker in pool.workers)
+
+
+def report_task_store(image: BinaryIO, metadata: TaskMetadata | None) -> Image.Image:
+    """Task function drawing a black pixel if the global task store was created."""
+    import app.task_queue
+
+    created = app.task_queue._task_store is not None
+    return Image.new("L", (1, 1), 0 if created else 255)
+
+
+def test_pool_processes_do_not_create_the_task_store(
+    tmp_path: Path, square_image: BinaryIO
+) -> None:
+    """
+    Pool processes are not forked from this process, and importing the task
+    function there does not create the global task store.
+    """
+    get_task_store()
+    store = FileSystemTaskStore(str(tmp_path))
+    job_id = store.add_task_to_queue(square_image).job_id
+
+    pool = WorkerPool(store, report_task_store, 1, use_processes=True)
+    pool.start()
+    try:
+        wait_for_status(store, [job_id])
+    finally:
+        pool.interrupt()
+        pool.join()
+    with Image.open(store.get_result(job_id)) as thumbnail:
+        assert thumbnail.getpixel((0, 0)) > 128
+
+
+def test_restart_dead_workers(tmp_path: Path) -> None:
+    """A worker that died is replaced, and only that one."""
+    pool = WorkerPool(FileSystemTaskStore(str(tmp_path)), create_thumbnail, 2)
+    pool.start()
+    dead_worker, live_worker = pool.workers
+    dead_worker.interrupt()
+    dead_worker.join()
+
+    assert pool.restart_dead_workers() == 1
+    assert pool.workers[0] is not dead_worker
+    assert pool.workers[0].is_alive()
+    assert pool.workers[1] is live_worker
+
+    pool.interrupt()
+    pool.join()
+
+
+def test_corrupt_image_is_reported(tmp_path: Path, png_image: BinaryIO) -> None:
+    """An image that is corrupt past its header fails in the worker with an error."""
+    data = png_image.read()
+    store = FileSystemTaskStore(str(tmp_path))
+    job_id = store.add_task_to_queue(io.BytesIO(data[: len(data) // 2])).job_id
+
+    pool = WorkerPool(store, create_thumbnail, 1)
+    pool.start()
+    try:
+        wait_for_status(store, [job_id], task_status=TaskStatus.ERROR)
+    finally:
+        pool.interrupt()
+        pool.join()
+    assert store.get_error(job_id)